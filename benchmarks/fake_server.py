@@ -0,0 +1,309 @@
+"""
+Локальный заменитель 4pda.to и 4pda.ws для бенчмарков.
+
+Сервер работает как HTTP-прокси: на CONNECT к любому хосту он отвечает
+сам, завершая TLS своим сертификатом для 4pda.to и 4pda.ws. Поэтому сессия
+обращается к тем же адресам, что и в работе (через ProxyPool), а код
+библиотеки не нужно менять. Сертификаты создаются утилитой openssl,
+клиенту корневой сертификат передается через SSL_CERT_FILE.
+
+Что имитируется:
+    - /forum/dl/post/<id>/<имя>: нечетный id — редирект на 4pda.ws,
+      четный — страница загрузки со ссылкой act=attach
+    - /forum/index.php?act=attach — редирект на 4pda.ws
+    - /forum/index.php?act=auth — страница входа с капчей, POST выдает cookies
+    - /forum/index.php?showuser=<id> — страница профиля с маркерами авторизации
+    - доля запросов к 4pda.to получает проверку Cloudflare (403, Cf-Mitigated)
+    - 4pda.ws отдает файл заданного размера с поддержкой Range
+"""
+import argparse
+import hashlib
+import http.server
+import random
+import re
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+FORUM_HOST = "4pda.to"
+FILES_HOST = "cdn.4pda.ws"
+# Файл генерируется из повторяющегося блока, чтобы не держать его в памяти целиком
+BLOCK = hashlib.sha256(b"fourpda-dl").digest() * 2048
+WRITE_CHUNK = 256 * 1024
+CAPTCHA_GIF = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00" \
+              b"\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+
+
+@dataclass
+class ServerOptions:
+    """
+    Параметры поведения сервера.
+
+    Attributes:
+        latency (float): Задержка ответа 4pda.to в секундах
+        jitter (float): Случайная добавка к задержке, от 0 до jitter секунд
+        page_size (int): Размер страниц форума (загрузки, профиля, входа) в байтах
+        file_size (int): Размер файла на 4pda.ws в байтах
+        challenge_rate (float): Доля запросов к 4pda.to, получающих проверку Cloudflare
+        member_id (int): ID пользователя, для которого отдается страница профиля
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    page_size: int = 64 * 1024
+    file_size: int = 64 * 1024 * 1024
+    challenge_rate: float = 0.0
+    member_id: int = 1
+
+
+def make_certificates(directory: Path) -> Tuple[Path, Path, Path]:
+    """
+    Создает корневой сертификат и подписанный им сертификат сервера для 4pda.to и 4pda.ws.
+
+    Returns:
+        Tuple[Path, Path, Path]: (корневой сертификат, сертификат сервера, ключ сервера)
+    """
+    directory = Path(directory)
+    ca_key, ca_cert = directory / "ca.key", directory / "ca.pem"
+    key, csr, cert = directory / "server.key", directory / "server.csr", directory / "server.pem"
+    ext = directory / "server.ext"
+    ext.write_text(
+        "subjectAltName=DNS:4pda.to,DNS:*.4pda.to,DNS:4pda.ws,DNS:*.4pda.ws\n"
+        "basicConstraints=critical,CA:FALSE\n"
+        "keyUsage=critical,digitalSignature,keyEncipherment\n"
+        "extendedKeyUsage=serverAuth\n"
+        "subjectKeyIdentifier=hash\n"
+        "authorityKeyIdentifier=keyid,issuer\n"
+    )
+
+    def openssl(*args):
+        subprocess.run(["openssl", *args], check=True, capture_output=True)
+
+    openssl("req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2", "-subj", "/CN=fourpda-dl bench CA",
+            "-addext", "basicConstraints=critical,CA:TRUE", "-addext", "keyUsage=critical,keyCertSign,cRLSign",
+            "-keyout", str(ca_key), "-out", str(ca_cert))
+    openssl("req", "-newkey", "rsa:2048", "-nodes", "-subj", "/CN=4pda.to", "-keyout", str(key), "-out", str(csr))
+    openssl("x509", "-req", "-in", str(csr), "-CA", str(ca_cert), "-CAkey", str(ca_key), "-CAcreateserial",
+            "-days", "2", "-extfile", str(ext), "-out", str(cert))
+    return ca_cert, cert, key
+
+
+class FakeForumHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeForumServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_CONNECT(self):
+        """
+        Принимает туннель и дальше обслуживает запросы внутри TLS на том же соединении.
+        """
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        self.connection = self.server.tls.wrap_socket(self.connection, server_side=True)
+        self.rfile = self.connection.makefile("rb", self.rbufsize)
+        self.wfile = socketserver._SocketWriter(self.connection)
+        self.close_connection = False
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self._route("POST")
+
+    def _route(self, method: str):
+        host = (self.headers.get("Host") or "").split(":")[0]
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        options = self.server.options
+
+        if host == FILES_HOST:
+            return self._send_file()
+
+        if options.latency or options.jitter:
+            time.sleep(options.latency + random.uniform(0, options.jitter))
+        if options.challenge_rate and random.random() < options.challenge_rate:
+            return self._send(403, self._page("Just a moment..."), {"Cf-Mitigated": "challenge"})
+
+        match = re.match(r"/forum/dl/post/(\d+)/(.+)", url.path)
+        if match:
+            post_id, name = int(match.group(1)), match.group(2)
+            if post_id % 2:
+                return self._redirect(self._file_link(post_id, name))
+            link = f"https://{FORUM_HOST}/forum/index.php?act=attach&amp;id={post_id}&amp;name={name}"
+            return self._send(200, self._page(f'<a class="button" href="{link}">Скачать</a>'))
+
+        action = query.get("act", [""])[0]
+        if action == "attach":
+            post_id = int(re.search(r"id=(\d+)", url.query).group(1))
+            name = re.search(r"name=([^&]+)", url.query).group(1)
+            return self._redirect(self._file_link(post_id, name))
+        if action == "auth" and method == "GET":
+            form = (f'<input name="captcha-time" value="{int(time.time())}">'
+                    '<input name="captcha-sig" value="bench-sig">'
+                    f'<img src="https://{FORUM_HOST}/captcha.gif" data-captcha="renew-login">')
+            return self._send(200, self._page(form))
+        if action == "auth":
+            cookies = [f"member_id={options.member_id}; Domain=.{FORUM_HOST}; Path=/",
+                       f"pass_hash=bench; Domain=.{FORUM_HOST}; Path=/"]
+            return self._send(302, b"", {"Location": f"https://{FORUM_HOST}/"}, cookies)
+        if "showuser" in query:
+            member_id = options.member_id
+            # Маркеры стоят в начале страницы, как ссылки меню пользователя на форуме
+            markers = (f'<a href="index.php?showuser={member_id}&action=edit">Профиль</a>'
+                       '<a href="index.php?act=auth&action=chpass">Пароль</a>')
+            return self._send(200, self._page(markers, title="bench"))
+        if url.path == "/captcha.gif":
+            return self._send(200, CAPTCHA_GIF, {"Content-Type": "image/gif"})
+
+        self._send(404, self._page("Not found"))
+
+    def _page(self, content: str, title: str = "4PDA") -> bytes:
+        html = f"<html><head><title>{title} - 4PDA</title></head><body>{content}"
+        padding = max(0, self.server.options.page_size - len(html) - len("</body></html>"))
+        return (html + "<!-- " + "x" * max(0, padding - 9) + " -->" + "</body></html>").encode()
+
+    @staticmethod
+    def _file_link(post_id: int, name: str) -> str:
+        return f"https://{FILES_HOST}/files/{post_id}/{name}?s=bench"
+
+    def _redirect(self, location: str):
+        self._send(302, b"", {"Location": location})
+
+    def _send(self, status: int, body: bytes, headers: Optional[dict] = None, cookies=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        for cookie in cookies:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self):
+        size = self.server.options.file_size
+        etag = f'"bench-{size}"'
+        start, end = 0, size - 1
+        status = 200
+
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and (not if_range or if_range == etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            status = 206
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                return self.end_headers()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        pos = start
+        while pos <= end:
+            offset = pos % len(BLOCK)
+            length = min(WRITE_CHUNK, len(BLOCK) - offset, end - pos + 1)
+            self.wfile.write(BLOCK[offset:offset + length])
+            pos += length
+
+
+class FakeForumServer(http.server.ThreadingHTTPServer):
+    """
+    Многопоточный сервер-прокси с TLS для туннелей.
+
+    Attributes:
+        options (ServerOptions): Параметры поведения
+        tls (ssl.SSLContext): Серверный TLS-контекст
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, options: ServerOptions, cert: Path, key: Path):
+        super().__init__(address, FakeForumHandler)
+        self.options = options
+        self.tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.tls.load_cert_chain(cert, key)
+        self.tls.set_alpn_protocols(["http/1.1"])
+
+    def handle_error(self, request, client_address):
+        # Клиент закрывает соединение, не дочитав страницу (поиск по потоку), это не ошибка
+        exc = sys.exc_info()[1]
+        if not isinstance(exc, (ConnectionError, ssl.SSLError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def proxy_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def expected_content(start: int, length: int) -> bytes:
+    """
+    Возвращает ожидаемые байты файла, чтобы бенчмарк мог проверить загрузку.
+    """
+    data = bytearray()
+    pos = start
+    while len(data) < length:
+        offset = pos % len(BLOCK)
+        chunk = BLOCK[offset:offset + min(len(BLOCK) - offset, length - len(data))]
+        data += chunk
+        pos += len(chunk)
+    return bytes(data)
+
+
+def serve(options: ServerOptions, ready, directory: Optional[Path] = None):
+    """
+    Запускает сервер и передает (адрес прокси, путь к корневому сертификату) в ready.
+
+    Предназначен для запуска в отдельном процессе, чтобы сервер не делил GIL с клиентом.
+    """
+    directory = Path(directory or tempfile.mkdtemp(prefix="fourpda-bench-"))
+    ca_cert, cert, key = make_certificates(directory)
+    server = FakeForumServer(("127.0.0.1", 0), options, cert, key)
+    ready.send((server.proxy_url, str(ca_cert)))
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный заменитель 4PDA для бенчмарков")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=ServerOptions.page_size)
+    parser.add_argument("--file-size", type=int, default=ServerOptions.file_size)
+    parser.add_argument("--challenge-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix="fourpda-bench-"))
+    ca_cert, cert, key = make_certificates(directory)
+    options = ServerOptions(args.latency, args.jitter, args.page_size, args.file_size, args.challenge_rate)
+    server = FakeForumServer(("127.0.0.1", args.port), options, cert, key)
+    print(f"Прокси: {server.proxy_url}")
+    print(f"Корневой сертификат: SSL_CERT_FILE={ca_cert}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
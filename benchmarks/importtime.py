@@ -0,0 +1,161 @@
+"""
+Проверка времени холодного запуска CLI через python -X importtime.
+
+Запуск из корня репозитория:
+    python -m benchmarks.importtime                  # проверка с бюджетом по умолчанию
+    python -m benchmarks.importtime --budget-ms 80 --top 15
+
+Для каждого сценария запускается отдельный процесс интерпретатора, из вывода
+-X importtime берется суммарное время импорта модулей fourpda_dl и список
+загруженных модулей. Проверка не проходит (код выхода 1), если сценарий без
+сети загрузил сетевой стек (httpx, h2, ssl, asyncio) или превысил бюджет.
+Команды выполняются с временным HOME, поэтому настоящий конфиг не меняется.
+Сценарий u-daemon передает команду u заглушке демона serve (тонкий клиент).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+# Модули, которые не должны загружаться командами без сети
+FORBIDDEN = ("httpx", "httpcore", "h2", "ssl", "asyncio")
+
+# Сценарий: код, который выполняется в отдельном процессе
+SCENARIOS = {
+    "import": "import fourpda_dl.cli",
+    "help": "from fourpda_dl.cli import main; main()",
+    "logout": "from fourpda_dl.cli import main; main()",
+    "cache": "from fourpda_dl.cli import main; main()",
+    "u-daemon": "from fourpda_dl.cli import main; main()",
+}
+ARGV = {
+    "help": ["--help"],
+    "logout": ["logout"],
+    "cache": ["cache", "stats"],
+    "u-daemon": ["u", "https://4pda.to/forum/dl/post/1/file.zip"],
+}
+DEFAULT_BUDGET_MS = 60.0
+DAEMON_TOKEN = "importtime"
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        payload = {"status": "ok"} if self.path == "/health" else {"link": "https://cdn.4pda.ws/file.zip"}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _environment(home: str) -> dict:
+    return dict(os.environ, HOME=home, XDG_DATA_HOME=home, LOCALAPPDATA=home)
+
+
+@contextmanager
+def fake_daemon(home: str) -> Iterator[None]:
+    """
+    Запускает заглушку демона serve и записывает daemon.json во временный HOME.
+    """
+    # Путь к конфигу вычисляется так же, как в дочернем процессе
+    config_file = subprocess.run(
+        [sys.executable, "-c", "from fourpda_dl.config import DEFAULT_CONFIG_FILE; print(DEFAULT_CONFIG_FILE)"],
+        capture_output=True, text=True, env=_environment(home), check=True,
+    ).stdout.strip()
+    daemon_file = Path(config_file).with_name("daemon.json")
+    daemon_file.parent.mkdir(parents=True, exist_ok=True)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DaemonHandler)
+    host, port = server.server_address[:2]
+    daemon_file.write_text(json.dumps({"host": host, "port": port, "pid": os.getpid(),
+                                       "token": DAEMON_TOKEN, "config": config_file}), encoding="utf-8")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon_file.unlink()
+
+
+def measure(name: str, home: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """
+    Выполняет сценарий и разбирает вывод -X importtime.
+
+    Returns:
+        Tuple: (время импорта модулей fourpda_dl в мс, [(собственное время в мс, модуль)])
+    """
+    code = "import sys; sys.argv = ['fourpda-dl'] + sys.argv[1:]; " + SCENARIOS[name]
+    env = _environment(home)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code, *ARGV.get(name, [])],
+                            capture_output=True, text=True, env=env)
+
+    modules, total = [], 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        # Вложенность показана отступом после разделителя
+        module = module[1:]
+        name_only = module.strip()
+        modules.append((int(self_us) / 1000, name_only))
+        # Модули верхнего уровня: их суммарное время включает все вложенные импорты
+        if module == name_only and name_only.startswith("fourpda_dl"):
+            total += int(cumulative_us) / 1000
+    return total, modules
+
+
+def check(budget_ms: float, top: int) -> bool:
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="fourpda-importtime-") as home:
+        for name in SCENARIOS:
+            with fake_daemon(home) if name == "u-daemon" else nullcontext():
+                # Первый запуск прогревает кэш байткода и файловой системы
+                measure(name, home)
+                total, modules = measure(name, home)
+            loaded = {module.split(".")[0] for _, module in modules}
+            forbidden = sorted(loaded.intersection(FORBIDDEN))
+
+            status = "ok"
+            if forbidden:
+                status = "загружен сетевой стек: " + ", ".join(forbidden)
+                ok = False
+            elif total > budget_ms:
+                status = f"превышен бюджет {budget_ms:g} мс"
+                ok = False
+            print(f"{name:<14}{total:8.1f} мс  модулей: {len(modules):<4} {status}")
+
+            if top:
+                heaviest: Dict[str, float] = {}
+                for self_ms, module in modules:
+                    heaviest[module] = heaviest.get(module, 0) + self_ms
+                for module, self_ms in sorted(heaviest.items(), key=lambda item: -item[1])[:top]:
+                    print(f"    {self_ms:7.1f} мс  {module}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка времени импорта CLI fourpda-dl")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Допустимое время импорта модулей fourpda_dl в одном сценарии")
+    parser.add_argument("--top", type=int, default=0, help="Показать N самых долгих модулей сценария")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.budget_ms, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
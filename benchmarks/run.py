@@ -0,0 +1,237 @@
+"""
+Бенчмарки получения ссылок, авторизации и загрузки на локальном заменителе 4PDA.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run                       # все сценарии
+    python -m benchmarks.run resolve -n 2000 -j 32 --latency 0.02
+    python -m benchmarks.run download --file-size 268435456 --segments 8 --json result.json
+
+Сервер (benchmarks/fake_server.py) запускается в отдельном процессе, сессия
+работает через него как через прокси, поэтому измеряется тот же код, что
+используется с настоящим форумом. Для создания сертификатов нужна утилита openssl.
+"""
+import argparse
+import builtins
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from fourpda_dl.auth import login
+from fourpda_dl.batch import resolve_batch
+from fourpda_dl.config import Config
+from fourpda_dl.download import download_file
+from fourpda_dl.proxy import Proxy, ProxyPool
+from fourpda_dl.ratelimit import RateLimiter
+from fourpda_dl.session import FourPDASession, validate_authentication
+
+from .fake_server import ServerOptions, expected_content, serve
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("resolve", "validate", "login", "download")
+MIB = 1024 * 1024
+
+
+@contextmanager
+def fake_server(options: ServerOptions) -> Iterator[str]:
+    """
+    Запускает заменитель 4PDA в отдельном процессе.
+
+    Yields:
+        str: Адрес прокси, через который сессия попадает на сервер
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=serve, args=(options, sender), daemon=True)
+    process.start()
+    try:
+        proxy_url, ca_cert = receiver.recv()
+        os.environ["SSL_CERT_FILE"] = ca_cert
+        yield proxy_url
+    finally:
+        process.terminate()
+        process.join()
+
+
+def make_session(proxy_url: str, directory: Path, member_id: int) -> FourPDASession:
+    """
+    Создает сессию с авторизованным конфигом во временной директории.
+    Ограничитель частоты поднят, чтобы измерялась библиотека, а не пауза между запросами.
+    """
+    config = Config(directory / "config.json")
+    config.username = "bench"
+    config.set_cookie("member_id", str(member_id))
+    config.set_cookie("pass_hash", "bench")
+    config.save()
+    rate_limiter = RateLimiter(rate=100000, max_rate=100000, burst=100000)
+    return FourPDASession(config, rate_limiter, proxies=ProxyPool([Proxy(proxy_url)]))
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return round(values[index], 2)
+
+
+def peak_rss_mib() -> Optional[float]:
+    """
+    Пиковый объем памяти процесса бенчмарка (без сервера) в MiB.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает KiB, macOS — байты
+    return round(peak / (MIB if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_report(name: str, latencies_ms: List[float], elapsed: float, errors: int = 0) -> dict:
+    return {
+        "scenario": name,
+        "count": len(latencies_ms),
+        "errors": errors,
+        "per_second": round(len(latencies_ms) / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p99_ms": percentile(latencies_ms, 99),
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def timed(func: Callable[[], object], count: int) -> Iterator[float]:
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        yield (time.perf_counter() - started) * 1000
+
+
+def bench_resolve(session, args) -> List[dict]:
+    reports = []
+    modes = {"redirect": 1, "attach": 2}
+    for mode, first in modes.items():
+        urls = [f"https://4pda.to/forum/dl/post/{first + 2 * i}/file{i}.zip" for i in range(args.count)]
+        started = time.perf_counter()
+        records = list(resolve_batch(session, session.config, urls, args.jobs, timeout=args.timeout))
+        elapsed = time.perf_counter() - started
+        latencies = [record["elapsed_ms"] for record in records if "link" in record]
+        reports.append(latency_report(f"resolve:{mode}", latencies, elapsed, len(records) - len(latencies)))
+    return reports
+
+
+def bench_validate(session, args) -> List[dict]:
+    reports = []
+    count = max(1, args.count // 10)
+    for name, probe in (("validate", False), ("validate:probe", True)):
+        started = time.perf_counter()
+        latencies = list(timed(lambda: validate_authentication(session.config, session, probe=probe), count))
+        reports.append(latency_report(name, latencies, time.perf_counter() - started))
+    return reports
+
+
+def bench_login(session, args) -> List[dict]:
+    count = max(1, args.count // 20)
+    cwd, answer = os.getcwd(), builtins.input
+    # Капча сохраняется в текущую директорию, а решение вводится с клавиатуры
+    os.chdir(args.workdir)
+    builtins.input = lambda prompt="": "0000"
+    try:
+        started = time.perf_counter()
+        latencies = list(timed(lambda: login(session, session.config, "bench", "bench"), count))
+    finally:
+        os.chdir(cwd)
+        builtins.input = answer
+    return [latency_report("login", latencies, time.perf_counter() - started)]
+
+
+def bench_download(session, args) -> List[dict]:
+    reports = []
+    sample = expected_content(0, min(args.file_size, MIB))
+    for segments in sorted({1, args.segments}):
+        output = Path(args.workdir) / f"download-{segments}.bin"
+        started = time.perf_counter()
+        path = download_file(session, session.config, "https://4pda.to/forum/dl/post/1/file.bin", output,
+                             progress=False, segments=segments, min_segment_size=MIB)
+        elapsed = time.perf_counter() - started
+
+        size = path.stat().st_size
+        with open(path, "rb") as f:
+            valid = size == args.file_size and f.read(len(sample)) == sample
+        path.unlink()
+
+        reports.append({
+            "scenario": f"download:{segments}",
+            "bytes": size,
+            "valid": valid,
+            "seconds": round(elapsed, 3),
+            "mib_per_second": round(size / MIB / elapsed, 1),
+            "peak_rss_mib": peak_rss_mib(),
+        })
+    return reports
+
+
+BENCHMARKS = {
+    "resolve": bench_resolve,
+    "validate": bench_validate,
+    "login": bench_login,
+    "download": bench_download,
+}
+
+
+def print_report(report: dict):
+    name = report.pop("scenario")
+    print(f"{name:<18}" + "  ".join(f"{key}={value}" for key, value in report.items()))
+    report["scenario"] = name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки fourpda-dl на локальном заменителе 4PDA")
+    parser.add_argument("scenarios", nargs="*", help=f"Сценарии: {', '.join(SCENARIOS)} (по умолчанию все)")
+    parser.add_argument("-n", "--count", type=int, default=500, help="Число ссылок в сценарии resolve")
+    parser.add_argument("-j", "--jobs", type=int, default=16, help="Параллельные запросы в сценарии resolve")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Бюджет времени на одну ссылку")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа 4pda.to в секундах")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке в секундах")
+    parser.add_argument("--page-size", type=int, default=ServerOptions.page_size, help="Размер страниц форума")
+    parser.add_argument("--file-size", type=int, default=ServerOptions.file_size, help="Размер файла на 4pda.ws")
+    parser.add_argument("--segments", type=int, default=8, help="Соединения в параллельном сценарии download")
+    parser.add_argument("--challenge-rate", type=float, default=0.0,
+                        help="Доля запросов к 4pda.to с проверкой Cloudflare")
+    parser.add_argument("--json", help="Записать результаты в JSON-файл")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.ERROR, stream=sys.stderr)
+
+    options = ServerOptions(args.latency, args.jitter, args.page_size, args.file_size, args.challenge_rate)
+    reports = []
+
+    with tempfile.TemporaryDirectory(prefix="fourpda-bench-") as workdir, fake_server(options) as proxy_url:
+        args.workdir = workdir
+        session = make_session(proxy_url, Path(workdir), options.member_id)
+        try:
+            for name in args.scenarios or SCENARIOS:
+                for report in BENCHMARKS[name](session, args):
+                    print_report(report)
+                    reports.append(report)
+        finally:
+            session.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(options), "results": reports}, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
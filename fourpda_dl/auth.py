@@ -3,10 +3,18 @@ import os
 import re
 import sys
 
+from .scanner import async_scan_stream, scan_stream
+from .tracing import span
 from .utils import confirmation_request
 
 CAPTCHA_FILENAME = "captcha.gif"
 
+CAPTCHA_PATTERNS = {
+    "captcha_time": re.compile(r'name="captcha-time"[^>]*value="([^"]*)"'),
+    "captcha_sig": re.compile(r'name="captcha-sig"[^>]*value="([^"]*)"'),
+    "captcha_url": re.compile(r'<img[^>]*src="([^"]*)"[^>]*data-captcha="renew-login"'),
+}
+
 def login(session, config, username: str, password: str, pass_authenticated: bool = True):
     """
     Выполняет авторизацию на форуме 4PDA.
@@ -35,53 +43,163 @@ def login(session, config, username: str, password: str, pass_authenticated: boo
     
     Notes:
         - При существующей авторизации запрашивает подтверждение переавторизации
+        - Перед авторизацией удаляет из сессии cookies прежнего аккаунта, кроме cf_clearance
         - Сохраняет cookies (member_id, pass_hash, cf_clearance)в конфиг
         - Временный файл капчи автоматически удаляется после использования
     """
 
-    if config.is_authenticated() and not pass_authenticated:
-        logging.info("В конфиге уже есть авторизованный аккаунт.")
-        logging.info(f"Для проверки авторизации используйте: python {sys.argv[0]} verify")
-        relogin = confirmation_request("Желаете продолжить авторизацию?", False)
-        if not relogin:
-            return False
+    if not _confirm_relogin(config, pass_authenticated):
+        return False
+
+    logging.info("Запуск авторизации...")
+    session.reset_cookies()
+
+    # Страница читается потоково до тех пор, пока не найдены все поля капчи
+    with session.stream(
+        "GET",
+        f"{session.base_url}/forum/index.php?act=auth",
+        follow_redirects=True,
+        phase="auth-page"
+    ) as request:
+        _check_auth_page(request)
+        captcha_time, captcha_sig, captcha_url = _extract_captcha(
+            scan_stream(request.iter_text(), CAPTCHA_PATTERNS))
+
+    with span("captcha", "auth"):
+        captcha = session.get(captcha_url, phase="captcha")
+        _save_captcha(captcha.content)
+
+        captcha = input("Введите решение капчи: ")
+
+    request = session.post(
+        f"{session.base_url}/forum/index.php?act=auth",
+        data=_login_form(session, username, password, captcha, captcha_time, captcha_sig),
+        follow_redirects=False,
+        phase="login-post"
+    )
+
+    return _apply_login_response(config, username, request)
+
+
+async def async_login(session, config, username: str, password: str, pass_authenticated: bool = True):
+    """
+    Асинхронная версия login для AsyncFourPDASession.
+
+    Ввод решения капчи и подтверждение переавторизации выполняются
+    в отдельном потоке, чтобы не блокировать event loop.
+
+    Args:
+        session: Асинхронная сессия для выполнения HTTP-запросов
+        config: Объект конфигурации для сохранения авторизационных данных
+        username (str): Логин пользователя
+        password (str): Пароль пользователя
+        pass_authenticated (bool, optional): Пропускать проверку существующей авторизации.
+
+    Returns:
+        bool: True если авторизация успешна, False в противном случае
+    """
+    # asyncio уже загружен event loop'ом; импорт на уровне модуля замедлил бы logout в CLI
+    import asyncio
+
+    if not await asyncio.to_thread(_confirm_relogin, config, pass_authenticated):
+        return False
 
     logging.info("Запуск авторизации...")
+    session.reset_cookies()
 
-    request = session.get(
+    async with session.stream(
+        "GET",
         f"{session.base_url}/forum/index.php?act=auth",
-        follow_redirects=True
+        follow_redirects=True,
+        phase="auth-page"
+    ) as request:
+        _check_auth_page(request)
+        captcha_time, captcha_sig, captcha_url = _extract_captcha(
+            await async_scan_stream(request.aiter_text(), CAPTCHA_PATTERNS))
+
+    with span("captcha", "auth"):
+        captcha = await session.get(captcha_url, phase="captcha")
+        await asyncio.to_thread(_save_captcha, captcha.content)
+
+        captcha = await asyncio.to_thread(input, "Введите решение капчи: ")
+
+    request = await session.post(
+        f"{session.base_url}/forum/index.php?act=auth",
+        data=_login_form(session, username, password, captcha, captcha_time, captcha_sig),
+        follow_redirects=False,
+        phase="login-post"
     )
 
+    return _apply_login_response(config, username, request)
+
+
+def _confirm_relogin(config, pass_authenticated: bool) -> bool:
+    """
+    Запрашивает подтверждение, если в конфиге уже есть авторизованный аккаунт.
+
+    Returns:
+        bool: True если авторизацию нужно продолжить
+    """
+    if config.is_authenticated() and not pass_authenticated:
+        logging.info("В конфиге уже есть авторизованный аккаунт.")
+        logging.info("Для проверки авторизации используйте: python %s verify", sys.argv[0])
+        return confirmation_request("Желаете продолжить авторизацию?", False)
+    return True
+
+
+def _check_auth_page(request):
+    """
+    Проверяет код ответа страницы авторизации.
+
+    Raises:
+        ValueError: При неожиданном коде ответа сервера
+    """
     if request.status_code != 200:
         raise ValueError(f"Неожиданный код-ответ сервера: {request.status_code}")
 
-    html = request.text
 
-    def extract(pattern):
-        m = re.search(pattern, html)
-        return m.group(1) if m else None
+def _extract_captcha(found: dict):
+    """
+    Извлекает данные капчи из результата поиска по странице авторизации.
 
-    captcha_time = extract(r'name="captcha-time"[^>]*value="([^"]*)"')
-    captcha_sig  = extract(r'name="captcha-sig"[^>]*value="([^"]*)"')
-    captcha_url  = extract(r'<img[^>]*src="([^"]*)"[^>]*data-captcha="renew-login"')
+    Args:
+        found (dict): Результат scan_stream с шаблонами CAPTCHA_PATTERNS
+
+    Returns:
+        tuple: (captcha_time, captcha_sig, captcha_url)
+
+    Raises:
+        KeyError: При невозможности получить данные капчи
+    """
+    captcha_time = found["captcha_time"]
+    captcha_sig = found["captcha_sig"]
+    captcha_url = found["captcha_url"]
 
     if not all([captcha_time, captcha_sig, captcha_url]):
         raise KeyError("Не удалось получить данные капчи, попробуйте авторизоваться снова.")
 
-    logging.debug(f"Получили captcha_time: {captcha_time}")
-    logging.debug(f"Получили captcha_sig: {captcha_sig}")
-    logging.debug(f"Получили URL капчи: {captcha_url}")
-    logging.debug(f"Загружаем капчу в файл: {CAPTCHA_FILENAME}")
+    logging.debug("Получили captcha_time: %s", captcha_time)
+    logging.debug("Получили captcha_sig: %s", captcha_sig)
+    logging.debug("Получили URL капчи: %s", captcha_url)
+
+    return captcha_time, captcha_sig, captcha_url
+
 
-    captcha = session.get(captcha_url)
+def _save_captcha(content: bytes):
+    """
+    Сохраняет изображение капчи в CAPTCHA_FILENAME.
+    """
+    logging.debug("Загружаем капчу в файл: %s", CAPTCHA_FILENAME)
     with open(CAPTCHA_FILENAME, "wb") as f:
-        f.write(captcha.content)
+        f.write(content)
+    logging.info("Капча сохранена в файл: %s", CAPTCHA_FILENAME)
 
-    logging.info(f"Капча сохранена в файл: {CAPTCHA_FILENAME}")
-    captcha = input("Введите решение капчи: ")
 
-    data = {
+def _login_form(session, username: str, password: str, captcha: str, captcha_time: str, captcha_sig: str) -> dict:
+    """
+    Собирает данные формы авторизации.
+    """
+    return {
         "return": session.base_url + '/',
         "login": username,
         "password": password,
@@ -91,16 +209,19 @@ def login(session, config, username: str, password: str, pass_authenticated: boo
         "captcha-sig": captcha_sig,
     }
 
-    request = session.post(
-        f"{session.base_url}/forum/index.php?act=auth",
-        data=data, follow_redirects=False
-    )
 
+def _apply_login_response(config, username: str, request) -> bool:
+    """
+    Разбирает ответ на отправку формы авторизации и сохраняет cookies в конфиг.
+
+    Returns:
+        bool: True если авторизация успешна, False в противном случае
+    """
     os.remove(CAPTCHA_FILENAME)
-    logging.debug(f"Файл {CAPTCHA_FILENAME} был удален")
+    logging.debug("Файл %s был удален", CAPTCHA_FILENAME)
 
     if "member_id" in request.cookies and "pass_hash" in request.cookies:
-        logging.info(f"Авторизован как: {username}")
+        logging.info("Авторизован как: %s", username)
         session_cookies = dict(request.cookies)
         cf_clearance = session_cookies.get("cf_clearance")
         if cf_clearance:
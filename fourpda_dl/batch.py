@@ -0,0 +1,144 @@
+import json
+import logging
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .defaults import DEFAULT_JOBS, DEFAULT_RESOLVE_TIMEOUT
+from .downloader import get_direct_link, parse_url
+from .tracing import span
+
+
+def read_urls(source: str) -> List[str]:
+    """
+    Читает ссылки из файла или stdin.
+
+    Пустые строки и строки, начинающиеся с #, пропускаются.
+
+    Args:
+        source (str): Путь к файлу или "-" для чтения из stdin
+
+    Returns:
+        List[str]: Список ссылок в исходном порядке
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+def normalize_urls(base_url: str, urls: Iterable[str]) -> Tuple[List[Tuple[str, int, str]], List[str]]:
+    """
+    Нормализует ссылки через parse_url и удаляет дубликаты.
+
+    Args:
+        base_url (str): Базовый домен
+        urls (Iterable[str]): Исходные DL-ссылки
+
+    Returns:
+        Tuple: (список (url, post_id, file_name) без дубликатов, список невалидных ссылок)
+    """
+    seen = set()
+    valid = []
+    invalid = []
+
+    for raw_url in urls:
+        post_id, file_name = parse_url(base_url, raw_url)
+        if not all([post_id, file_name]):
+            invalid.append(raw_url)
+            continue
+        if (post_id, file_name) in seen:
+            continue
+        seen.add((post_id, file_name))
+        valid.append((f"{base_url}/forum/dl/post/{post_id}/{file_name}", post_id, file_name))
+
+    return valid, invalid
+
+
+def _resolve_one(session, config, url: str, post_id: int, cache=None,
+                 timeout: Optional[float] = DEFAULT_RESOLVE_TIMEOUT, pool=None) -> dict:
+    started = time.perf_counter()
+    record = {"url": url, "post_id": post_id}
+
+    def resolve(account):
+        record["account"] = account.name
+        return get_direct_link(account.session, account.config, url, cache, timeout)
+
+    try:
+        with span("resolve", "batch", url=url):
+            if pool is not None:
+                link = pool.run(resolve)
+            else:
+                link = get_direct_link(session, config, url, cache, timeout)
+    except Exception as e:
+        logging.debug("Ошибка при получении ссылки %s: %r", url, e)
+        record["error"] = type(e).__name__
+    else:
+        if link:
+            record["link"] = link
+        else:
+            record["error"] = "FileNotFound"
+
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Ссылка %s обработана за %.0f мс", url, record["elapsed_ms"],
+                      extra={"post_id": post_id, "url": url, "elapsed": record["elapsed_ms"],
+                             "status": record.get("error", "ok"), "account": record.get("account")})
+    return record
+
+
+def resolve_batch(session, config, urls: Iterable[str], jobs: int = DEFAULT_JOBS, cache=None,
+                  timeout: Optional[float] = DEFAULT_RESOLVE_TIMEOUT, pool=None) -> Iterator[dict]:
+    """
+    Получает прямые ссылки для набора DL-ссылок через одну общую сессию.
+
+    Ссылки нормализуются и дедуплицируются, затем обрабатываются параллельно
+    не более чем в jobs потоках. Результаты отдаются по мере готовности,
+    поэтому их порядок может не совпадать с порядком входных ссылок.
+
+    Args:
+        session: Сессия FourPDASession, общая для всех потоков
+        config: Объект конфигурации с авторизационными данными
+        urls (Iterable[str]): DL-ссылки
+        jobs (int, optional): Максимальное число одновременных запросов
+        cache (LinkCache, optional): Общий кэш прямых ссылок
+        timeout (Optional[float]): Бюджет времени на одну ссылку в секундах
+        pool (SessionPool, optional): Пул аккаунтов; если указан, ссылки получаются
+            через его сессии, а session используется только для нормализации ссылок
+
+    Yields:
+        dict: Запись с полями url, post_id, link или error, elapsed_ms (и account при работе через пул)
+    """
+    valid, invalid = normalize_urls(session.base_url, urls)
+
+    for raw_url in invalid:
+        yield {"url": raw_url, "post_id": None, "error": "ValueError", "elapsed_ms": 0.0}
+
+    logging.info("Ссылок к обработке: %d (потоков: %d)", len(valid), jobs)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [
+            executor.submit(_resolve_one, session, config, url, post_id, cache, timeout, pool)
+            for url, post_id, _ in valid
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def write_ndjson(records: Iterable[dict], output=None):
+    """
+    Пишет записи в формате NDJSON, сбрасывая буфер после каждой строки.
+
+    Args:
+        records (Iterable[dict]): Записи для вывода
+        output: Файловый объект для записи, по умолчанию sys.stdout
+    """
+    output = output or sys.stdout
+    for record in records:
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
@@ -0,0 +1,338 @@
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Set, Tuple
+
+from .config import DEFAULT_CONFIG_DIR
+from .storage import atomic_write_json, file_lock, load_json
+
+DEFAULT_CACHE_FILE = DEFAULT_CONFIG_DIR / "links_cache.json"
+ATTACH_INDEX_NAME = "attach_index.json"
+
+# Подписанные ссылки 4pda.ws живут ограниченное время, берем запас,
+# чтобы не отдавать из кэша ссылку, которая вот-вот истечет
+DEFAULT_TTL = 30 * 60
+# Отсутствие доступа к файлу (404) может поменяться, поэтому помним его недолго
+DEFAULT_NEGATIVE_TTL = 5 * 60
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_INDEX_MAX_ENTRIES = 20000
+# Как часто сбрасывать изменения на диск при частых записях
+SAVE_INTERVAL = 2.0
+
+
+def cache_key(post_id: int, file_name: str) -> str:
+    return f"{post_id}/{file_name}"
+
+
+def account_key(config) -> str:
+    """
+    Возвращает ключ аккаунта для записей кэша: путь к его конфигу.
+
+    Доступ к файлу зависит от аккаунта, поэтому ссылки и негативные записи
+    одного аккаунта (--account, пул) не отдаются другому.
+    """
+    return str(config.path)
+
+
+class _LRUStore:
+    """
+    Потокобезопасное персистентное хранилище записей с LRU-вытеснением.
+
+    Записи хранятся в JSON-файле и упорядочены по последнему обращению.
+    Изменения сбрасываются на диск не чаще чем раз в SAVE_INTERVAL секунд
+    и при явном вызове save(). Файл могут одновременно использовать несколько
+    процессов (batch, watch, демон): при сохранении он перечитывается под
+    блокировкой, и поверх записываются только измененные этим процессом записи.
+
+    Attributes:
+        path (Path): Путь к файлу хранилища
+        max_entries (int): Максимальное число записей
+    """
+
+    def __init__(self, path: Path, max_entries: int):
+        self.path = Path(path)
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._changed: Set[str] = set()
+        self._last_save = 0.0
+
+        data = load_json(self.path, {})
+        self._entries = self._ordered(data.get("entries", {}))
+        self._load_extra(data)
+
+    @staticmethod
+    def _ordered(entries: dict) -> OrderedDict:
+        # В начале самые давно использованные записи
+        return OrderedDict(sorted(entries.items(), key=lambda item: item[1].get("used", 0)))
+
+    def _load_extra(self, data: dict):
+        pass
+
+    def _merge_extra(self, disk: dict) -> dict:
+        return {}
+
+    def _is_expired(self, entry: dict, now: float) -> bool:
+        return False
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        """
+        Возвращает актуальную запись и отмечает обращение к ней. Вызывается под блокировкой.
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+
+        if entry is not None and self._is_expired(entry, now):
+            del self._entries[key]
+            self._changed.add(key)
+            self._dirty = True
+            entry = None
+
+        if entry is not None:
+            entry["used"] = now
+            self._entries.move_to_end(key)
+            self._changed.add(key)
+            self._dirty = True
+
+        return entry
+
+    def _store(self, key: str, entry: dict):
+        """
+        Сохраняет запись, вытесняя самые старые при переполнении. Вызывается под блокировкой.
+        """
+        now = time.time()
+        entry.setdefault("created", now)
+        entry["used"] = now
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._changed.add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        self._dirty = True
+        if now - self._last_save >= SAVE_INTERVAL:
+            self._save_locked()
+
+    def invalidate(self, post_id: int, file_name: str):
+        """
+        Удаляет запись, например если она оказалась недействительной.
+        """
+        self._remove(cache_key(post_id, file_name))
+
+    def _remove(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._changed.add(key)
+                self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def purge(self):
+        """
+        Полностью очищает хранилище и удаляет его файл.
+        """
+        with self._lock, file_lock(self.path):
+            self._entries.clear()
+            self._load_extra({})
+            self._changed.clear()
+            self._dirty = False
+            if self.path.exists():
+                self.path.unlink()
+
+    def save(self):
+        """
+        Сохраняет хранилище на диск, если в нем были изменения.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    def _save_locked(self):
+        """
+        Записывает хранилище, объединяя его с версией на диске. Вызывается под блокировкой.
+        """
+        now = time.time()
+        with file_lock(self.path):
+            disk = load_json(self.path, {})
+            entries = disk.get("entries", {})
+            for key in self._changed:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+
+            entries = self._ordered({k: v for k, v in entries.items() if not self._is_expired(v, now)})
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            atomic_write_json(self.path, {"entries": entries, **self._merge_extra(disk)})
+
+        # Записи других процессов становятся видны и этому
+        self._entries = entries
+        self._changed.clear()
+        self._dirty = False
+        self._last_save = now
+        logging.debug("Сохранено: %s", self.path)
+
+
+class AttachIndex(_LRUStore):
+    """
+    Персистентный индекс (post_id, file_name) -> ссылка act=attach.
+
+    Ссылка на attachment для поста и файла не меняется, поэтому при повторном
+    получении прямой ссылки можно сразу запросить attachment и пропустить
+    страницу загрузки. Устаревшие записи удаляются вызывающей стороной
+    через invalidate().
+    """
+
+    def __init__(self, path: Path = DEFAULT_CONFIG_DIR / ATTACH_INDEX_NAME,
+                 max_entries: int = DEFAULT_INDEX_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    def get(self, post_id: int, file_name: str) -> Optional[str]:
+        """
+        Возвращает известную ссылку на attachment или None.
+        """
+        with self._lock:
+            entry = self._lookup(cache_key(post_id, file_name))
+            return entry["attach"] if entry else None
+
+    def set(self, post_id: int, file_name: str, attach_url: str):
+        """
+        Запоминает ссылку на attachment для поста и файла.
+        """
+        with self._lock:
+            self._store(cache_key(post_id, file_name), {"attach": attach_url})
+
+
+class LinkCache(_LRUStore):
+    """
+    Персистентный кэш прямых ссылок с TTL, негативными записями и LRU-вытеснением.
+
+    Ключ — аккаунт (account_key) и нормализованная пара (post_id, file_name)
+    из parse_url. Хранится в JSON-файле рядом с config.json. Потокобезопасен,
+    поэтому один экземпляр можно разделять между потоками batch режима
+    и аккаунтами пула. Рядом хранится индекс ссылок на attachment
+    (attachments), который живет дольше самих прямых ссылок и общий для всех
+    аккаунтов: устаревшие записи индекса обновляются при получении ссылки.
+
+    Attributes:
+        path (Path): Путь к файлу кэша
+        ttl (float): Время жизни прямой ссылки в секундах
+        negative_ttl (float): Время жизни записи об отсутствии доступа в секундах
+        max_entries (int): Максимальное число записей
+        attachments (AttachIndex): Индекс ссылок на attachment
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 attachments: Optional[AttachIndex] = None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        super().__init__(path, max_entries)
+        self.attachments = attachments or AttachIndex(self.path.with_name(ATTACH_INDEX_NAME))
+
+    @staticmethod
+    def key(post_id: int, file_name: str, account: str = "") -> str:
+        return f"{account}|{cache_key(post_id, file_name)}" if account else cache_key(post_id, file_name)
+
+    def _load_extra(self, data: dict):
+        self.hits = data.get("hits", 0)
+        self.misses = data.get("misses", 0)
+        self._saved_counts = (self.hits, self.misses)
+
+    def _merge_extra(self, disk: dict) -> dict:
+        # К счетчикам на диске (с учетом других процессов) добавляется приращение этого процесса
+        saved_hits, saved_misses = self._saved_counts
+        self.hits = disk.get("hits", 0) + self.hits - saved_hits
+        self.misses = disk.get("misses", 0) + self.misses - saved_misses
+        self._saved_counts = (self.hits, self.misses)
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _is_expired(self, entry: dict, now: float) -> bool:
+        ttl = self.ttl if entry.get("link") else self.negative_ttl
+        return now - entry.get("created", 0) > ttl
+
+    def get(self, post_id: int, file_name: str, account: str = "") -> Tuple[bool, Optional[str]]:
+        """
+        Ищет ссылку в кэше.
+
+        Args:
+            post_id (int): ID поста
+            file_name (str): Имя файла (URL encoded)
+            account (str, optional): Ключ аккаунта (account_key)
+
+        Returns:
+            Tuple[bool, Optional[str]]: (найдена ли запись, ссылка или None для негативной записи)
+        """
+        with self._lock:
+            entry = self._lookup(self.key(post_id, file_name, account))
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, entry.get("link")
+
+    def set(self, post_id: int, file_name: str, link: Optional[str], account: str = ""):
+        """
+        Сохраняет ссылку в кэш. None сохраняется как негативная запись.
+
+        Args:
+            post_id (int): ID поста
+            file_name (str): Имя файла (URL encoded)
+            link (Optional[str]): Прямая ссылка или None, если доступа к файлу нет
+            account (str, optional): Ключ аккаунта (account_key)
+        """
+        with self._lock:
+            self._store(self.key(post_id, file_name, account), {"link": link})
+
+    def invalidate(self, post_id: int, file_name: str, account: str = ""):
+        """
+        Удаляет запись аккаунта, например если ссылка истекла раньше TTL.
+        """
+        self._remove(self.key(post_id, file_name, account))
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику кэша.
+
+        Returns:
+            dict: Число записей (всего, прямых ссылок, негативных, истекших), попаданий,
+                  промахов и записей индекса attachment
+        """
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+            hits, misses = self.hits, self.misses
+
+        return {
+            "path": str(self.path),
+            "entries": len(entries),
+            "links": sum(1 for e in entries if e.get("link")),
+            "negative": sum(1 for e in entries if not e.get("link")),
+            "expired": sum(1 for e in entries if self._is_expired(e, now)),
+            "hits": hits,
+            "misses": misses,
+            "attachments": len(self.attachments),
+        }
+
+    def purge(self):
+        """
+        Полностью очищает кэш и индекс attachment и удаляет их файлы.
+        """
+        super().purge()
+        self.attachments.purge()
+
+    def save(self):
+        """
+        Сохраняет кэш и индекс attachment на диск, если в них были изменения.
+        """
+        super().save()
+        self.attachments.save()
@@ -1,11 +1,35 @@
 import argparse
 import logging
+import sys
 
-from .auth import login, logout
-from .config import DEFAULT_CONFIG_FILE, Config
-from .downloader import get_direct_link
+# Модули с сетевым стеком (httpx, h2, ssl) импортируются внутри команд, которым нужна сеть:
+# CLI вызывают скриптами тысячи раз в день, и logout, cache или --help не должны за них платить.
+# Время импорта проверяет benchmarks/importtime.py
+from .cache import LinkCache
+from .config import DEFAULT_CONFIG_FILE, Config, account_config_path
+from .defaults import (BASE_URL, DEFAULT_AUTH_TTL, DEFAULT_CHUNK_SIZE, DEFAULT_HOST, DEFAULT_INTERVAL,
+                       DEFAULT_JOB_ATTEMPTS, DEFAULT_JOBS, DEFAULT_MAX_RATE, DEFAULT_MIN_SEGMENT_SIZE, DEFAULT_PORT,
+                       DEFAULT_RATE, DEFAULT_RESOLVE_TIMEOUT, DEFAULT_RETRIES, DEFAULT_TOPIC_JOBS, DEFAULT_WORKERS,
+                       LEAST_LOADED, STRATEGIES)
 from .logger import setup_logger
-from .session import FourPDASession, validate_authentication
+from .metrics import Metrics
+from .proxy import ProxyPool
+from .tracing import start as start_tracing, stop as stop_tracing
+
+# Параметры, которые демон не принимает (значения по умолчанию):
+# если какой-то из них задан, команда выполняется без демона
+LOCAL_ONLY_OPTIONS = {
+    "account": None,
+    "no_cache": False,
+    "proxy": None,
+    "proxies": False,
+    "rate": DEFAULT_MAX_RATE,
+    "retries": DEFAULT_RETRIES,
+    "chunk_size": DEFAULT_CHUNK_SIZE,
+    "min_segment_size": DEFAULT_MIN_SEGMENT_SIZE,
+    "metrics": None,
+    "trace": None,
+}
 
 
 def main():
@@ -16,7 +40,75 @@ def main():
         "--log",
         type=str,
         default="",
-        help='Флаги логгера: d=debug, t=время, c=цвет (пример: "dtc")'
+        help='Флаги логгера: d=debug, t=время, c=цвет, j=JSON Lines (пример: "dtc")'
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Не использовать кэш прямых ссылок"
+    )
+
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Не передавать запросы запущенному демону"
+    )
+
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_MAX_RATE,
+        help="Максимальная частота запросов к одному хосту в секунду"
+    )
+
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help="Максимальное число попыток для запроса"
+    )
+
+    parser.add_argument(
+        "--account",
+        help="Использовать аккаунт из пула (accounts/<имя>.json) вместо основного конфига"
+    )
+
+    parser.add_argument(
+        "--pool",
+        action="store_true",
+        help="Распределять запросы между всеми аккаунтами пула (batch, post, topic, watch, verify)"
+    )
+
+    parser.add_argument(
+        "--pool-strategy",
+        choices=STRATEGIES,
+        default=LEAST_LOADED,
+        help="Стратегия выбора аккаунта из пула"
+    )
+
+    parser.add_argument(
+        "--proxy",
+        action="append",
+        help="Выходной прокси (http://, socks5://), можно указать несколько раз"
+    )
+
+    parser.add_argument(
+        "--proxies",
+        action="store_true",
+        help="Использовать все прокси из proxies.json"
+    )
+
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="При выходе записать метрики запросов в файл (.json — JSON, иначе формат Prometheus)"
+    )
+
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Записать временную шкалу выполнения в формате Chrome Trace (chrome://tracing, Perfetto)"
     )
 
     subparsers = parser.add_subparsers(dest="cmd", required=True)
@@ -28,27 +120,277 @@ def main():
     p_u = subparsers.add_parser("u", help="Получить прямую ссылку")
     p_u.add_argument("url")
 
-    subparsers.add_parser("verify", help="Проверить актуальность авторизации")
+    p_batch = subparsers.add_parser("batch", help="Получить прямые ссылки для списка (NDJSON)")
+    p_batch.add_argument("file", nargs="?", default="-", help="Файл со ссылками, по умолчанию stdin")
+    p_batch.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS, help="Число одновременных запросов")
+    p_batch.add_argument("--timeout", type=float, default=DEFAULT_RESOLVE_TIMEOUT,
+                         help="Бюджет времени на одну ссылку в секундах, включая повторы")
+
+    p_post = subparsers.add_parser("post", help="Получить прямые ссылки на все вложения поста (NDJSON)")
+    p_post.add_argument("target", help="ID поста или ссылка на него")
+
+    p_topic = subparsers.add_parser("topic", help="Получить прямые ссылки на все вложения темы (NDJSON)")
+    p_topic.add_argument("target", help="ID темы или ссылка на нее")
+
+    p_watch = subparsers.add_parser("watch", help="Следить за новыми вложениями в темах (NDJSON)")
+    p_watch.add_argument("targets", nargs="+", help="ID тем или ссылки на них")
+    p_watch.add_argument("-i", "--interval", type=float, default=DEFAULT_INTERVAL, help="Интервал опроса в секундах")
+    p_watch.add_argument("--topic-jobs", type=int, default=DEFAULT_TOPIC_JOBS,
+                         help="Число тем, опрашиваемых одновременно")
+    p_watch.add_argument("-d", "--download", metavar="DIR", help="Сразу скачивать новые файлы в директорию")
+    p_watch.add_argument("-q", "--queue", action="store_true",
+                         help="Добавлять новые файлы в очередь загрузок (в директорию из -d)")
+    p_watch.add_argument("--once", action="store_true", help="Выполнить один опрос и выйти")
+    p_watch.add_argument("--backfill", action="store_true",
+                         help="При первом опросе вывести вложения с последней страницы темы")
+
+    for p in (p_post, p_topic, p_watch):
+        p.add_argument("--glob", help='Шаблон имени файла, например "*.zip"')
+        p.add_argument("--regex", help="Регулярное выражение для имени файла")
+        p.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS, help="Число одновременных запросов")
+        p.add_argument("--timeout", type=float, default=DEFAULT_RESOLVE_TIMEOUT,
+                       help="Бюджет времени на одну ссылку в секундах, включая повторы")
+
+    p_download = subparsers.add_parser("download", help="Скачать файл по ссылке")
+    p_download.add_argument("url")
+    p_download.add_argument("-o", "--output", help="Путь к файлу или директории для сохранения")
+    p_download.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Размер блока чтения в байтах")
+    p_download.add_argument("-s", "--segments", type=int, default=1, help="Число параллельных соединений")
+    p_download.add_argument("--min-segment-size", type=int, default=DEFAULT_MIN_SEGMENT_SIZE,
+                            help="Минимальный размер диапазона в байтах")
+
+    p_queue = subparsers.add_parser("queue", help="Очередь загрузок с сохранением прогресса")
+    queue_commands = p_queue.add_subparsers(dest="action", required=True)
+    p_queue_add = queue_commands.add_parser("add", help="Добавить ссылки в очередь")
+    p_queue_add.add_argument("file", nargs="?", default="-", help="Файл со ссылками, по умолчанию stdin")
+    p_queue_add.add_argument("-o", "--output", help="Директория для сохранения")
+    p_queue_run = queue_commands.add_parser("run", help="Разобрать очередь")
+    p_queue_run.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS,
+                             help="Число одновременных загрузок")
+    p_queue_run.add_argument("-s", "--segments", type=int, default=1, help="Число соединений на одну загрузку")
+    p_queue_run.add_argument("--max-attempts", type=int, default=DEFAULT_JOB_ATTEMPTS,
+                             help="Максимальное число попыток для задачи")
+    p_queue_run.add_argument("--follow", action="store_true", help="Ждать новых задач, а не выходить")
+    queue_commands.add_parser("status", help="Показать состояние очереди")
+    p_queue_retry = queue_commands.add_parser("retry", help="Вернуть неудачные задачи в очередь")
+    p_queue_retry.add_argument("--all", action="store_true", help="Также поставить заново завершенные задачи")
+
+    p_serve = subparsers.add_parser("serve", help="Запустить демон с прогретой сессией")
+    p_serve.add_argument("--host", default=DEFAULT_HOST)
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    p_cache = subparsers.add_parser("cache", help="Управление кэшем прямых ссылок")
+    p_cache.add_argument("action", choices=["stats", "purge"])
+
+    p_verify = subparsers.add_parser("verify", help="Проверить актуальность авторизации")
+    p_verify.add_argument(
+        "--ttl", type=float, nargs="?", default=0, const=DEFAULT_AUTH_TTL,
+        help=f"Не обращаться к форуму, если авторизация подтверждалась за последние N секунд "
+             f"(без значения — {DEFAULT_AUTH_TTL}; по умолчанию проверять всегда)"
+    )
+    p_verify.add_argument("--probe", action="store_true",
+                          help="Быстрая проверка: читать страницу профиля только до первого маркера")
 
     subparsers.add_parser("logout", help="Выход")
 
     args = parser.parse_args()
 
-    setup_logger(args.log)
+    # В режимах с выводом NDJSON stdout занят результатами, поэтому логи уходят в stderr.
+    # Там же запросы идут из многих потоков, и логи выводятся из отдельного потока через очередь
+    concurrent = args.cmd in ("batch", "post", "topic", "watch", "queue", "serve")
+    setup_logger(args.log, sys.stderr if args.cmd in ("batch", "post", "topic", "watch") else None, concurrent)
 
     logging.debug("Журналирование инициализировано с параметрами: %s", args.log)
 
-    config = Config()
+    config = Config(account_config_path(args.account) if args.account else DEFAULT_CONFIG_FILE)
+
+    logging.debug("Загружен конфиг файл: %s", config.path)
+
+    if args.cmd == "cache":
+        if args.action == "stats":
+            for key, value in LinkCache().stats().items():
+                print(f"{key}: {value}")
+        else:
+            LinkCache().purge()
+            logging.info("Кэш прямых ссылок очищен.")
+        return
+
+    if args.cmd == "queue" and args.action != "run":
+        return _queue_command(args)
+
+    if args.cmd == "logout":
+        from .auth import logout
+        return logout(config)
+
+    if args.cmd in ("u", "download") and not args.no_daemon and _forward_to_daemon(args, config):
+        return
+
+    _run(args, config)
+
+
+def _run(args, config):
+    """
+    Создает сессию (и пул аккаунтов) и выполняет команду, которой нужна сеть.
+    """
+    from .pool import SessionPool
+    from .ratelimit import RateLimiter
+    from .retry import RetryPolicy
+    from .session import FourPDASession
+
+    # Общий набор метрик для основной сессии и сессий пула
+    metrics = Metrics()
+    # Лимит запросов относится к форуму, а не к аккаунту, поэтому ограничитель у всех сессий один
+    limiter = RateLimiter(min(DEFAULT_RATE, args.rate), max_rate=args.rate)
+    if args.trace:
+        start_tracing()
+
+    def create_session(account_config):
+        proxies = ProxyPool.load(args.proxy) if args.proxy or args.proxies else None
+        return FourPDASession(account_config, limiter, RetryPolicy(args.retries), proxies=proxies, metrics=metrics)
+
+    cache = None if args.no_cache else LinkCache()
+    session = create_session(config)
+    pool = None
+    if args.pool and args.cmd in ("batch", "post", "topic", "watch", "verify"):
+        pool = SessionPool.from_directory(strategy=args.pool_strategy, session_factory=create_session)
+
+    try:
+        _dispatch(args, session, config, cache, pool)
+    finally:
+        if cache is not None:
+            cache.save()
+        if pool is not None:
+            pool.close()
+        if session.client:
+            # Закрытие сессии также сохраняет cf_clearance прокси
+            session.close()
+        if args.metrics:
+            metrics.write(args.metrics)
+            logging.debug("Метрики записаны в %s", args.metrics)
+        if args.trace:
+            stop_tracing().write(args.trace)
+            logging.info("Трассировка записана в %s", args.trace)
+
+
+def _forward_to_daemon(args, config) -> bool:
+    """
+    Передает команду запущенному демону.
+
+    Команда выполняется без демона, если заданы параметры, которые он не принимает
+    (LOCAL_ONLY_OPTIONS), или демон запущен с другим конфигом.
+
+    Returns:
+        bool: True если демон обработал команду, False если ее нужно выполнить самому
+    """
+    options = [name for name, default in LOCAL_ONLY_OPTIONS.items() if getattr(args, name, default) != default]
+    if options:
+        logging.debug("Выполняю запрос без демона: заданы параметры %s",
+                      ", ".join("--" + name.replace("_", "-") for name in options))
+        return False
+
+    from .daemon_client import DaemonError, DaemonUnavailable, download_via_daemon, resolve_via_daemon
+
+    try:
+        if args.cmd == "u":
+            result = resolve_via_daemon(args.url, config_path=config.path)
+        else:
+            result = download_via_daemon(args.url, args.output, args.segments, config_path=config.path)
+    except DaemonUnavailable as e:
+        logging.debug("Выполняю запрос без демона: %s", e)
+        return False
+    except DaemonError as e:
+        # Повтор без демона мог бы запустить вторую загрузку того же файла, пока демон работает над первой
+        logging.error("%s. Запрос не повторяется без демона; проверьте результат или используйте --no-daemon.", e)
+        if args.cmd == "u":
+            print(None)
+        return True
+
+    logging.debug("Запрос выполнен демоном.")
+
+    if "error" in result:
+        logging.error(result.get("message") or "Файл не найден или у вас нет к нему доступа.")
+        if args.cmd == "u":
+            print(None)
+    elif args.cmd == "u":
+        print(result["link"])
+    else:
+        logging.info("Файл скачан: %s", result["path"])
+    return True
+
+
+def _queue_command(args):
+    from .batch import read_urls
+    from .jobs import JobQueue
+
+    queue = JobQueue()
 
-    logging.debug("Загружен конфиг файл: %s", DEFAULT_CONFIG_FILE)
+    if args.action == "status":
+        for state, count in queue.status().items():
+            print(f"{state}: {count}")
+        for job in queue.failed():
+            print(f"  {job['url']} ({job['error']}, попыток: {job['attempts']})")
+    elif args.action == "retry":
+        logging.info("Возвращено в очередь задач: %s", queue.retry(args.all))
+    elif args.action == "add":
+        added, invalid = queue.add(BASE_URL, read_urls(args.file), args.output)
+        for url in invalid:
+            logging.warning("Неправильная ссылка: %s", url)
+        logging.info("Добавлено задач: %s", added)
 
-    session = FourPDASession(config)
 
+def _dispatch(args, session, config, cache, pool=None):
     if args.cmd == "login":
+        from .auth import login
         login(session, config, args.username, args.password, False)
-    elif args.cmd == "logout":
-        logout(config)
     elif args.cmd == "u":
-        print(get_direct_link(session, config, args.url))
+        from .downloader import get_direct_link
+        print(get_direct_link(session, config, args.url, cache))
+    elif args.cmd == "download":
+        from .download import download_file
+        download_file(session, config, args.url, args.output, args.chunk_size, cache,
+                      segments=args.segments, min_segment_size=args.min_segment_size)
+    elif args.cmd == "serve":
+        from .server import serve
+        serve(session, config, cache, args.host, args.port)
+    elif args.cmd == "batch":
+        from .batch import read_urls, resolve_batch, write_ndjson
+        write_ndjson(resolve_batch(session, config, read_urls(args.file), args.jobs, cache, args.timeout, pool))
+    elif args.cmd in ("post", "topic"):
+        from .batch import write_ndjson
+        from .forum import (filter_attachments, get_post_attachments, get_topic_attachments, parse_post_id,
+                            parse_topic_id, resolve_attachments)
+        if args.cmd == "post":
+            post_id = parse_post_id(args.target)
+            if post_id is None:
+                return logging.error("Не удалось определить ID поста.")
+            links = get_post_attachments(session, config, post_id, cache)
+        else:
+            topic_id = parse_topic_id(args.target)
+            if topic_id is None:
+                return logging.error("Не удалось определить ID темы.")
+            links = get_topic_attachments(session, config, topic_id, args.jobs, cache)
+        links = filter_attachments(links, args.glob, args.regex)
+        write_ndjson(resolve_attachments(session, config, links, args.jobs, cache, args.timeout, pool))
+    elif args.cmd == "watch":
+        from .batch import write_ndjson
+        from .forum import parse_topic_id
+        from .jobs import JobQueue
+        from .watch import watch_topics
+        topic_ids = [parse_topic_id(target) for target in args.targets]
+        if None in topic_ids:
+            return logging.error("Не удалось определить ID темы.")
+        queue = JobQueue() if args.queue else None
+        write_ndjson(watch_topics(session, config, topic_ids, args.interval, args.topic_jobs, args.jobs, cache,
+                                  args.download, args.once, args.backfill, args.glob, args.regex, queue,
+                                  args.timeout, pool))
+    elif args.cmd == "queue":
+        from .jobs import JobQueue, run_queue
+        run_queue(session, config, JobQueue(max_attempts=args.max_attempts), args.workers, cache, args.segments,
+                  args.follow)
     elif args.cmd == "verify":
-        validate_authentication(config, session)
\ No newline at end of file
+        from .session import validate_authentication
+        if pool is None:
+            validate_authentication(config, session, args.ttl, args.probe)
+        else:
+            logging.info("Аккаунтов с актуальной авторизацией: %s из %s",
+                         pool.validate(args.ttl, args.probe), len(pool.accounts))
@@ -1,9 +1,14 @@
 import json
 import os
 import sys
+import threading
+import time
 
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Set, Tuple
+
+from .storage import atomic_write_json, file_lock
+from .tracing import span
 
 
 def is_windows() -> bool:
@@ -34,19 +39,36 @@ def get_default_config_dir() -> Path:
 
 DEFAULT_CONFIG_DIR = get_default_config_dir()
 DEFAULT_CONFIG_FILE = DEFAULT_CONFIG_DIR / "config.json"
+# Конфиги дополнительных аккаунтов для пула сессий: accounts/<имя>.json
+ACCOUNTS_DIR = DEFAULT_CONFIG_DIR / "accounts"
 
-def load_config() -> dict:
+def load_config(path: Path = DEFAULT_CONFIG_FILE) -> dict:
     """
     Загружает конфигурацию из JSON-файла.
     
+    Args:
+        path (Path, optional): Путь к файлу конфигурации
+    
     Returns:
         dict: Словарь с данными конфигурации или пустой словарь, если файл не существует
     """
-    if DEFAULT_CONFIG_FILE.exists():
-        with open(DEFAULT_CONFIG_FILE, "r", encoding="utf-8") as f:
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     return {}
 
+def account_config_path(name: str) -> Path:
+    """
+    Возвращает путь к конфигу аккаунта из пула.
+    
+    Args:
+        name (str): Имя аккаунта
+    
+    Returns:
+        Path: Путь accounts/<имя>.json
+    """
+    return ACCOUNTS_DIR / f"{name}.json"
+
 
 class Config:
     """
@@ -55,21 +77,93 @@ class Config:
     Обеспечивает работу с данными пользователя и cookies, сохраняемыми в JSON-файл.
     Поддерживает основные операции для управления сессией авторизации.
     
+    Один файл могут одновременно использовать несколько процессов и потоков:
+    save() записывает только измененные ключи поверх актуального содержимого
+    файла под межпроцессной блокировкой и атомарно заменяет файл, а если
+    изменений нет, ничего не пишет. Чтение перечитывает файл, если по его
+    stat видно, что его обновил другой процесс.
+    
     Attributes:
+        path (Path): Путь к файлу конфигурации
         _data (dict): Внутреннее хранилище данных конфигурации, содержащее:
             - username (str): Имя пользователя
             - cookies (dict): Словарь с cookies сессии
+            - auth_validated_at (float): Время последней успешной проверки авторизации (Unix time)
     
     File:
         config.json: Файл для сохранения и загрузки конфигурации
+        accounts/<имя>.json: Конфиги аккаунтов пула сессий
     """
-    def __init__(self):
-        data = load_config()
+    def __init__(self, path: Path = DEFAULT_CONFIG_FILE):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        # Измененные, но еще не сохраненные ключи: ("username",) или ("cookies", имя)
+        self._changed: Set[Tuple[str, ...]] = set()
+        # После clear() файл перезаписывается целиком, без слияния
+        self._replace = False
 
-        self._data = {
+        self._stamp = self._file_stamp()
+        self._data = self._normalize(load_config(self.path))
+
+    @staticmethod
+    def _normalize(data: dict) -> dict:
+        normalized = {
             "username": data.get("username", ""),
             "cookies": dict(data.get("cookies", {}))
         }
+        if data.get("auth_validated_at"):
+            normalized["auth_validated_at"] = data["auth_validated_at"]
+        return normalized
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """
+        Возвращает (inode, mtime, размер) файла или None, если его нет.
+        os.replace меняет inode, поэтому замена файла видна даже при грубом mtime.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _merge(self, disk: dict) -> dict:
+        """
+        Накладывает несохраненные изменения на содержимое файла. Вызывается под блокировкой.
+        """
+        if self._replace:
+            return self._data
+
+        data = self._normalize(disk)
+        for key in self._changed:
+            if key[0] == "cookies":
+                name = key[1]
+                if name in self._data.get("cookies", {}):
+                    data["cookies"][name] = self._data["cookies"][name]
+                else:
+                    data["cookies"].pop(name, None)
+            elif key[0] in self._data:
+                data[key[0]] = self._data[key[0]]
+            else:
+                data.pop(key[0], None)
+        return data
+
+    def _refresh(self):
+        """
+        Перечитывает файл, если его изменил другой процесс, сохраняя несохраненные изменения.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return
+            try:
+                disk = load_config(self.path)
+            except json.JSONDecodeError:
+                return
+            self._data = self._merge(disk)
+            self._stamp = stamp
+
+    def _mark(self, *key: str):
+        self._changed.add(key)
 
     @property
     def username(self) -> str:
@@ -79,6 +173,7 @@ class Config:
         Returns:
             str: Имя пользователя или пустая строка если не установлено
         """
+        self._refresh()
         return self._data.get("username", "")
 
     @username.setter
@@ -89,7 +184,10 @@ class Config:
         Args:
             value (str): Новое имя пользователя
         """
-        self._data["username"] = value
+        with self._lock:
+            if self._data.get("username") != value:
+                self._data["username"] = value
+                self._mark("username")
 
     @property
     def cookies(self) -> Dict[str, str]:
@@ -99,6 +197,7 @@ class Config:
         Returns:
             Dict[str, str]: Копия словаря cookies
         """
+        self._refresh()
         return dict(self._data.get("cookies", {}))
 
     def get_cookie(self, key: str, default="") -> str:
@@ -112,7 +211,8 @@ class Config:
         Returns:
             str: Значение cookie или значение по умолчанию
         """
-        return self._data["cookies"].get(key, default)
+        self._refresh()
+        return self._data.get("cookies", {}).get(key, default)
 
     def set_cookie(self, key: str, value: str):
         """
@@ -122,7 +222,11 @@ class Config:
             key (str): Ключ cookie
             value (str): Значение cookie
         """
-        self._data["cookies"][key] = value
+        with self._lock:
+            cookies = self._data.setdefault("cookies", {})
+            if cookies.get(key) != value:
+                cookies[key] = value
+                self._mark("cookies", key)
 
     def update_from_session(self, session_cookies: Dict[str, str]):
         """
@@ -131,13 +235,16 @@ class Config:
         Args:
             session_cookies (Dict[str, str]): Cookies из сессии requests
         """
-        cf = self.get_cookie("cf_clearance")
+        with self._lock:
+            cf = self.get_cookie("cf_clearance")
 
-        merged = dict(session_cookies)
-        if cf:
-            merged["cf_clearance"] = cf
+            merged = dict(session_cookies)
+            if cf:
+                merged["cf_clearance"] = cf
 
-        self._data["cookies"] = merged
+            for key in set(self._data.get("cookies", {})) | set(merged):
+                self._mark("cookies", key)
+            self._data["cookies"] = merged
 
     def is_authenticated(self) -> bool:
         """
@@ -152,25 +259,74 @@ class Config:
             self.get_cookie("member_id")
         )
 
+    def auth_validated_within(self, ttl: float) -> bool:
+        """
+        Проверяет, подтверждалась ли авторизация за последние ttl секунд.
+        
+        Args:
+            ttl (float): Сколько секунд результат проверки считается актуальным
+        
+        Returns:
+            bool: True если последняя успешная проверка была не раньше ttl секунд назад
+        """
+        self._refresh()
+        validated_at = self._data.get("auth_validated_at")
+        return bool(validated_at) and 0 <= time.time() - validated_at < ttl
+
+    def mark_auth_validated(self):
+        """
+        Запоминает время успешной проверки авторизации.
+        """
+        with self._lock:
+            self._data["auth_validated_at"] = time.time()
+            self._mark("auth_validated_at")
+
+    def invalidate_auth(self) -> bool:
+        """
+        Сбрасывает результат последней проверки авторизации.
+        
+        Returns:
+            bool: True если сохраненный результат был
+        """
+        with self._lock:
+            if self._data.pop("auth_validated_at", None) is None:
+                return False
+            self._mark("auth_validated_at")
+            return True
+
     def clear(self):
         """
         Очищает конфигурацию, сохраняя только cf_clearance если он присутствует.
         """
-        cf = self.get_cookie("cf_clearance")
-        self._data = {"cookies": {"cf_clearance": cf}} if cf else {}
-        self.save()
+        with self._lock:
+            cf = self.get_cookie("cf_clearance")
+            self._data = {"cookies": {"cf_clearance": cf}} if cf else {}
+            self._replace = True
+            self.save()
 
     def save(self):
         """
-        Сохраняет конфигурацию в JSON-файл.
+        Сохраняет изменения конфигурации в JSON-файл.
+        
+        Notes:
+            - Ничего не пишет, если с прошлого сохранения ничего не изменилось
+            - Под блокировкой файла перечитывает его и записывает только измененные ключи,
+              поэтому изменения других процессов не теряются
+            - Файл заменяется атомарно (временный файл и os.replace)
         """
-        if DEFAULT_CONFIG_DIR.exists():
-            with open(DEFAULT_CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(self._data, f, indent=4, ensure_ascii=False)
-        else:
-            p = Path(DEFAULT_CONFIG_DIR)
-            p.mkdir(parents=True, exist_ok=True)
-            self.save()
+        with span("config-save", "io", file=self.path.name), self._lock:
+            if not self._changed and not self._replace:
+                return
+            with file_lock(self.path):
+                try:
+                    disk = load_config(self.path)
+                except json.JSONDecodeError:
+                    disk = {}
+                self._data = self._merge(disk)
+                atomic_write_json(self.path, self._data, indent=4)
+                self._stamp = self._file_stamp()
+            self._changed.clear()
+            self._replace = False
 
     def to_dict(self):
         """
@@ -179,4 +335,5 @@ class Config:
         Returns:
             dict: Копия данных конфигурации в виде словаря
         """
+        self._refresh()
         return json.loads(json.dumps(self._data))
\ No newline at end of file
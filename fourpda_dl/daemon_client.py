@@ -0,0 +1,140 @@
+# Клиент демона serve. Модуль использует только стандартную библиотеку, поэтому
+# команды u и download, переданные демону, не загружают httpx и сетевой стек.
+# urllib.request и http.client не используются: при импорте они загружают ssl.
+# Время импорта проверяет benchmarks/importtime.py
+import json
+import os
+import socket
+import urllib.parse
+
+from pathlib import Path
+from typing import Optional
+
+from .config import DEFAULT_CONFIG_DIR, DEFAULT_CONFIG_FILE
+from .storage import load_json
+
+DAEMON_FILE = DEFAULT_CONFIG_DIR / "daemon.json"
+TOKEN_HEADER = "X-Fourpda-Token"
+# Таймаут подключения к демону: если он не отвечает, быстрее выполнить запрос самому
+CONNECT_TIMEOUT = 1.0
+
+
+class DaemonUnavailable(Exception):
+    """Демон не запущен, не отвечает или запущен с другим конфигом: запрос можно выполнить самому."""
+    pass
+
+
+class DaemonError(Exception):
+    """Демон принял запрос, но не вернул результат (таймаут или обрыв соединения)."""
+    pass
+
+
+def _daemon_request(info: dict, method: str, path: str, payload: Optional[dict] = None,
+                    timeout: Optional[float] = None) -> dict:
+    """
+    Выполняет запрос HTTP/1.0 к демону на localhost и возвращает JSON ответа.
+
+    Соединение устанавливается с таймаутом CONNECT_TIMEOUT, ответ ждется timeout секунд.
+
+    Raises:
+        OSError: Если соединение не установлено или оборвалось
+        ValueError: Если демон ответил не 200 или не JSON
+    """
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    head = (
+        f"{method} {path} HTTP/1.0\r\n"
+        f"Host: {info['host']}:{info['port']}\r\n"
+        f"{TOKEN_HEADER}: {info.get('token', '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+
+    with socket.create_connection((info["host"], info["port"]), timeout=CONNECT_TIMEOUT) as sock:
+        sock.settimeout(timeout or CONNECT_TIMEOUT)
+        sock.sendall(head.encode("latin-1") + body)
+        # Демон отвечает по HTTP/1.0 и закрывает соединение после ответа
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+
+    status_line, _, rest = b"".join(chunks).partition(b"\r\n")
+    _, _, data = rest.partition(b"\r\n\r\n")
+    parts = status_line.split()
+    if len(parts) < 2 or parts[1] != b"200":
+        raise ValueError(f"Демон ответил: {status_line.decode('latin-1') or 'пустой ответ'}")
+    return json.loads(data)
+
+
+def _connect(config_path: Path) -> dict:
+    """
+    Находит демон, запущенный с тем же конфигом, и проверяет, что он отвечает.
+
+    Raises:
+        DaemonUnavailable: Если демон не запущен, запущен с другим конфигом или не прошел проверку /health
+    """
+    info = load_json(DAEMON_FILE)
+    if not info:
+        raise DaemonUnavailable("Демон не запущен.")
+    if info.get("config") != str(config_path):
+        raise DaemonUnavailable(f"Демон запущен с другим конфигом: {info.get('config')}")
+
+    try:
+        _daemon_request(info, "GET", "/health")
+    except (OSError, ValueError) as e:
+        raise DaemonUnavailable(f"Демон не отвечает: {e}") from e
+    return info
+
+
+def _call(info: dict, method: str, path: str, payload: Optional[dict] = None, timeout: Optional[float] = None) -> dict:
+    """
+    Выполняет запрос к демону, прошедшему проверку в _connect.
+
+    Raises:
+        DaemonUnavailable: Если демон отказал в соединении (запрос до него не дошел)
+        DaemonError: Если запрос отправлен, но ответа нет: демон может продолжать его выполнять
+    """
+    try:
+        return _daemon_request(info, method, path, payload, timeout)
+    except (OSError, ValueError) as e:
+        if isinstance(e, ConnectionRefusedError):
+            raise DaemonUnavailable(f"Демон не отвечает: {e}") from e
+        raise DaemonError(f"Демон не вернул результат: {e}") from e
+
+
+def resolve_via_daemon(url: str, timeout: float = 60.0, config_path: Path = DEFAULT_CONFIG_FILE) -> dict:
+    """
+    Получает прямую ссылку через запущенный демон.
+
+    Args:
+        url (str): DL-ссылка
+        timeout (float, optional): Таймаут ожидания ответа в секундах
+        config_path (Path, optional): Конфиг клиента: демон с другим конфигом не используется
+
+    Returns:
+        dict: Ответ демона с полем link или error
+
+    Raises:
+        DaemonUnavailable: Если демон не запущен, запущен с другим конфигом или не отвечает
+        DaemonError: Если демон принял запрос, но не вернул результат
+    """
+    info = _connect(config_path)
+    return _call(info, "GET", "/resolve?" + urllib.parse.urlencode({"url": url}), timeout=timeout)
+
+
+def download_via_daemon(url: str, output: Optional[str] = None, segments: int = 1,
+                        timeout: Optional[float] = None, config_path: Path = DEFAULT_CONFIG_FILE) -> dict:
+    """
+    Скачивает файл через запущенный демон.
+
+    Путь output интерпретируется демоном, поэтому передается абсолютным.
+
+    Returns:
+        dict: Ответ демона с полем path или error
+
+    Raises:
+        DaemonUnavailable: Если демон не запущен, запущен с другим конфигом или не отвечает
+        DaemonError: Если демон принял запрос, но не вернул результат
+    """
+    info = _connect(config_path)
+    payload = {"url": url, "output": os.path.abspath(output or os.getcwd()), "segments": segments}
+    return _call(info, "POST", "/download", payload, timeout=timeout or 24 * 3600)
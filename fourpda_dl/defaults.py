@@ -0,0 +1,43 @@
+# Значения по умолчанию, которые нужны CLI для разбора аргументов.
+# Модуль ничего не импортирует, чтобы команды без сети (logout, cache, --help)
+# не загружали httpx и остальной сетевой стек.
+
+BASE_URL = "https://4pda.to"
+
+# batch, post, topic, watch
+DEFAULT_JOBS = 8
+# Бюджет времени на получение одной ссылки, включая все повторы,
+# чтобы один медленный запрос не занимал поток надолго
+DEFAULT_RESOLVE_TIMEOUT = 60.0
+
+# download
+DEFAULT_CHUNK_SIZE = 256 * 1024
+DEFAULT_SEGMENTS = 4
+DEFAULT_MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# queue
+DEFAULT_WORKERS = 2
+DEFAULT_JOB_ATTEMPTS = 5
+
+# Пул аккаунтов
+LEAST_LOADED = "least-loaded"
+ROUND_ROBIN = "round-robin"
+STRATEGIES = (LEAST_LOADED, ROUND_ROBIN)
+
+# Начальная и максимальная частота запросов к одному хосту (запросов в секунду)
+DEFAULT_RATE = 4.0
+DEFAULT_MAX_RATE = 16.0
+
+# Число попыток одного HTTP-запроса
+DEFAULT_RETRIES = 3
+
+# serve
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8464
+
+# Сколько секунд успешная проверка авторизации считается актуальной (verify --ttl без значения)
+DEFAULT_AUTH_TTL = 10 * 60
+
+# watch
+DEFAULT_INTERVAL = 15 * 60
+DEFAULT_TOPIC_JOBS = 4
@@ -0,0 +1,735 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import httpx
+
+from .cache import account_key
+from .defaults import DEFAULT_CHUNK_SIZE, DEFAULT_MIN_SEGMENT_SIZE
+from .downloader import get_direct_link, parse_url
+from .exceptions import DirectLinkNotFound, DownloadError
+from .storage import atomic_write_json, load_json
+from .tracing import span
+from .utils import format_size
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".json"
+# Как часто сохранять прогресс в файл состояния
+STATE_SAVE_INTERVAL = 1.0
+# Коды ответа 4pda.ws на истекшую подписанную ссылку
+EXPIRED_LINK_STATUSES = (403, 410)
+# Сколько раз за одну загрузку можно заново получить прямую ссылку
+MAX_LINK_REFRESHES = 5
+
+
+class Progress:
+    """
+    Вывод прогресса скачивания в stderr с ограничением частоты обновления.
+
+    Attributes:
+        total (Optional[int]): Ожидаемый размер файла или None, если он неизвестен
+        done (int): Сколько байт уже записано
+        enabled (bool): Выводить ли прогресс
+    """
+
+    REFRESH_INTERVAL = 0.2
+
+    def __init__(self, total: Optional[int] = None, done: int = 0, enabled: bool = True):
+        self.total = total
+        self.done = done
+        self.enabled = enabled
+        self._started = time.monotonic()
+        self._start_done = done
+        self._last_draw = 0.0
+
+    @property
+    def speed(self) -> float:
+        """
+        Средняя скорость скачивания в байтах в секунду за текущий запуск.
+        """
+        elapsed = time.monotonic() - self._started
+        return (self.done - self._start_done) / elapsed if elapsed > 0 else 0.0
+
+    def update(self, size: int):
+        self.done += size
+        now = time.monotonic()
+        if self.enabled and now - self._last_draw >= self.REFRESH_INTERVAL:
+            self._last_draw = now
+            self._draw()
+
+    def finish(self):
+        if self.enabled:
+            self._draw()
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+
+    def _draw(self):
+        if self.total:
+            percent = self.done * 100 / self.total
+            line = f"{format_size(self.done)} / {format_size(self.total)} ({percent:.0f}%)"
+        else:
+            line = format_size(self.done)
+        sys.stderr.write(f"\r{line}  {format_size(self.speed)}/s   ")
+        sys.stderr.flush()
+
+
+def resolve_output_path(base_url: str, url: str, output=None) -> Path:
+    """
+    Определяет путь сохранения файла.
+
+    Args:
+        base_url (str): Базовый домен
+        url (str): DL-ссылка
+        output (optional): Путь к файлу или директории. По умолчанию текущая директория
+
+    Returns:
+        Path: Путь к итоговому файлу
+    """
+    _, file_name = parse_url(base_url, url)
+    name = urllib.parse.unquote_plus(file_name or "")
+    name = Path(name).name or "download"
+
+    if output is None:
+        return Path(name)
+
+    output = Path(output)
+    if output.is_dir():
+        return output / name
+    return output
+
+
+class DownloadState:
+    """
+    Состояние незавершенной загрузки, хранимое рядом с файлом .part.
+
+    Позволяет продолжить скачивание после обрыва через HTTP Range и
+    проверить по валидаторам (ETag, Last-Modified, размер), что файл
+    на сервере не изменился.
+
+    Attributes:
+        path (Path): Путь к файлу состояния
+        url (str): Нормализованная DL-ссылка
+        post_id (int): ID поста
+        done (int): Сколько байт уже записано в .part
+        etag (Optional[str]): ETag файла на сервере
+        last_modified (Optional[str]): Last-Modified файла на сервере
+        content_length (Optional[int]): Полный размер файла
+        segments (List[List[int]]): Оставшиеся диапазоны [начало, конец) при параллельной загрузке
+        link_refreshes (int): Сколько раз прямая ссылка истекала и была получена заново
+    """
+
+    def __init__(self, path: Path, url: str, post_id: int, data: Optional[dict] = None):
+        data = data or {}
+        self.path = path
+        self.url = url
+        self.post_id = post_id
+        self.done = data.get("done", 0)
+        self.etag = data.get("etag")
+        self.last_modified = data.get("last_modified")
+        self.content_length = data.get("content_length")
+        self.segments = data.get("segments", [])
+        self.link_refreshes = data.get("link_refreshes", 0)
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, path: Path, url: str, post_id: int) -> "DownloadState":
+        """
+        Загружает состояние, если оно относится к той же ссылке.
+        """
+        data = load_json(path, {})
+        if data.get("url") != url:
+            data = {}
+        return cls(path, url, post_id, data)
+
+    def reset(self):
+        self.done = 0
+        self.etag = self.last_modified = self.content_length = None
+        self.segments = []
+
+    def set_validators(self, response, total: Optional[int]):
+        """
+        Запоминает валидаторы файла из ответа сервера.
+        """
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.content_length = total
+
+    def matches(self, response, total: Optional[int]) -> bool:
+        """
+        Проверяет, что файл на сервере не изменился с прошлой загрузки.
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+        if self.etag and etag and self.etag != etag:
+            return False
+        if self.last_modified and last_modified and self.last_modified != last_modified:
+            return False
+        if self.content_length and total and self.content_length != total:
+            return False
+        return True
+
+    def save(self, force: bool = True):
+        now = time.monotonic()
+        if not force and now - self._last_save < STATE_SAVE_INTERVAL:
+            return
+        self._last_save = now
+        atomic_write_json(self.path, {
+            "url": self.url,
+            "post_id": self.post_id,
+            "done": self.done,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "content_length": self.content_length,
+            "segments": self.segments,
+            "link_refreshes": self.link_refreshes,
+        })
+
+    def remove(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+def _content_range(response) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Разбирает заголовок Content-Range.
+
+    Returns:
+        Tuple[Optional[int], Optional[int]]: (начало диапазона, полный размер)
+    """
+    match = re.match(r"bytes (\d+|\*)(?:-\d+)?/(\d+|\*)", response.headers.get("Content-Range", ""))
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return (int(start) if start != "*" else None), (int(total) if total != "*" else None)
+
+
+def _content_length(response) -> Optional[int]:
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+class LinkSource:
+    """
+    Текущая прямая ссылка загрузки с повторным получением после истечения.
+
+    Подписанные ссылки 4pda.ws живут недолго. Когда сервер отвечает 403/410,
+    ссылка заново получается через get_direct_link для того же post_id/file_name,
+    а загрузка продолжается с текущего смещения. Потокобезопасен: если ссылку
+    уже обновил другой поток, повторного запроса не будет.
+
+    Attributes:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        url (str): Нормализованная DL-ссылка
+        link (Optional[str]): Текущая прямая ссылка
+        refreshes (int): Сколько раз ссылка была получена заново
+    """
+
+    def __init__(self, session, config, url: str, cache=None, max_refreshes: int = MAX_LINK_REFRESHES):
+        self.session = session
+        self.config = config
+        self.url = url
+        self.cache = cache
+        self.max_refreshes = max_refreshes
+        self.link: Optional[str] = None
+        self.refreshes = 0
+        self._lock = threading.Lock()
+
+    def resolve(self) -> str:
+        """
+        Получает прямую ссылку (с учетом кэша).
+
+        Raises:
+            DirectLinkNotFound: Если файл недоступен
+        """
+        self.link = get_direct_link(self.session, self.config, self.url, self.cache)
+        if not self.link:
+            raise DirectLinkNotFound("Файл не найден или у вас нет к нему доступа.")
+        return self.link
+
+    def refresh(self, expired_link: str) -> str:
+        """
+        Заново получает прямую ссылку взамен истекшей.
+
+        Args:
+            expired_link (str): Ссылка, на которую сервер ответил 403/410
+
+        Returns:
+            str: Новая прямая ссылка
+
+        Raises:
+            DownloadError: Если лимит повторных получений ссылки исчерпан
+        """
+        with self._lock:
+            if self.link != expired_link:
+                return self.link
+
+            if self.refreshes >= self.max_refreshes:
+                raise DownloadError("Прямая ссылка продолжает истекать, загрузка прервана.")
+
+            self.refreshes += 1
+            self.session.metrics.inc("link_refreshes_total")
+            logging.info("Прямая ссылка истекла, получаю новую (%s/%s)...", self.refreshes, self.max_refreshes)
+
+            if self.cache is not None:
+                post_id, file_name = parse_url(self.session.base_url, self.url)
+                self.cache.invalidate(post_id, file_name, account_key(self.config))
+
+            with span("link-refresh", "resolve", refresh=self.refreshes):
+                return self.resolve()
+
+    def stream(self, headers: dict):
+        """
+        Открывает потоковый запрос к текущей прямой ссылке.
+        """
+        return self.session.stream("GET", self.link, headers=headers, follow_redirects=True, phase="file")
+
+
+def download_file(session, config, url: str, output=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  cache=None, progress: bool = True, segments: int = 1,
+                  min_segment_size: int = DEFAULT_MIN_SEGMENT_SIZE, link: Optional[str] = None) -> Path:
+    """
+    Скачивает файл с форума 4PDA по DL-ссылке с поддержкой докачки.
+
+    Получает прямую ссылку через get_direct_link и потоково пишет ответ 4pda.ws
+    на диск блоками фиксированного размера через тот же клиент FourPDASession,
+    поэтому расход памяти не зависит от размера файла. Данные пишутся во
+    временный файл .part, который атомарно переименовывается после успешного
+    завершения.
+
+    Если после обрыва остался .part с файлом состояния, загрузка продолжается
+    запросом Range с текущей позиции. Если сервер игнорирует Range или валидаторы
+    (ETag, Last-Modified, размер) изменились, файл скачивается заново.
+
+    При segments > 1 файл делится на диапазоны, которые скачиваются параллельно
+    и пишутся сразу по своему смещению в заранее выделенный файл. Освободившийся
+    поток забирает половину самого большого оставшегося диапазона, поэтому
+    медленное соединение не задерживает всю загрузку. Если сервер не поддерживает
+    Range, используется обычная загрузка одним потоком.
+
+    Args:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        url (str): DL-ссылка на файл
+        output (optional): Путь к файлу или директории для сохранения
+        chunk_size (int, optional): Размер блока чтения в байтах
+        cache (LinkCache, optional): Кэш прямых ссылок
+        progress (bool, optional): Выводить прогресс и скорость в stderr
+        segments (int, optional): Число параллельных соединений
+        min_segment_size (int, optional): Минимальный размер диапазона в байтах
+        link (Optional[str], optional): Уже полученная прямая ссылка (например в очереди задач),
+            чтобы не запрашивать ее повторно
+
+    Returns:
+        Path: Путь к скачанному файлу
+
+    Raises:
+        ValueError: Если ссылка для скачивания файла не валидная
+        DirectLinkNotFound: Если не удалось получить прямую ссылку
+        DownloadError: Если сервер вернул неожиданный ответ или файл скачан не полностью
+    """
+    post_id, file_name = parse_url(session.base_url, url)
+    if not all([post_id, file_name]):
+        raise ValueError(
+            "Неправильная ссылка для загрузки файла. Ожидается формат: "
+            f"{session.base_url}/forum/dl/post/<ID>/<filename>"
+        )
+
+    url = f"{session.base_url}/forum/dl/post/{post_id}/{file_name}"
+    target = resolve_output_path(session.base_url, url, output)
+    source = LinkSource(session, config, url, cache)
+    if link:
+        source.link = link
+    else:
+        source.resolve()
+
+    part = target.with_name(target.name + PART_SUFFIX)
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    state = DownloadState.load(part.with_name(part.name + STATE_SUFFIX), url, post_id)
+    if not part.exists():
+        state.reset()
+
+    logging.info("Скачиваю файл в: %s", target)
+
+    bar = None
+    try:
+        if segments > 1 or state.segments:
+            bar = _download_segmented(source, part, state, chunk_size, progress,
+                                      max(segments, 1), min_segment_size)
+        if bar is None:
+            bar = _download_single(source, part, state, chunk_size, progress)
+
+        if state.content_length is not None and state.done != state.content_length:
+            raise DownloadError(f"Файл скачан не полностью: {state.done} из {state.content_length} байт.")
+
+        os.replace(part, target)
+        state.remove()
+    except BaseException:
+        # Оставляем .part и состояние, чтобы продолжить загрузку при следующем запуске
+        if part.exists():
+            state.link_refreshes += source.refreshes
+            state.save()
+        raise
+
+    if source.refreshes:
+        logging.info("Прямая ссылка была получена заново %s раз(а) во время загрузки.", source.refreshes)
+
+    logging.info("Файл скачан: %s (%s, %s/s)", target, format_size(state.done), format_size(bar.speed))
+    return target
+
+
+def _download_single(source: LinkSource, part: Path, state: DownloadState,
+                     chunk_size: int, progress: bool) -> Progress:
+    """
+    Скачивает файл одним потоком, продолжая с конца .part если это возможно.
+    """
+    # Файл мог быть дописан дальше, чем успело сохраниться состояние
+    state.done = part.stat().st_size if part.exists() and state.done else 0
+
+    while True:
+        offset = state.done
+        # identity: размер на диске должен совпадать с Content-Length
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if state.etag or state.last_modified:
+                headers["If-Range"] = state.etag or state.last_modified
+
+        link = source.link
+        with source.stream(headers) as response:
+            if response.status_code in EXPIRED_LINK_STATUSES:
+                source.refresh(link)
+                continue
+
+            if offset and response.status_code == 416:
+                _, total = _content_range(response)
+                if total is not None and total == offset == state.content_length:
+                    logging.info("Файл уже скачан полностью.")
+                    return Progress(total, done=offset, enabled=False)
+                logging.info("Сервер отклонил докачку, скачиваю файл заново...")
+                state.reset()
+                continue
+
+            if response.status_code == 206 and offset:
+                start, total = _content_range(response)
+                if start != offset or not state.matches(response, total):
+                    logging.info("Файл на сервере изменился, скачиваю его заново...")
+                    state.reset()
+                    continue
+                logging.info("Продолжаю загрузку с %s...", format_size(offset))
+            elif response.status_code == 200:
+                if offset:
+                    logging.info("Сервер не поддерживает докачку, скачиваю файл заново...")
+                offset = state.done = 0
+                total = _content_length(response)
+                state.set_validators(response, total)
+            else:
+                raise DownloadError(f"Неожиданный код-ответ сервера: {response.status_code}")
+
+            state.save()
+            bar = Progress(total, done=offset, enabled=progress)
+
+            with span("body", "download", offset=offset) as info, open(part, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                for chunk in response.iter_bytes(chunk_size):
+                    f.write(chunk)
+                    bar.update(len(chunk))
+                    state.done += len(chunk)
+                    state.save(force=False)
+                info["bytes"] = state.done - offset
+
+            bar.finish()
+            return bar
+
+
+def _probe_ranges(source: LinkSource) -> Tuple[Optional[int], Optional[object]]:
+    """
+    Проверяет поддержку Range запросом первого байта файла.
+
+    Returns:
+        Tuple: (полный размер файла, ответ сервера) или (None, None), если Range не поддерживается
+    """
+    headers = {"Accept-Encoding": "identity", "Range": "bytes=0-0"}
+    while True:
+        link = source.link
+        with source.stream(headers) as response:
+            if response.status_code in EXPIRED_LINK_STATUSES:
+                source.refresh(link)
+                continue
+            if response.status_code != 206:
+                return None, None
+            _, total = _content_range(response)
+            return total, response
+
+
+class _PartFile:
+    """
+    Файл .part с позиционной записью из нескольких потоков.
+
+    Использует os.pwrite там, где он есть, иначе сериализует seek и write.
+    """
+
+    def __init__(self, path: Path, size: int):
+        mode = "r+b" if path.exists() else "w+b"
+        self._file = open(path, mode)
+        self._file.truncate(size)
+        self._lock = threading.Lock()
+
+    def write_at(self, offset: int, data: bytes):
+        if hasattr(os, "pwrite"):
+            os.pwrite(self._file.fileno(), data, offset)
+            return
+        with self._lock:
+            self._file.seek(offset)
+            self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+
+class _Segment:
+    """
+    Диапазон файла [pos, end), который скачивает один поток.
+
+    Поле end может уменьшиться, если половину диапазона забрал другой поток.
+    pos — начало еще не полученной части (по нему делится диапазон), written —
+    граница уже записанных на диск данных (она сохраняется в состояние загрузки).
+    Между ними лежит блок, который поток пишет прямо сейчас.
+    """
+
+    def __init__(self, pos: int, end: int):
+        self.pos = pos
+        self.written = pos
+        self.end = end
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.pos
+
+
+class _SegmentScheduler:
+    """
+    Раздает диапазоны потокам и перераспределяет их по мере освобождения потоков.
+    """
+
+    def __init__(self, ranges: List[List[int]], min_segment_size: int):
+        self.lock = threading.Lock()
+        self.min_segment_size = min_segment_size
+        self.pending = [_Segment(pos, end) for pos, end in ranges if end > pos]
+        self.active: List[_Segment] = []
+
+    def next_segment(self) -> Optional[_Segment]:
+        """
+        Возвращает следующий диапазон: ожидающий или половину самого большого активного.
+        """
+        with self.lock:
+            if self.pending:
+                segment = self.pending.pop(0)
+                self.active.append(segment)
+                return segment
+
+            slowest = max(self.active, key=lambda s: s.remaining, default=None)
+            if slowest is None or slowest.remaining < 2 * self.min_segment_size:
+                return None
+
+            middle = slowest.pos + slowest.remaining // 2
+            segment = _Segment(middle, slowest.end)
+            slowest.end = middle
+            self.active.append(segment)
+            logging.debug("Перераспределен диапазон %s-%s", middle, segment.end)
+            return segment
+
+    def finish(self, segment: _Segment):
+        with self.lock:
+            if segment in self.active:
+                self.active.remove(segment)
+            # Блок, который не успел записаться, скачивается заново
+            segment.pos = segment.written
+            if segment.remaining > 0:
+                self.pending.append(segment)
+
+    def ranges(self) -> List[List[int]]:
+        with self.lock:
+            return self._ranges_locked()
+
+    def _ranges_locked(self) -> List[List[int]]:
+        # Вызывается под блокировкой
+        return [[s.written, s.end] for s in self.pending + self.active if s.end > s.written]
+
+
+def _split_ranges(total: int, segments: int, min_segment_size: int) -> List[List[int]]:
+    count = max(1, min(segments, total // max(min_segment_size, 1)))
+    size = total // count
+    ranges = [[i * size, (i + 1) * size] for i in range(count)]
+    ranges[-1][1] = total
+    return ranges
+
+
+def _download_segmented(source: LinkSource, part: Path, state: DownloadState, chunk_size: int,
+                        progress: bool, segments: int, min_segment_size: int) -> Optional[Progress]:
+    """
+    Скачивает файл параллельно несколькими диапазонами.
+
+    Returns:
+        Optional[Progress]: Прогресс загрузки или None, если нужно скачивать одним потоком
+    """
+    total, response = _probe_ranges(source)
+
+    if total is None:
+        logging.info("Сервер не поддерживает Range, скачиваю файл одним потоком...")
+        # Скачанные диапазоны не образуют начало файла, докачать их одним потоком нельзя
+        if state.segments:
+            state.reset()
+        return None
+
+    if state.segments and part.exists() and state.matches(response, total):
+        ranges = state.segments
+        logging.info("Продолжаю параллельную загрузку (%s уже скачано)...", format_size(state.done))
+    elif state.done and part.exists() and state.matches(response, total):
+        # Начатая одним потоком загрузка продолжается так же, чтобы не терять скачанное
+        logging.info("Продолжаю загрузку одним потоком...")
+        return None
+    else:
+        state.reset()
+        if total < 2 * min_segment_size:
+            return None
+        state.set_validators(response, total)
+        ranges = _split_ranges(total, segments, min_segment_size)
+
+    scheduler = _SegmentScheduler(ranges, min_segment_size)
+    state.segments = scheduler.ranges()
+    state.done = total - sum(end - pos for pos, end in state.segments)
+    state.save()
+
+    bar = Progress(total, done=state.done, enabled=progress)
+    part_file = _PartFile(part, total)
+    validator = state.etag or state.last_modified
+
+    def worker():
+        while True:
+            segment = scheduler.next_segment()
+            if segment is None:
+                return
+            try:
+                _fetch_segment(source, validator, segment, scheduler, part_file, state, bar, chunk_size)
+            finally:
+                scheduler.finish(segment)
+
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            futures = [executor.submit(worker) for _ in range(segments)]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    # Диапазон упавшего потока возвращается в очередь и может быть докачан другими
+                    logging.debug("Ошибка при загрузке диапазона: %r", e)
+                    errors.append(e)
+    finally:
+        part_file.close()
+        state.segments = scheduler.ranges()
+
+    if state.segments:
+        if errors:
+            raise errors[0]
+        raise DownloadError("Не все диапазоны файла были скачаны.")
+
+    bar.finish()
+    return bar
+
+
+def _fetch_segment(source: LinkSource, validator: Optional[str], segment: _Segment,
+                   scheduler: _SegmentScheduler, part_file: _PartFile, state: DownloadState,
+                   bar: Progress, chunk_size: int):
+    """
+    Скачивает один диапазон и пишет его по смещению, пока диапазон не закончится.
+
+    Если прямая ссылка истекла, получает новую и продолжает с текущей позиции диапазона.
+    При обрыве соединения или коротком теле ответа повторяет запрос с записанной позиции
+    по политике повторов сессии; счетчик попыток сбрасывается, если с прошлого обрыва
+    данные записывались.
+    """
+    policy = source.session.retry_policy
+    attempt = 0
+    failed_at = None
+
+    with span("segment", "download", start=segment.pos, end=segment.end) as info:
+        while True:
+            headers = {"Accept-Encoding": "identity", "Range": f"bytes={segment.pos}-{segment.end - 1}"}
+            if validator:
+                headers["If-Range"] = validator
+
+            link = source.link
+            try:
+                with source.stream(headers) as response:
+                    if response.status_code in EXPIRED_LINK_STATUSES:
+                        source.refresh(link)
+                        continue
+                    _write_segment(response, segment, scheduler, part_file, state, bar, chunk_size)
+                    if segment.remaining > 0:
+                        # Короткое тело ответа — такой же обрыв, как ошибка соединения
+                        raise httpx.RemoteProtocolError("Сервер вернул диапазон не полностью",
+                                                        request=response.request)
+                    # Конец диапазона мог сдвинуться, если его часть забрал другой поток
+                    info["end"] = segment.end
+                    return
+            except httpx.TransportError as e:
+                with scheduler.lock:
+                    segment.pos = segment.written
+                if segment.remaining <= 0:
+                    return
+
+                attempt = 1 if failed_at != segment.written else attempt + 1
+                failed_at = segment.written
+                if attempt >= policy.max_attempts or not policy.retryable_error("GET", e):
+                    raise
+                source.session.metrics.inc("retries_total", phase="file", reason=type(e).__name__)
+                logging.info("Обрыв загрузки диапазона (%s), продолжаю с %s (%s/%s)...",
+                             type(e).__name__, segment.pos, attempt + 1, policy.max_attempts)
+                with span("backoff", "wait", phase="file"):
+                    time.sleep(policy.delay(attempt))
+
+
+def _write_segment(response, segment: _Segment, scheduler: _SegmentScheduler, part_file: _PartFile,
+                   state: DownloadState, bar: Progress, chunk_size: int):
+    """
+    Пишет тело ответа на Range-запрос по смещению диапазона.
+    """
+    start, _ = _content_range(response)
+    if response.status_code != 206 or start != segment.pos:
+        raise DownloadError(f"Сервер не вернул диапазон файла: {response.status_code}")
+
+    for chunk in response.iter_bytes(chunk_size):
+        with scheduler.lock:
+            # Конец диапазона мог сдвинуться, если его часть забрал другой поток.
+            # pos сдвигается сразу, чтобы этот блок не достался другому потоку при делении
+            chunk = chunk[:segment.remaining]
+            offset = segment.pos
+            segment.pos += len(chunk)
+
+        if chunk:
+            with span("write", "io", offset=offset, size=len(chunk)):
+                part_file.write_at(offset, chunk)
+
+        # В состояние попадают только записанные данные: после сбоя докачка не оставит дыр
+        with scheduler.lock:
+            segment.written = offset + len(chunk)
+            bar.update(len(chunk))
+            state.done += len(chunk)
+            state.segments = scheduler._ranges_locked()
+            state.save(force=False)
+
+        if segment.remaining <= 0:
+            return
@@ -1,10 +1,22 @@
+import asyncio
 import logging
 import re
+import time
 import urllib.parse
 
-from typing import Tuple
+from typing import Optional, Tuple
 
+from .cache import account_key
 from .exceptions import AuthenticationError, DirectLinkNotFound
+from .retry import Deadline
+from .scanner import async_scan_stream, scan_stream
+from .tracing import span
+
+ATTACH_PATTERN = re.compile(
+    r'<a[^>]*href="(https://4pda\.to/forum/index\.php\?act=attach[^"]*)"[^>]*>Скачать'
+)
+# Редирект на страницу входа вместо файла означает, что авторизация сессии потеряна
+AUTH_REDIRECT_PATTERN = re.compile(r"[?&]act=(?:auth|login)\b")
 
 
 def parse_url(base_url: str, raw_url: str) -> Tuple[int, str]:
@@ -26,11 +38,12 @@ def parse_url(base_url: str, raw_url: str) -> Tuple[int, str]:
         return None, None
 
     post_id = int(match.group(1))
-    file_name = urllib.parse.quote(match.group(2)).replace('%20', '+')
+    # Уже закодированное имя не кодируется повторно
+    file_name = urllib.parse.quote(match.group(2), safe="/%+").replace('%20', '+')
 
     return post_id, file_name
 
-def get_direct_link(session, config, url):
+def get_direct_link(session, config, url, cache=None, timeout: Optional[float] = None):
     """
     Получает прямую ссылку для скачивания файла с форума 4PDA.
 
@@ -43,6 +56,10 @@ def get_direct_link(session, config, url):
         session: Сессия httpx для выполнения HTTP-запросов
         config: Объект конфигурации с авторизационными данными
         url (str): URL страницы загрузки файла
+        cache (LinkCache, optional): Кэш прямых ссылок, при попадании запросы не выполняются.
+            Его индекс attachment позволяет для известных файлов сразу запрашивать attachment,
+            пропуская страницу загрузки
+        timeout (Optional[float]): Общий бюджет времени в секундах на все запросы и повторы
 
     Returns:
         str: Прямая ссылка для скачивания файла
@@ -51,13 +68,235 @@ def get_direct_link(session, config, url):
         ValueError: Если ссылка для скачивания файла не валидная
         ValueError: Если не удалось найти ссылку на attachment в HTML
         DirectLinkNotFound: Если сервер не вернул прямую ссылку после всех попыток
+        DeadlineExceeded: Если бюджет времени исчерпан
+        AuthenticationError: Если форум перенаправил на страницу авторизации
 
     Notes:
-        - Очищает cookies от служебных параметров (начинающихся с __)
-        - Добавляет необходимые cookies modtids и modpids
+        - Cookies авторизации берутся из хранилища сессии
         - Обрабатывает 404 ошибку как отсутствие доступа к файлу
+        - Редирект на страницу авторизации сбрасывает сохраненный результат проверки авторизации
+        - Если сервер не дал прямую ссылку, весь процесс повторяется по session.retry_policy
+    """
+    post_id, file_name, url = _prepare_download_request(session, url)
+
+    if cache is not None:
+        found, link = cache.get(post_id, file_name, account_key(config))
+        if found:
+            return _cached_direct_link(link)
+
+    attachments = cache.attachments if cache is not None else None
+    deadline = Deadline(timeout) if timeout else None
+    attempt = 0
+
+    with span("get_direct_link", "resolve", post_id=post_id) as info:
+        while True:
+            attempt += 1
+            try:
+                link = _resolve_direct_link(session, url, (post_id, file_name), attachments, deadline)
+                break
+            except AuthenticationError:
+                _invalidate_auth(config)
+                raise
+            except DirectLinkNotFound:
+                delay = _resolve_retry_delay(session, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+        info["attempts"] = attempt
+
+    if cache is not None:
+        cache.set(post_id, file_name, link, account_key(config))
+
+    return link
+
+
+async def async_get_direct_link(session, config, url, cache=None, timeout: Optional[float] = None):
+    """
+    Асинхронная версия get_direct_link для AsyncFourPDASession.
+
+    Args:
+        session: Асинхронная сессия для выполнения HTTP-запросов
+        config: Объект конфигурации с авторизационными данными
+        url (str): URL страницы загрузки файла
+        cache (LinkCache, optional): Кэш прямых ссылок
+        timeout (Optional[float]): Общий бюджет времени в секундах на все запросы и повторы
+
+    Returns:
+        str: Прямая ссылка для скачивания файла
+    """
+    post_id, file_name, url = _prepare_download_request(session, url)
+
+    if cache is not None:
+        found, link = cache.get(post_id, file_name, account_key(config))
+        if found:
+            return _cached_direct_link(link)
+
+    attachments = cache.attachments if cache is not None else None
+    deadline = Deadline(timeout) if timeout else None
+    attempt = 0
+
+    with span("get_direct_link", "resolve", post_id=post_id) as info:
+        while True:
+            attempt += 1
+            try:
+                link = await _async_resolve_direct_link(session, url, (post_id, file_name), attachments, deadline)
+                break
+            except AuthenticationError:
+                _invalidate_auth(config)
+                raise
+            except DirectLinkNotFound:
+                delay = _resolve_retry_delay(session, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+        info["attempts"] = attempt
+
+    if cache is not None:
+        cache.set(post_id, file_name, link, account_key(config))
+
+    return link
+
+
+def _resolve_retry_delay(session, attempt: int, deadline: Optional[Deadline]) -> Optional[float]:
+    """
+    Возвращает задержку перед повторным получением прямой ссылки или None,
+    если попытки или бюджет времени исчерпаны.
+    """
+    policy = session.retry_policy
+    if attempt >= policy.max_attempts:
+        return None
+
+    delay = policy.delay(attempt)
+    if deadline is not None and deadline.remaining() <= delay:
+        return None
+
+    logging.info("Сервер не дал ссылку на файл, повторяю (%s/%s)...", attempt + 1, policy.max_attempts)
+    return delay
+
+
+def _resolve_direct_link(session, url: str, key: Tuple[int, str], attachments=None,
+                         deadline: Optional[Deadline] = None):
+    """
+    Выполняет двухэтапное получение прямой ссылки без учета кэша.
+
+    Если для (post_id, file_name) в индексе есть ссылка на attachment, сначала
+    запрашивает ее напрямую. Если запись устарела, удаляет ее и выполняет
+    полный процесс, записывая найденную ссылку на attachment в индекс.
+    Все запросы укладываются в общий бюджет времени deadline.
     """
-    post_id, file_name = parse_url(session.base_url, url)
+    if attachments is not None:
+        attach_url = attachments.get(*key)
+        if attach_url:
+            logging.info("Запрашиваю attachment из индекса...")
+            request = session.get(attach_url, follow_redirects=False, deadline=deadline, phase="attach")
+            _check_auth_redirect(request)
+            location = _extract_direct_link(request)
+            if location:
+                return location
+            _drop_stale_attachment(attachments, key)
+
+    logging.info("Открываю страницу загрузки...")
+
+    # Страница читается потоково и закрывается, как только найдена ссылка на attachment
+    with session.stream("GET", url, deadline=deadline, phase="download-page") as request:
+        _check_auth_redirect(request)
+        if request.status_code == 404:
+            return logging.error("Файл не найден или у вас нет к нему доступа.")
+
+        location = _extract_direct_link(request)
+        if location:
+            return location
+
+        logging.debug("Сервер не дал ссылку на файл сразу, пробуем загрузку attachment...")
+
+        attach_url = _extract_attach_url(scan_stream(request.iter_text(), {"attach": ATTACH_PATTERN}))
+
+    logging.info("Запрашиваю attachment...")
+
+    request = session.get(attach_url, follow_redirects=False, deadline=deadline, phase="attach")
+    _check_auth_redirect(request)
+
+    location = _extract_direct_link(request)
+    if location:
+        if attachments is not None:
+            attachments.set(*key, attach_url)
+        return location
+
+    raise DirectLinkNotFound("Сервер не дал ссылку на файл, попробуйте снова.")
+
+
+async def _async_resolve_direct_link(session, url: str, key: Tuple[int, str], attachments=None,
+                                     deadline: Optional[Deadline] = None):
+    """
+    Асинхронная версия _resolve_direct_link.
+    """
+    if attachments is not None:
+        attach_url = attachments.get(*key)
+        if attach_url:
+            logging.info("Запрашиваю attachment из индекса...")
+            request = await session.get(attach_url, follow_redirects=False, deadline=deadline, phase="attach")
+            _check_auth_redirect(request)
+            location = _extract_direct_link(request)
+            if location:
+                return location
+            _drop_stale_attachment(attachments, key)
+
+    logging.info("Открываю страницу загрузки...")
+
+    async with session.stream("GET", url, deadline=deadline, phase="download-page") as request:
+        _check_auth_redirect(request)
+        if request.status_code == 404:
+            return logging.error("Файл не найден или у вас нет к нему доступа.")
+
+        location = _extract_direct_link(request)
+        if location:
+            return location
+
+        logging.debug("Сервер не дал ссылку на файл сразу, пробуем загрузку attachment...")
+
+        attach_url = _extract_attach_url(await async_scan_stream(request.aiter_text(), {"attach": ATTACH_PATTERN}))
+
+    logging.info("Запрашиваю attachment...")
+
+    request = await session.get(attach_url, follow_redirects=False, deadline=deadline, phase="attach")
+    _check_auth_redirect(request)
+
+    location = _extract_direct_link(request)
+    if location:
+        if attachments is not None:
+            attachments.set(*key, attach_url)
+        return location
+
+    raise DirectLinkNotFound("Сервер не дал ссылку на файл, попробуйте снова.")
+
+
+def _drop_stale_attachment(attachments, key: Tuple[int, str]):
+    logging.debug("Ссылка на attachment из индекса устарела, открываю страницу загрузки...")
+    attachments.invalidate(*key)
+
+
+def _cached_direct_link(link):
+    """
+    Возвращает результат из кэша так же, как его вернул бы запрос к серверу.
+    """
+    if not link:
+        return logging.error("Файл не найден или у вас нет к нему доступа (из кэша).")
+    logging.info("Прямая ссылка взята из кэша.")
+    return link
+
+
+def _prepare_download_request(session, url: str) -> Tuple[int, str, str]:
+    """
+    Проверяет DL-ссылку и готовит URL для запроса страницы загрузки.
+
+    Returns:
+        Tuple[int, str, str]: post_id, file_name и нормализованный URL
+
+    Raises:
+        ValueError: Если ссылка для скачивания файла не валидная
+    """
+    with span("parse-url", "parse"):
+        post_id, file_name = parse_url(session.base_url, url)
 
     if not all([post_id, file_name]):
         raise ValueError(
@@ -65,46 +304,53 @@ def get_direct_link(session, config, url):
             f"{session.base_url}/forum/dl/post/<ID>/<filename>"
         )
 
-    url = f"{session.base_url}/forum/dl/post/{post_id}/{file_name}"
+    return post_id, file_name, f"{session.base_url}/forum/dl/post/{post_id}/{file_name}"
 
-    logging.info("Открываю страницу загрузки...")
 
-    cookies = {k: v for k, v in config.cookies.items() if not k.startswith("__")}
-    cookies.update({"modtids": "", "modpids": ""})
+def _check_auth_redirect(response):
+    """
+    Проверяет, не перенаправил ли форум запрос на страницу авторизации.
 
-    request = session.get(url, cookies=cookies)
+    Raises:
+        AuthenticationError: Если Location ведет на страницу авторизации
+    """
+    location = response.headers.get("location")
+    if response.is_redirect and location and AUTH_REDIRECT_PATTERN.search(location):
+        raise AuthenticationError("Форум перенаправил на страницу авторизации, авторизация не актуальна.")
 
-    if request.status_code == 404:
-        return logging.error("Файл не найден или у вас нет к нему доступа.")
 
-    headers = dict(request.headers)
-    headers_keys_lower = [key.lower() for key in headers]
-    if "location" in headers_keys_lower:
-        location = headers.get("location")
-        if location and "4pda.ws" in location:
-            logging.info("Финальная ссылка получена.")
-            return location
+def _invalidate_auth(config):
+    """
+    Сбрасывает сохраненный результат проверки авторизации, чтобы следующая
+    проверка обратилась к форуму.
+    """
+    if config.invalidate_auth():
+        logging.debug("Результат проверки авторизации сброшен.")
+        config.save()
 
-    logging.debug("Сервер не дал ссылку на файл сразу, пробуем загрузку attachment...")
 
-    match = re.search(
-        r'<a[^>]*href="(https://4pda\.to/forum/index\.php\?act=attach[^"]*)"[^>]*>Скачать',
-        request.text
-    )
+def _extract_direct_link(response):
+    """
+    Возвращает ссылку на 4pda.ws из заголовка Location, если она есть.
+    """
+    location = response.headers.get("location")
+    if location and "4pda.ws" in location:
+        logging.info("Финальная ссылка получена.")
+        return location
+    return None
 
-    if not match:
-        raise ValueError("Не удалось получить ссылку на attachment.")
 
-    logging.info("Запрашиваю attachment...")
+def _extract_attach_url(found: dict) -> str:
+    """
+    Возвращает ссылку на attachment, найденную в HTML страницы загрузки.
 
-    request = session.get(match.group(1), cookies=cookies, follow_redirects=False)
+    Args:
+        found (dict): Результат scan_stream с шаблоном ATTACH_PATTERN
 
-    headers = dict(request.headers)
-    headers_keys_lower = [key.lower() for key in headers]
-    if "location" in headers_keys_lower:
-        location = headers.get("location")
-        if location and "4pda.ws" in location:
-            logging.info("Финальная ссылка получена.")
-            return location
+    Raises:
+        ValueError: Если не удалось найти ссылку на attachment в HTML
+    """
+    if not found["attach"]:
+        raise ValueError("Не удалось получить ссылку на attachment.")
 
-    raise DirectLinkNotFound("Сервер не дал ссылку на файл, попробуйте снова.")
\ No newline at end of file
+    return found["attach"]
\ No newline at end of file
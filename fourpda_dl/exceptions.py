@@ -12,4 +12,16 @@ class AuthenticationError(Exception):
 
 class DirectLinkNotFound(Exception):
     """Не удалось найти прямую ссылку для скачивания."""
-    pass
\ No newline at end of file
+    pass
+
+class DownloadError(Exception):
+    """Ошибка при скачивании файла по прямой ссылке."""
+    pass
+
+class DeadlineExceeded(Exception):
+    """Исчерпан бюджет времени на выполнение запросов."""
+    pass
+
+class NoHealthyAccounts(Exception):
+    """В пуле сессий не осталось аккаунтов, пригодных для запросов."""
+    pass
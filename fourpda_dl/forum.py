@@ -0,0 +1,239 @@
+import fnmatch
+import html
+import logging
+import re
+import urllib.parse
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .batch import DEFAULT_JOBS, DEFAULT_RESOLVE_TIMEOUT, resolve_batch
+from .downloader import parse_url
+
+# Число постов на странице темы 4PDA
+POSTS_PER_PAGE = 20
+
+DL_LINK_PATTERN = re.compile(r'href="((?:https?:)?(?://4pda\.to)?/forum/dl/post/(\d+)/([^"?#]+)[^"]*)"')
+PAGE_OFFSET_PATTERN = r'showtopic={topic_id}(?:&amp;|&)st=(\d+)'
+# Ссылка на attachment в посте, текст ссылки — имя файла
+ATTACH_LINK_PATTERN = re.compile(
+    r'<a[^>]*href="((?:https?:)?//4pda\.to/forum/index\.php\?act=attach[^"]*)"[^>]*>([^<]+)</a>'
+)
+POST_ANCHOR_PATTERN = re.compile(r'name="entry(\d+)"')
+
+
+def parse_post_id(value: str) -> Optional[int]:
+    """
+    Извлекает ID поста из числа, findpost-ссылки или DL-ссылки.
+    """
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    match = re.search(r"(?:[?&](?:pid|p)=|/forum/dl/post/)(\d+)", value)
+    return int(match.group(1)) if match else None
+
+
+def parse_topic_id(value: str) -> Optional[int]:
+    """
+    Извлекает ID темы из числа или ссылки на тему.
+    """
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    match = re.search(r"[?&]showtopic=(\d+)", value)
+    return int(match.group(1)) if match else None
+
+
+def extract_attachments(base_url: str, page: str, post_id: Optional[int] = None) -> List[str]:
+    """
+    Извлекает DL-ссылки на все вложения страницы за один проход по HTML.
+
+    Args:
+        base_url (str): Базовый домен
+        page (str): HTML страницы поста или темы
+        post_id (Optional[int]): Оставить только вложения этого поста
+
+    Returns:
+        List[str]: DL-ссылки в порядке появления на странице, без дубликатов
+    """
+    links = []
+    seen = set()
+
+    for match in DL_LINK_PATTERN.finditer(page):
+        # Имя остается закодированным: декодированные "?" и "#" обрезали бы его в parse_url
+        link_post_id = int(match.group(2))
+        name = html.unescape(match.group(3))
+        if post_id is not None and link_post_id != post_id:
+            continue
+        if (link_post_id, name) in seen:
+            continue
+        seen.add((link_post_id, name))
+        links.append(f"{base_url}/forum/dl/post/{link_post_id}/{name}")
+
+    return links
+
+
+def extract_attach_urls(base_url: str, page: str) -> Dict[Tuple[int, str], str]:
+    """
+    Извлекает ссылки на attachment для вложений постов страницы.
+
+    Ссылка на attachment относится к посту, после якоря которого она стоит,
+    и к DL-ссылке этого поста с тем же именем файла.
+
+    Args:
+        base_url (str): Базовый домен
+        page (str): HTML страницы поста или темы
+
+    Returns:
+        Dict[Tuple[int, str], str]: Ссылки на attachment по ключу (post_id, file_name) из parse_url
+    """
+    anchors = list(POST_ANCHOR_PATTERN.finditer(page))
+    found = {}
+
+    for index, anchor in enumerate(anchors):
+        end = anchors[index + 1].start() if index + 1 < len(anchors) else len(page)
+        post = page[anchor.start():end]
+
+        keys = {}
+        for link in extract_attachments(base_url, post, int(anchor.group(1))):
+            key = parse_url(base_url, link)
+            keys[urllib.parse.unquote_plus(link.rsplit("/", 1)[-1])] = key
+
+        for match in ATTACH_LINK_PATTERN.finditer(post):
+            key = keys.get(html.unescape(match.group(2)).strip())
+            if key is not None:
+                found[key] = urllib.parse.urljoin(base_url, html.unescape(match.group(1)))
+
+    return found
+
+
+def seed_attach_index(cache, base_url: str, page: str) -> int:
+    """
+    Записывает ссылки на attachment со страницы в индекс кэша, чтобы получение
+    прямых ссылок не открывало страницу загрузки каждого файла.
+
+    Args:
+        cache (LinkCache, optional): Кэш прямых ссылок с индексом attachment
+        base_url (str): Базовый домен
+        page (str): HTML страницы поста или темы
+
+    Returns:
+        int: Число записанных ссылок
+    """
+    if cache is None:
+        return 0
+
+    found = extract_attach_urls(base_url, page)
+    for (post_id, file_name), attach_url in found.items():
+        cache.attachments.set(post_id, file_name, attach_url)
+    return len(found)
+
+
+def filter_attachments(links: Iterable[str], glob: Optional[str] = None, regex: Optional[str] = None) -> List[str]:
+    """
+    Фильтрует DL-ссылки по имени файла.
+
+    Args:
+        links (Iterable[str]): DL-ссылки из extract_attachments
+        glob (Optional[str]): Шаблон имени файла, например "*.zip"
+        regex (Optional[str]): Регулярное выражение для поиска в имени файла
+
+    Returns:
+        List[str]: Подходящие ссылки
+    """
+    pattern = re.compile(regex) if regex else None
+    result = []
+
+    for link in links:
+        name = link.rsplit("/", 1)[-1]
+        if glob and not fnmatch.fnmatch(name, glob):
+            continue
+        if pattern and not pattern.search(name):
+            continue
+        result.append(link)
+
+    return result
+
+
+def _fetch_page(session, url: str) -> str:
+    request = session.get(url, follow_redirects=True, phase="forum-page")
+    if request.status_code != 200:
+        raise ValueError(f"Неожиданный код-ответ сервера: {request.status_code}")
+    return request.text
+
+
+def get_post_attachments(session, config, post_id: int, cache=None) -> List[str]:
+    """
+    Получает DL-ссылки на все вложения поста одним запросом страницы.
+
+    Args:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        post_id (int): ID поста
+        cache (LinkCache, optional): Кэш, в индекс которого записываются ссылки на attachment поста
+
+    Returns:
+        List[str]: DL-ссылки на вложения поста
+    """
+    logging.info("Открываю пост %s...", post_id)
+    page = _fetch_page(session, f"{session.base_url}/forum/index.php?act=findpost&pid={post_id}")
+    seed_attach_index(cache, session.base_url, page)
+    return extract_attachments(session.base_url, page, post_id)
+
+
+def topic_page_offsets(topic_id: int, page: str) -> List[int]:
+    """
+    Возвращает смещения (st) всех страниц темы по ссылкам пагинации.
+    """
+    offsets = [int(st) for st in re.findall(PAGE_OFFSET_PATTERN.format(topic_id=topic_id), page)]
+    last = max(offsets, default=0)
+    return list(range(0, last + 1, POSTS_PER_PAGE))
+
+
+def get_topic_attachments(session, config, topic_id: int, jobs: int = DEFAULT_JOBS, cache=None) -> List[str]:
+    """
+    Получает DL-ссылки на все вложения темы.
+
+    Первая страница определяет число страниц, остальные загружаются параллельно.
+
+    Args:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        topic_id (int): ID темы
+        jobs (int, optional): Число одновременных запросов страниц
+        cache (LinkCache, optional): Кэш, в индекс которого записываются ссылки на attachment темы
+
+    Returns:
+        List[str]: DL-ссылки на вложения в порядке страниц
+    """
+    url = f"{session.base_url}/forum/index.php?showtopic={topic_id}"
+
+    logging.info("Открываю тему %s...", topic_id)
+    first = _fetch_page(session, url)
+    offsets = topic_page_offsets(topic_id, first)[1:]
+
+    logging.info("Страниц в теме: %s", len(offsets) + 1)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        pages = [first] + list(executor.map(lambda st: _fetch_page(session, f"{url}&st={st}"), offsets))
+
+    links = []
+    for page in pages:
+        seed_attach_index(cache, session.base_url, page)
+        links.extend(extract_attachments(session.base_url, page))
+    # Один и тот же файл может встречаться в цитатах на разных страницах
+    return list(dict.fromkeys(links))
+
+
+def resolve_attachments(session, config, links: Iterable[str], jobs: int = DEFAULT_JOBS,
+                        cache=None, timeout: Optional[float] = DEFAULT_RESOLVE_TIMEOUT,
+                        pool=None) -> Iterator[dict]:
+    """
+    Получает прямые ссылки для найденных вложений параллельно через общую сессию.
+
+    Yields:
+        dict: Записи в формате resolve_batch
+    """
+    links = list(links)
+    logging.info("Найдено вложений: %s", len(links))
+    return resolve_batch(session, config, links, jobs, cache, timeout, pool)
@@ -0,0 +1,357 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .batch import normalize_urls
+from .config import DEFAULT_CONFIG_DIR
+from .defaults import DEFAULT_JOB_ATTEMPTS as DEFAULT_MAX_ATTEMPTS, DEFAULT_WORKERS
+from .download import download_file
+from .downloader import get_direct_link
+
+DEFAULT_QUEUE_FILE = DEFAULT_CONFIG_DIR / "jobs.sqlite3"
+# Сколько секунд задача считается занятой без продления аренды.
+# Задачи процесса, который упал и перестал продлевать аренду, возвращаются в очередь.
+DEFAULT_LEASE = 120.0
+# Пауза между проверками очереди в режиме ожидания новых задач
+POLL_INTERVAL = 5.0
+
+QUEUED = "queued"
+RESOLVING = "resolving"
+DOWNLOADING = "downloading"
+DONE = "done"
+FAILED = "failed"
+
+STATES = (QUEUED, RESOLVING, DOWNLOADING, DONE, FAILED)
+ACTIVE_STATES = (RESOLVING, DOWNLOADING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    post_id INTEGER NOT NULL,
+    output TEXT,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL,
+    link TEXT,
+    path TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+class JobQueue:
+    """
+    Персистентная очередь задач загрузки в SQLite.
+
+    Задача проходит состояния queued -> resolving -> downloading -> done
+    или failed после исчерпания попыток. Воркеры забирают задачи атомарно
+    (BEGIN IMMEDIATE) и держат их под арендой, которую продлевают во время
+    работы. Если процесс упал, аренда истекает и задача возвращается в очередь,
+    поэтому одну очередь могут разбирать несколько процессов одновременно.
+
+    Каждый поток использует собственное соединение с базой.
+
+    Attributes:
+        path (Path): Путь к файлу базы
+        lease (float): Длительность аренды задачи в секундах
+        max_attempts (int): Максимальное число попыток для задачи
+        owner (str): Идентификатор процесса-воркера
+    """
+
+    def __init__(self, path: Path = DEFAULT_QUEUE_FILE, lease: float = DEFAULT_LEASE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Транзакциями управляем сами, чтобы брать блокировку на запись сразу (BEGIN IMMEDIATE)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add(self, base_url: str, urls: Iterable[str], output: Optional[str] = None) -> Tuple[int, List[str]]:
+        """
+        Добавляет ссылки в очередь. Уже добавленные ссылки пропускаются.
+
+        Args:
+            base_url (str): Базовый домен
+            urls (Iterable[str]): DL-ссылки
+            output (Optional[str]): Директория для сохранения, по умолчанию текущая
+
+        Returns:
+            Tuple[int, List[str]]: Число добавленных задач и список невалидных ссылок
+        """
+        valid, invalid = normalize_urls(base_url, urls)
+        now = time.time()
+        output = os.path.abspath(output or os.getcwd())
+
+        with self._transaction() as conn:
+            added = 0
+            for url, post_id, _ in valid:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (url, post_id, output, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    (url, post_id, output, now, now),
+                )
+                added += cursor.rowcount
+
+        return added, invalid
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        """
+        Атомарно забирает следующую задачу из очереди.
+
+        Перед выбором в очередь возвращаются задачи с истекшей арендой, а те из них,
+        у которых исчерпаны попытки, переводятся в failed.
+
+        Returns:
+            Optional[sqlite3.Row]: Задача в состоянии resolving или None, если очередь пуста
+        """
+        now = time.time()
+
+        expired = f"state IN ({', '.join('?' * len(ACTIVE_STATES))}) AND lease_until < ?"
+
+        with self._transaction() as conn:
+            exhausted = conn.execute(
+                f"UPDATE jobs SET state = ?, owner = NULL, lease_until = NULL, error = ?, updated = ? "
+                f"WHERE {expired} AND attempts >= ?",
+                (FAILED, "lease expired", now, *ACTIVE_STATES, now, self.max_attempts),
+            ).rowcount
+            if exhausted:
+                logging.warning("Задач с истекшей арендой и исчерпанными попытками переведено в failed: %s", exhausted)
+
+            recovered = conn.execute(
+                f"UPDATE jobs SET state = ?, owner = NULL, lease_until = NULL, updated = ? WHERE {expired}",
+                (QUEUED, now, *ACTIVE_STATES, now),
+            ).rowcount
+            if recovered:
+                logging.warning("Возвращено в очередь задач с истекшей арендой: %s", recovered)
+
+            job = conn.execute(
+                "SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if job is None:
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                (RESOLVING, self.owner, now + self.lease, now, job["id"]),
+            )
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+
+    def update(self, job: sqlite3.Row, state: str, **fields) -> bool:
+        """
+        Переводит задачу в новое состояние и продлевает аренду.
+
+        Задача меняется, только если она все еще арендована этим процессом
+        и не была забрана заново (номер попытки не изменился). Иначе аренда
+        истекла, и задачей уже может заниматься другой воркер.
+
+        Args:
+            job (sqlite3.Row): Задача, полученная через claim()
+            state (str): Новое состояние
+            **fields: Дополнительные поля (link, path, error)
+
+        Returns:
+            bool: False если аренда задачи потеряна и она не изменена
+        """
+        now = time.time()
+        fields.update(state=state, updated=now)
+        if state in ACTIVE_STATES:
+            fields["lease_until"] = now + self.lease
+        else:
+            fields.update(owner=None, lease_until=None)
+
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._transaction() as conn:
+            updated = conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ? AND owner = ? AND attempts = ?",
+                (*fields.values(), job["id"], self.owner, job["attempts"]),
+            ).rowcount
+
+        if not updated:
+            logging.warning("Аренда задачи %s истекла, ее забрал другой воркер: состояние %s не сохранено.",
+                            job["id"], state)
+        return bool(updated)
+
+    def fail(self, job: sqlite3.Row, error: str, retry: bool = True) -> bool:
+        """
+        Отмечает неудачную попытку: задача возвращается в очередь или,
+        если попытки исчерпаны или повтор бессмысленен, переходит в failed.
+
+        Returns:
+            bool: False если аренда задачи потеряна и она не изменена
+        """
+        if retry and job["attempts"] < self.max_attempts:
+            return self.update(job, QUEUED, error=error)
+        return self.update(job, FAILED, error=error)
+
+    def heartbeat(self):
+        """
+        Продлевает аренду всех активных задач этого процесса.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE owner = ? "
+                f"AND state IN ({', '.join('?' * len(ACTIVE_STATES))})",
+                (now + self.lease, self.owner, *ACTIVE_STATES),
+            )
+
+    def retry(self, include_done: bool = False) -> int:
+        """
+        Возвращает неудачные задачи в очередь со сброшенным счетчиком попыток.
+
+        Args:
+            include_done (bool, optional): Также поставить заново завершенные задачи
+
+        Returns:
+            int: Число задач, возвращенных в очередь
+        """
+        states = (FAILED, DONE) if include_done else (FAILED,)
+        with self._transaction() as conn:
+            return conn.execute(
+                f"UPDATE jobs SET state = ?, attempts = 0, error = NULL, updated = ? "
+                f"WHERE state IN ({', '.join('?' * len(states))})",
+                (QUEUED, time.time(), *states),
+            ).rowcount
+
+    def status(self) -> Dict[str, int]:
+        """
+        Возвращает число задач в каждом состоянии.
+        """
+        counts = dict.fromkeys(STATES, 0)
+        for row in self._connection().execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+            counts[row["state"]] = row["n"]
+        return counts
+
+    def failed(self) -> List[sqlite3.Row]:
+        """
+        Возвращает задачи в состоянии failed.
+        """
+        return self._connection().execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (FAILED,)).fetchall()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _run_job(session, config, queue: JobQueue, job: sqlite3.Row, cache=None, segments: int = 1):
+    url = job["url"]
+
+    try:
+        link = get_direct_link(session, config, url, cache)
+    except Exception as e:
+        logging.error("Не удалось получить ссылку %s: %s", url, e)
+        return queue.fail(job, type(e).__name__)
+
+    if not link:
+        # Доступ к файлу не появится от повторных попыток
+        return queue.fail(job, "FileNotFound", retry=False)
+
+    if not queue.update(job, DOWNLOADING, link=link):
+        # Задачу уже забрал другой воркер: две загрузки в один .part испортили бы файл
+        return
+
+    try:
+        # В очередь всегда добавляется директория, а не путь к файлу
+        Path(job["output"]).mkdir(parents=True, exist_ok=True)
+        path = download_file(session, config, url, job["output"], cache=cache, progress=False,
+                             segments=segments, link=link)
+    except Exception as e:
+        logging.error("Не удалось скачать %s: %s", url, e)
+        return queue.fail(job, type(e).__name__)
+
+    queue.update(job, DONE, path=str(path), error=None)
+
+
+def run_queue(session, config, queue: JobQueue, workers: int = DEFAULT_WORKERS, cache=None,
+              segments: int = 1, follow: bool = False):
+    """
+    Разбирает очередь задач в несколько потоков.
+
+    Пока воркеры работают, отдельный поток продлевает аренду их задач.
+    Незавершенные загрузки продолжаются с места остановки за счет .part файлов.
+
+    Args:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        queue (JobQueue): Очередь задач
+        workers (int, optional): Число одновременно выполняемых задач
+        cache (LinkCache, optional): Кэш прямых ссылок
+        segments (int, optional): Число соединений на одну загрузку
+        follow (bool, optional): Не завершаться на пустой очереди, а ждать новых задач
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(queue.lease / 3):
+            try:
+                queue.heartbeat()
+            except sqlite3.Error as e:
+                logging.warning("Не удалось продлить аренду задач: %s", e)
+
+    def worker():
+        try:
+            while not stop.is_set():
+                job = queue.claim()
+                if job is None:
+                    if not follow:
+                        return
+                    stop.wait(POLL_INTERVAL)
+                    continue
+
+                logging.info("Задача %s (попытка %s): %s", job["id"], job["attempts"], job["url"])
+                _run_job(session, config, queue, job, cache, segments)
+        finally:
+            queue.close()
+
+    keeper = threading.Thread(target=heartbeat, daemon=True)
+    keeper.start()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    finally:
+        stop.set()
@@ -1,6 +1,17 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from datetime import datetime
+
+# Формат времени в текстовых логах
+TIME_FORMAT = "%I:%M %p %d.%m.%Y"
+# Поля, которые передаются в логи через extra= и попадают в JSON-записи
+STRUCTURED_FIELDS = ("post_id", "phase", "method", "status", "elapsed", "url", "account", "attempt")
+
+_listener = None
 
 
 class LoggingFormatter(logging.Formatter):
@@ -35,7 +46,7 @@ class LoggingFormatter(logging.Formatter):
     RESET = "\033[0m"
 
     def __init__(self, show_time=True, use_color=True):
-        super().__init__("%(message)s")
+        super().__init__("%(message)s", TIME_FORMAT)
         self.show_time = show_time
         self.use_color = use_color
 
@@ -43,9 +54,9 @@ class LoggingFormatter(logging.Formatter):
         icon = self.ICONS.get(record.levelno, "")
         module = record.module
 
-        # время
+        # время создания записи, а не вывода: при выводе через очередь они различаются
         if self.show_time:
-            time_str = datetime.now().strftime("%I:%M %p %d.%m.%Y")
+            time_str = self.formatTime(record, self.datefmt)
             prefix = f"[ {time_str} ] {icon} [ {module} ] ➜"
         else:
             prefix = f"{icon} [ {module} ] ➜"
@@ -59,7 +70,49 @@ class LoggingFormatter(logging.Formatter):
         return f"{prefix}  {msg}"
 
 
-def setup_logger(log_options: str):
+class JsonFormatter(logging.Formatter):
+    """
+    Форматтер JSON Lines: одна запись — один JSON-объект в строке.
+
+    Кроме времени (Unix time), уровня, модуля, потока и сообщения в запись
+    попадают поля из STRUCTURED_FIELDS, переданные через extra=, например
+    logging.debug("...", extra={"phase": "attach", "status": 302, "elapsed": 41.5}).
+    """
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "module": record.module,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = record.__dict__.get(field)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Обработчик, который только кладет запись в очередь.
+
+    Стандартный QueueHandler форматирует запись в вызывающем потоке; здесь
+    подставляются только аргументы сообщения, а время, цвета или JSON
+    формирует поток QueueListener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logger(log_options: str, stream=None, queued: bool = False):
     """
     Настраивает систему логирования с указанными опциями.
     
@@ -67,27 +120,50 @@ def setup_logger(log_options: str):
     - 'd' - включить уровень отладки (DEBUG)
     - 't' - показывать время в логах
     - 'c' - использовать цветное форматирование
+    - 'j' - писать записи в формате JSON Lines (t и c при этом не действуют)
     
     Args:
         log_options (str): Строка с опциями логирования (например 'dtc')
+        stream (optional): Поток для вывода логов, по умолчанию sys.stdout
+        queued (bool, optional): Выводить логи из отдельного потока. Вызывающие потоки
+            только кладут записи в очередь, поэтому форматирование и запись в поток
+            не задерживают запросы. Порядок логов относительно print() при этом
+            не гарантируется, поэтому режим включается для пакетных команд
     
     Notes:
         - По умолчанию используется уровень INFO если не указан 'd'
-        - Создает StreamHandler с кастомным форматтером
+        - Записи отключенных уровней отбрасываются до форматирования,
+          поэтому аргументы сообщений передаются в стиле %, а не f-строкой
         - Принудительно перезаписывает существующие настройки логирования
+        - Поток вывода очереди останавливается (с выводом оставшихся записей) при выходе
     """
+    global _listener
 
     debug_enabled = "d" in log_options
     show_time = "t" in log_options
     use_color = "c" in log_options
+    json_lines = "j" in log_options
 
     level = logging.DEBUG if debug_enabled else logging.INFO
 
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(LoggingFormatter(
-        show_time=show_time,
-        use_color=use_color
-    ))
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if json_lines:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(LoggingFormatter(
+            show_time=show_time,
+            use_color=use_color
+        ))
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    if queued:
+        records = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+        handler = _QueueHandler(records)
 
     logging.basicConfig(
         level=level,
@@ -96,3 +172,16 @@ def setup_logger(log_options: str):
     )
 
     logging.debug("Ведение журнала отладки включено.")
+
+
+def _stop_listener():
+    """
+    Выводит оставшиеся в очереди записи и останавливает поток вывода.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
@@ -0,0 +1,222 @@
+import json
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .storage import atomic_write_json, atomic_write_text
+
+PREFIX = "fourpda_"
+# Границы корзин гистограмм длительности в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Логическая фаза запроса, если вызывающая сторона ее не указала
+DEFAULT_PHASE = "other"
+
+# Этапы запроса по событиям trace httpcore. DNS входит в connect:
+# httpcore разрешает имя внутри connect_tcp
+STAGES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "wait",
+    "receive_response_body": "body",
+}
+
+HELP = {
+    "requests_total": "Ответы сервера по фазе, методу и коду",
+    "errors_total": "Сетевые ошибки по фазе и типу",
+    "retries_total": "Повторы запросов по фазе и причине",
+    "cloudflare_blocks_total": "Ответы с проверкой Cloudflare",
+    "response_bytes_total": "Байт тела ответа получено",
+    "link_refreshes_total": "Повторные получения истекших прямых ссылок",
+    "request_seconds": "Время попытки запроса (для потоковых — до заголовков ответа)",
+    "stage_seconds": "Длительность этапов запроса (connect, tls, send, wait, body)",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> Dict[str, int]:
+        result, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result[f"{bound:g}"] = total
+        result["+Inf"] = self.count
+        return result
+
+
+class Metrics:
+    """
+    Счетчики и гистограммы запросов сессии.
+
+    Потокобезопасен, один экземпляр можно разделять между сессиями
+    (например аккаунтами пула). Значения читаются через counter(),
+    histogram() и snapshot() и выгружаются в формате Prometheus или JSON.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Границы корзин гистограмм в секундах
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """
+        Увеличивает счетчик name с метками labels.
+        """
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Добавляет значение в гистограмму name с метками labels.
+        """
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Возвращает значение счетчика. Без меток — сумму по всем меткам.
+        """
+        with self._lock:
+            series = self._counters.get(name, {})
+            if labels:
+                return series.get(_labels(labels), 0)
+            return sum(series.values())
+
+    def histogram(self, name: str, **labels) -> Optional[dict]:
+        """
+        Возвращает гистограмму с метками labels или None, если значений не было.
+
+        Returns:
+            Optional[dict]: {"count", "sum", "buckets": {граница: число значений не больше нее}}
+        """
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(_labels(labels))
+            if histogram is None:
+                return None
+            return {"count": histogram.count, "sum": histogram.sum, "buckets": histogram.cumulative()}
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает все метрики в виде словаря (формат JSON-выгрузки).
+        """
+        with self._lock:
+            return {
+                "time": time.time(),
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {"labels": dict(key), "count": h.count, "sum": h.sum, "buckets": h.cumulative()}
+                        for key, h in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Возвращает метрики в текстовом формате Prometheus (для textfile collector).
+        """
+        def fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = PREFIX + name
+                lines += [f"# HELP {full} {HELP.get(name, name)}", f"# TYPE {full} counter"]
+                lines += [f"{full}{fmt(key)} {value:g}" for key, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                full = PREFIX + name
+                lines += [f"# HELP {full} {HELP.get(name, name)}", f"# TYPE {full} histogram"]
+                for key, histogram in sorted(series.items()):
+                    for bound, count in histogram.cumulative().items():
+                        lines.append(f"{full}_bucket{fmt(key, (('le', bound),))} {count}")
+                    lines.append(f"{full}_sum{fmt(key)} {histogram.sum:.6f}")
+                    lines.append(f"{full}_count{fmt(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """
+        Атомарно записывает метрики в файл: JSON, если имя оканчивается на .json,
+        иначе текстовый формат Prometheus.
+        """
+        path = Path(path)
+        if path.suffix == ".json":
+            atomic_write_json(path, self.snapshot(), indent=4)
+        else:
+            atomic_write_text(path, self.to_prometheus())
+
+    def __str__(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+
+class RequestTracer:
+    """
+    Обработчик расширения trace httpx: переводит события httpcore в гистограмму
+    stage_seconds по этапам запроса.
+
+    Передается в запрос через extensions={"trace": tracer} (синхронный клиент)
+    или extensions={"trace": tracer.atrace} (асинхронный клиент).
+
+    Attributes:
+        metrics (Metrics): Куда записываются длительности
+        phase (str): Логическая фаза запроса (download-page, attach, ...)
+    """
+
+    def __init__(self, metrics: Metrics, phase: str):
+        self.metrics = metrics
+        self.phase = phase
+        self._started: Dict[str, float] = {}
+
+    def __call__(self, event: str, info: dict):
+        name, _, state = event.rpartition(".")
+        stage = STAGES.get(name.rpartition(".")[2])
+        if stage is None:
+            return
+        if state == "started":
+            self._started[name] = time.perf_counter()
+        elif name in self._started:
+            self.metrics.observe("stage_seconds", time.perf_counter() - self._started.pop(name),
+                                 phase=self.phase, stage=stage)
+
+    async def atrace(self, event: str, info: dict):
+        self(event, info)
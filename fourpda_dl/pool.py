@@ -0,0 +1,229 @@
+import itertools
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from .config import ACCOUNTS_DIR, Config
+from .defaults import LEAST_LOADED, ROUND_ROBIN, STRATEGIES
+from .exceptions import AuthenticationError, CloudflareException, NoHealthyAccounts
+from .session import FourPDASession, validate_authentication
+
+# Блокировка Cloudflare часто временная, поэтому аккаунт возвращается в ротацию
+# через это время. Неактуальная авторизация исключает аккаунт до перезапуска.
+DEFAULT_BLOCK_COOLDOWN = 10 * 60
+
+
+class Account:
+    """
+    Аккаунт пула: собственные конфиг (cookies, cf_clearance) и сессия.
+
+    Attributes:
+        name (str): Имя аккаунта (имя файла конфига без .json)
+        config (Config): Конфиг аккаунта
+        session (FourPDASession): Сессия аккаунта
+        in_flight (int): Число выполняющихся сейчас операций
+        requests (int): Сколько раз аккаунт был выдан
+        healthy (bool): Участвует ли аккаунт в ротации
+        unhealthy_until (Optional[float]): До какого времени аккаунт исключен (None — до перезапуска)
+        last_error (Optional[str]): Причина исключения из ротации
+    """
+
+    def __init__(self, name: str, config: Config, session):
+        self.name = name
+        self.config = config
+        self.session = session
+        self.in_flight = 0
+        self.requests = 0
+        self.healthy = True
+        self.unhealthy_until: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class SessionPool:
+    """
+    Пул авторизованных сессий нескольких аккаунтов.
+
+    Доступ к вложениям и ограничения частоты действуют на аккаунт, поэтому
+    запросы распределяются между аккаунтами: наименее загруженному
+    (least-loaded) или по очереди (round-robin). Аккаунт исключается из
+    ротации, если его авторизация неактуальна или его блокирует Cloudflare.
+
+    Attributes:
+        accounts (List[Account]): Аккаунты пула
+        strategy (str): Стратегия выбора аккаунта
+        block_cooldown (float): Через сколько секунд аккаунт после блокировки Cloudflare
+                                возвращается в ротацию
+    """
+
+    def __init__(self, configs: List[Config], strategy: str = LEAST_LOADED,
+                 session_factory: Callable[[Config], object] = FourPDASession,
+                 block_cooldown: float = DEFAULT_BLOCK_COOLDOWN):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия выбора аккаунта: {strategy}")
+        if not configs:
+            raise NoHealthyAccounts("В пуле нет аккаунтов.")
+
+        self.strategy = strategy
+        self.block_cooldown = block_cooldown
+        self.accounts = [
+            Account(config.path.stem, config, session_factory(config))
+            for config in configs
+        ]
+
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    @classmethod
+    def from_directory(cls, path: Path = ACCOUNTS_DIR, **kwargs) -> "SessionPool":
+        """
+        Создает пул из всех авторизованных конфигов accounts/*.json.
+
+        Raises:
+            NoHealthyAccounts: Если авторизованных аккаунтов нет
+        """
+        configs = [Config(file) for file in sorted(Path(path).glob("*.json"))]
+        configs = [config for config in configs if config.is_authenticated()]
+        logging.debug("Аккаунтов в пуле: %s", len(configs))
+        return cls(configs, **kwargs)
+
+    def _available(self, now: float) -> List[Account]:
+        for account in self.accounts:
+            if not account.healthy and account.unhealthy_until is not None and now >= account.unhealthy_until:
+                logging.info("Аккаунт %s возвращен в ротацию.", account.name)
+                account.healthy = True
+                account.unhealthy_until = None
+        return [account for account in self.accounts if account.healthy]
+
+    def _select(self) -> Account:
+        available = self._available(time.monotonic())
+        if not available:
+            raise NoHealthyAccounts("Нет доступных аккаунтов: все исключены из ротации.")
+
+        # Счетчик разводит аккаунты с одинаковой нагрузкой, чтобы не выбирать всегда первый
+        offset = next(self._counter) % len(available)
+        ordered = available[offset:] + available[:offset]
+        if self.strategy == ROUND_ROBIN:
+            return ordered[0]
+        return min(ordered, key=lambda account: account.in_flight)
+
+    @contextmanager
+    def acquire(self) -> Iterator[Account]:
+        """
+        Выдает аккаунт на время операции.
+
+        Если внутри блока возникла CloudflareException или AuthenticationError,
+        аккаунт исключается из ротации, а исключение пробрасывается дальше.
+
+        Yields:
+            Account: Аккаунт с полями session и config
+
+        Raises:
+            NoHealthyAccounts: Если все аккаунты исключены из ротации
+        """
+        with self._lock:
+            account = self._select()
+            account.in_flight += 1
+            account.requests += 1
+
+        try:
+            yield account
+        except CloudflareException as e:
+            self.mark_unhealthy(account, f"Cloudflare: {e}", self.block_cooldown)
+            raise
+        except AuthenticationError as e:
+            self.mark_unhealthy(account, f"Авторизация: {e}")
+            raise
+        finally:
+            with self._lock:
+                account.in_flight -= 1
+
+    def run(self, func: Callable[[Account], object]):
+        """
+        Выполняет func(account) на аккаунте из пула. Если аккаунт заблокирован
+        или потерял авторизацию, операция повторяется на следующем аккаунте.
+
+        Raises:
+            NoHealthyAccounts: Если все аккаунты исключены из ротации
+        """
+        while True:
+            try:
+                with self.acquire() as account:
+                    return func(account)
+            except (CloudflareException, AuthenticationError):
+                continue
+
+    def mark_unhealthy(self, account: Account, reason: str, cooldown: Optional[float] = None):
+        """
+        Исключает аккаунт из ротации.
+
+        Args:
+            account (Account): Аккаунт
+            reason (str): Причина для статистики и лога
+            cooldown (Optional[float]): Через сколько секунд вернуть аккаунт, None — не возвращать
+        """
+        with self._lock:
+            account.healthy = False
+            account.last_error = reason
+            account.unhealthy_until = time.monotonic() + cooldown if cooldown is not None else None
+        logging.warning("Аккаунт %s исключен из ротации: %s", account.name, reason)
+
+    def validate(self, ttl: Optional[float] = None, probe: bool = False) -> int:
+        """
+        Проверяет авторизацию всех аккаунтов и исключает неактуальные.
+
+        Args:
+            ttl (Optional[float]): Не проверять аккаунты, авторизация которых подтверждалась за последние ttl секунд
+            probe (bool): Сначала выполнять быструю проверку
+
+        Returns:
+            int: Число аккаунтов с актуальной авторизацией
+        """
+        healthy = 0
+        for account in self.accounts:
+            logging.info("Проверяю аккаунт %s...", account.name)
+            try:
+                valid = validate_authentication(account.config, account.session, ttl, probe)
+            except CloudflareException as e:
+                self.mark_unhealthy(account, f"Cloudflare: {e}", self.block_cooldown)
+                continue
+            except AuthenticationError as e:
+                valid = False
+                logging.error(str(e))
+            if valid:
+                healthy += 1
+            else:
+                self.mark_unhealthy(account, "Авторизация не актуальна")
+        return healthy
+
+    def stats(self) -> List[dict]:
+        """
+        Возвращает состояние аккаунтов пула.
+        """
+        with self._lock:
+            return [
+                {
+                    "name": account.name,
+                    "username": account.config.username,
+                    "healthy": account.healthy,
+                    "in_flight": account.in_flight,
+                    "requests": account.requests,
+                    "error": account.last_error,
+                }
+                for account in self.accounts
+            ]
+
+    def close(self):
+        for account in self.accounts:
+            if account.session.client:
+                account.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
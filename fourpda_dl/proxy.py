@@ -0,0 +1,211 @@
+import logging
+import random
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .config import DEFAULT_CONFIG_DIR
+from .storage import atomic_write_json, load_json
+
+PROXIES_FILE = DEFAULT_CONFIG_DIR / "proxies.json"
+
+# Сглаживание оценок задержки и доли блокировок (экспоненциальное среднее)
+EWMA_ALPHA = 0.2
+# Насколько сильнее задержки штрафуются блокировки и ошибки при выборе прокси
+BLOCK_PENALTY = 10.0
+ERROR_PENALTY = 5.0
+# Прокси, получивший проверку Cloudflare, исключается на это время
+BLOCK_COOLDOWN = 5 * 60
+# После стольких ошибок подряд прокси исключается на ERROR_COOLDOWN секунд
+MAX_CONSECUTIVE_ERRORS = 3
+ERROR_COOLDOWN = 60
+
+
+class Proxy:
+    """
+    Выходной прокси со своим HTTPX клиентом, cf_clearance и оценкой качества.
+
+    Attributes:
+        url (str): Адрес прокси (http://, https:// или socks5://)
+        cf_clearance (str): cf_clearance, полученный через этот прокси
+        client: HTTPX клиент, отправляющий запросы через прокси
+        latency (Optional[float]): Сглаженная задержка ответа в секундах, None пока не было запросов
+        block_rate (float): Сглаженная доля ответов с ограничением (429/503/Cloudflare)
+        error_rate (float): Сглаженная доля сетевых ошибок
+        in_flight (int): Число выполняющихся запросов
+        unhealthy_until (float): До какого момента (time.monotonic) прокси исключен
+    """
+
+    def __init__(self, url: str, cf_clearance: str = ""):
+        self.url = url
+        self.cf_clearance = cf_clearance
+        self.client = None
+        self.latency: Optional[float] = None
+        self.block_rate = 0.0
+        self.error_rate = 0.0
+        self.requests = 0
+        self.blocks = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.in_flight = 0
+        self.unhealthy_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def score(self) -> float:
+        """
+        Оценка прокси: чем меньше, тем лучше. Прокси без замеров выбирается
+        в первую очередь, чтобы получить по нему оценку.
+        """
+        if self.latency is None:
+            return 0.0
+        penalty = 1 + BLOCK_PENALTY * self.block_rate + ERROR_PENALTY * self.error_rate
+        return self.latency * penalty * (1 + self.in_flight)
+
+
+class ProxyPool:
+    """
+    Набор выходных прокси с выбором по качеству.
+
+    Cloudflare привязывает cf_clearance к IP клиента, поэтому у каждого прокси
+    свой cf_clearance, а запрос через прокси отправляется только с ним.
+    Прокси выбирается из двух случайных здоровых по меньшей оценке (задержка
+    с учетом доли блокировок, ошибок и текущей нагрузки), поэтому нагрузка
+    распределяется между выходными IP, а медленные и блокируемые прокси
+    получают меньше запросов.
+
+    Attributes:
+        proxies (List[Proxy]): Прокси пула
+        path (Optional[Path]): Файл, в котором сохраняются cf_clearance прокси
+    """
+
+    def __init__(self, proxies: Iterable[Proxy], path: Optional[Path] = None):
+        self.proxies = list(proxies)
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if not self.proxies:
+            raise ValueError("Список прокси пуст.")
+
+    @classmethod
+    def load(cls, urls: Optional[Iterable[str]] = None, path: Path = PROXIES_FILE) -> "ProxyPool":
+        """
+        Создает пул из proxies.json и/или явно переданных адресов.
+
+        Формат файла: {"proxies": [{"url": "socks5://host:1080", "cf_clearance": "..."}]}
+
+        Args:
+            urls (Optional[Iterable[str]]): Адреса прокси. Если не указаны, берутся все прокси из файла
+            path (Path, optional): Путь к proxies.json
+        """
+        stored: Dict[str, dict] = {
+            entry["url"]: entry for entry in load_json(path, {}).get("proxies", []) if entry.get("url")
+        }
+        urls = list(urls) if urls else list(stored)
+        return cls([Proxy(url, stored.get(url, {}).get("cf_clearance", "")) for url in urls], path)
+
+    def select(self) -> Proxy:
+        """
+        Выбирает прокси для очередного запроса.
+
+        Если все прокси исключены, возвращает тот, что вернется в ротацию раньше других.
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy = [proxy for proxy in self.proxies if proxy.healthy(now)]
+            if healthy:
+                candidates = random.sample(healthy, min(2, len(healthy)))
+                proxy = min(candidates, key=Proxy.score)
+            else:
+                proxy = min(self.proxies, key=lambda p: p.unhealthy_until)
+                logging.debug("Все прокси исключены из ротации, использую %s", proxy.url)
+            proxy.in_flight += 1
+            return proxy
+
+    def has_alternative(self, proxy: Proxy) -> bool:
+        """
+        Есть ли другой здоровый прокси, на котором можно повторить запрос.
+        """
+        now = time.monotonic()
+        return any(other is not proxy and other.healthy(now) for other in self.proxies)
+
+    def record(self, proxy: Proxy, latency: Optional[float] = None, blocked: bool = False,
+               error: bool = False, cf_clearance: Optional[str] = None):
+        """
+        Учитывает результат запроса через прокси.
+
+        Args:
+            proxy (Proxy): Прокси, через который шел запрос
+            latency (Optional[float]): Время до получения заголовков ответа
+            blocked (bool): Сервер ограничил запрос (429/503/проверка Cloudflare)
+            error (bool): Сетевая ошибка
+            cf_clearance (Optional[str]): Новый cf_clearance из ответа
+        """
+        now = time.monotonic()
+        with self._lock:
+            proxy.in_flight = max(0, proxy.in_flight - 1)
+            proxy.requests += 1
+
+            if latency is not None and proxy.latency is None:
+                proxy.latency = latency
+            elif latency is not None:
+                proxy.latency += EWMA_ALPHA * (latency - proxy.latency)
+            proxy.block_rate += EWMA_ALPHA * (float(blocked) - proxy.block_rate)
+            proxy.error_rate += EWMA_ALPHA * (float(error) - proxy.error_rate)
+
+            if blocked:
+                proxy.blocks += 1
+                proxy.unhealthy_until = now + BLOCK_COOLDOWN
+            if error:
+                proxy.errors += 1
+                proxy.consecutive_errors += 1
+                if proxy.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+                    proxy.unhealthy_until = now + ERROR_COOLDOWN
+            else:
+                proxy.consecutive_errors = 0
+
+            if cf_clearance and cf_clearance != proxy.cf_clearance:
+                proxy.cf_clearance = cf_clearance
+                self._dirty = True
+
+        if blocked:
+            logging.warning("Прокси %s получил ограничение, исключен на %s с", proxy.url, BLOCK_COOLDOWN)
+        elif error and proxy.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+            logging.warning("Прокси %s не отвечает, исключен на %s с", proxy.url, ERROR_COOLDOWN)
+
+    def stats(self) -> List[dict]:
+        """
+        Возвращает оценки и счетчики всех прокси.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": proxy.url,
+                    "healthy": proxy.healthy(now),
+                    "latency_ms": round(proxy.latency * 1000, 1) if proxy.latency is not None else None,
+                    "block_rate": round(proxy.block_rate, 3),
+                    "error_rate": round(proxy.error_rate, 3),
+                    "requests": proxy.requests,
+                    "blocks": proxy.blocks,
+                    "errors": proxy.errors,
+                }
+                for proxy in self.proxies
+            ]
+
+    def save(self):
+        """
+        Сохраняет cf_clearance прокси в файл пула, если они изменились.
+        """
+        with self._lock:
+            if not self._dirty or self.path is None:
+                return
+            stored = {entry.get("url"): entry for entry in load_json(self.path, {}).get("proxies", [])}
+            for proxy in self.proxies:
+                stored.setdefault(proxy.url, {"url": proxy.url})["cf_clearance"] = proxy.cf_clearance
+            atomic_write_json(self.path, {"proxies": list(stored.values())}, indent=4)
+            self._dirty = False
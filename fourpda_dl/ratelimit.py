@@ -0,0 +1,170 @@
+import email.utils
+import logging
+import threading
+import time
+
+from typing import Dict, Optional
+
+import httpx
+
+from .defaults import DEFAULT_MAX_RATE, DEFAULT_RATE
+
+DEFAULT_MIN_RATE = 0.2
+DEFAULT_BURST = 4.0
+# AIMD: после каждого успешного ответа частота растет на INCREASE_STEP,
+# после ответа-ограничения умножается на DECREASE_FACTOR
+INCREASE_STEP = 0.05
+DECREASE_FACTOR = 0.5
+# Верхняя граница паузы по Retry-After, чтобы не зависнуть из-за странного заголовка
+MAX_RETRY_AFTER = 120.0
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def is_throttled(response: httpx.Response) -> bool:
+    """
+    Проверяет, что сервер просит снизить частоту запросов: 429, 503
+    или проверка Cloudflare (Cf-Mitigated: challenge).
+    """
+    return response.status_code in THROTTLE_STATUSES or response.headers.get("Cf-Mitigated") == "challenge"
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Возвращает паузу из заголовка Retry-After в секундах или None.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return min(max(0.0, date.timestamp() - time.time()), MAX_RETRY_AFTER)
+
+
+class TokenBucket:
+    """
+    Token bucket с адаптивной частотой (AIMD) для одного хоста.
+
+    Токены, которых не хватает, берутся в долг: каждый вызывающий получает
+    свое время ожидания, поэтому параллельные запросы выстраиваются в
+    равномерную очередь, а не просыпаются одновременно.
+
+    Attributes:
+        rate (float): Текущая частота запросов в секунду
+        min_rate (float): Нижняя граница частоты
+        max_rate (float): Верхняя граница частоты
+        burst (float): Сколько запросов можно выполнить подряд без ожидания
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: float = DEFAULT_MAX_RATE, burst: float = DEFAULT_BURST):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.burst = max(1.0, burst)
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Резервирует место для одного запроса.
+
+        Returns:
+            float: Сколько секунд нужно подождать перед запросом
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            # Сбрасываем накопленный запас, чтобы после паузы не было всплеска
+            self._tokens = min(self._tokens, 0.0)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+
+
+class RateLimiter:
+    """
+    Набор адаптивных token bucket по хостам (и выходным прокси, если они используются).
+
+    Потокобезопасен и не блокирует event loop: reserve() только вычисляет
+    паузу, а ждет вызывающая сторона (time.sleep или asyncio.sleep). Поэтому
+    один экземпляр можно разделять между потоками и асинхронными задачами,
+    в том числе между FourPDASession и AsyncFourPDASession.
+
+    Attributes:
+        rate (float): Начальная частота запросов к хосту
+        max_rate (float): Максимальная частота запросов к хосту
+        min_rate (float): Минимальная частота запросов к хосту
+        burst (float): Сколько запросов к хосту можно выполнить подряд без ожидания
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, max_rate: float = DEFAULT_MAX_RATE,
+                 min_rate: float = DEFAULT_MIN_RATE, burst: float = DEFAULT_BURST):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.min_rate, self.max_rate, self.burst)
+            return bucket
+
+    @staticmethod
+    def _key(url, via: Optional[str]) -> str:
+        host = httpx.URL(url).host
+        return host if via is None else f"{host} через {via}"
+
+    def reserve(self, url, via: Optional[str] = None) -> float:
+        """
+        Резервирует запрос к хосту из url.
+
+        Args:
+            url: Адрес запроса
+            via (Optional[str]): Прокси, через который идет запрос; у каждого прокси свой лимит
+
+        Returns:
+            float: Сколько секунд нужно подождать перед запросом
+        """
+        return self.bucket(self._key(url, via)).reserve()
+
+    def feedback(self, url, response: httpx.Response, via: Optional[str] = None):
+        """
+        Подстраивает частоту запросов к хосту по ответу сервера.
+        """
+        host = self._key(url, via)
+        bucket = self.bucket(host)
+
+        if is_throttled(response):
+            bucket.on_throttle(retry_after(response))
+            logging.warning("%s ограничивает запросы (%s), снижаю частоту до %.2f запр/с",
+                            host, response.status_code, bucket.rate)
+        elif response.status_code < 500:
+            bucket.on_success()
@@ -0,0 +1,119 @@
+import random
+import time
+
+from typing import Optional, Tuple, Type
+
+import httpx
+
+from .defaults import DEFAULT_RETRIES as DEFAULT_MAX_ATTEMPTS
+from .exceptions import DeadlineExceeded
+
+# Раздельные таймауты: долго ждать установления соединения или свободного
+# соединения из пула бессмысленно, а чтение ответа может быть медленным
+DEFAULT_TIMEOUT = httpx.Timeout(connect=10.0, read=20.0, write=20.0, pool=5.0)
+
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 10.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Методы, которые можно безопасно повторить после того, как запрос ушел на сервер
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RetryPolicy:
+    """
+    Политика повторов HTTP-запросов с экспоненциальной задержкой и jitter.
+
+    Задержка перед попыткой n выбирается случайно из [0, min(max_backoff,
+    backoff * 2^(n-1))] (full jitter), чтобы параллельные потоки не повторяли
+    запросы одновременно. Если сервер прислал Retry-After, ждем не меньше него.
+
+    Неидемпотентные запросы (POST) повторяются только при ошибке соединения,
+    когда запрос гарантированно не дошел до сервера.
+
+    Attributes:
+        max_attempts (int): Максимальное число попыток, включая первую
+        backoff (float): Базовая задержка в секундах
+        max_backoff (float): Максимальная задержка в секундах
+        statuses (Tuple[int, ...]): Коды ответа, после которых запрос повторяется
+        exceptions (Tuple[Type[Exception], ...]): Ошибки, после которых запрос повторяется
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF, statuses: Tuple[int, ...] = RETRY_STATUSES,
+                 exceptions: Tuple[Type[Exception], ...] = (httpx.TransportError,)):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.exceptions = exceptions
+
+    def retryable_error(self, method: str, error: Exception) -> bool:
+        if not isinstance(error, self.exceptions):
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+    def retryable_status(self, method: str, status_code: int) -> bool:
+        return method.upper() in IDEMPOTENT_METHODS and status_code in self.statuses
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Возвращает задержку перед следующей попыткой.
+
+        Args:
+            attempt (int): Номер неудавшейся попытки, начиная с 1
+            retry_after (Optional[float]): Пауза, которую попросил сервер
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class Deadline:
+    """
+    Общий бюджет времени на несколько запросов.
+
+    Передается в запросы сессии через параметр deadline: таймауты каждого
+    запроса ограничиваются оставшимся временем, а повторы не начинаются,
+    если бюджет исчерпан.
+
+    Attributes:
+        seconds (float): Исходный бюджет в секундах
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        """
+        Raises:
+            DeadlineExceeded: Если бюджет времени исчерпан
+        """
+        if self.expired:
+            raise DeadlineExceeded(f"Превышено время ожидания ({self.seconds:g} с).")
+
+    def timeout(self, base: httpx.Timeout) -> httpx.Timeout:
+        """
+        Ограничивает таймауты запроса оставшимся временем.
+
+        Raises:
+            DeadlineExceeded: Если бюджет времени исчерпан
+        """
+        self.check()
+        remaining = self.remaining()
+
+        def clamp(value):
+            return remaining if value is None else min(value, remaining)
+
+        return httpx.Timeout(connect=clamp(base.connect), read=clamp(base.read),
+                             write=clamp(base.write), pool=clamp(base.pool))
@@ -0,0 +1,98 @@
+import re
+
+from typing import AsyncIterable, Dict, Iterable, Optional, Pattern, Union
+
+# Сколько символов с конца просмотренного текста сохранять между блоками.
+# Должно быть больше самого длинного совпадения, иначе оно может быть разрезано.
+DEFAULT_OVERLAP = 4096
+
+
+class StreamScanner:
+    """
+    Поиск регулярных выражений в тексте, который поступает блоками.
+
+    Хранит только хвост уже просмотренного текста, поэтому совпадения,
+    попавшие на границу блоков, находятся без накопления всей страницы
+    в памяти. Каждый шаблон ищется до первого совпадения.
+
+    Шаблоны должны заканчиваться явным ограничителем (кавычкой, тегом),
+    чтобы совпадение не оборвалось на конце текущего блока.
+
+    Attributes:
+        patterns (Dict[str, Pattern]): Именованные шаблоны для поиска
+        results (Dict[str, Optional[str]]): Найденные значения (первая группа или все совпадение)
+    """
+
+    def __init__(self, patterns: Dict[str, Union[str, Pattern]], overlap: int = DEFAULT_OVERLAP):
+        self.patterns = {name: re.compile(p) if isinstance(p, str) else p for name, p in patterns.items()}
+        self.results: Dict[str, Optional[str]] = {name: None for name in self.patterns}
+        self.overlap = overlap
+        self._pending = dict(self.patterns)
+        self._buffer = ""
+
+    @property
+    def done(self) -> bool:
+        """
+        True, если все шаблоны уже найдены.
+        """
+        return not self._pending
+
+    def feed(self, text: str) -> bool:
+        """
+        Добавляет очередной блок текста и ищет в нем оставшиеся шаблоны.
+
+        Args:
+            text (str): Очередной блок декодированного текста
+
+        Returns:
+            bool: True, если все шаблоны найдены и чтение можно прекратить
+        """
+        self._buffer += text
+
+        for name, pattern in list(self._pending.items()):
+            match = pattern.search(self._buffer)
+            if match:
+                self.results[name] = match.group(1) if pattern.groups else match.group(0)
+                del self._pending[name]
+
+        if len(self._buffer) > self.overlap:
+            self._buffer = self._buffer[-self.overlap:]
+
+        return self.done
+
+
+def scan_stream(chunks: Iterable[str], patterns: Dict[str, Union[str, Pattern]],
+                overlap: int = DEFAULT_OVERLAP, limit: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Ищет шаблоны в потоке текста и прекращает чтение, как только все найдены.
+
+    Args:
+        chunks (Iterable[str]): Блоки текста, например response.iter_text()
+        patterns (Dict): Именованные шаблоны для поиска
+        overlap (int, optional): Размер хвоста, сохраняемого между блоками
+        limit (Optional[int]): Прекратить чтение после стольких символов, даже если не все найдено
+
+    Returns:
+        Dict[str, Optional[str]]: Найденные значения, None для ненайденных шаблонов
+    """
+    scanner = StreamScanner(patterns, overlap)
+    read = 0
+    for chunk in chunks:
+        read += len(chunk)
+        if scanner.feed(chunk) or (limit is not None and read >= limit):
+            break
+    return scanner.results
+
+
+async def async_scan_stream(chunks: AsyncIterable[str], patterns: Dict[str, Union[str, Pattern]],
+                            overlap: int = DEFAULT_OVERLAP, limit: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Асинхронная версия scan_stream, например для response.aiter_text().
+    """
+    scanner = StreamScanner(patterns, overlap)
+    read = 0
+    async for chunk in chunks:
+        read += len(chunk)
+        if scanner.feed(chunk) or (limit is not None and read >= limit):
+            break
+    return scanner.results
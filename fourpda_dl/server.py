@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import secrets
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from .daemon_client import DAEMON_FILE, TOKEN_HEADER
+from .defaults import DEFAULT_HOST, DEFAULT_PORT
+from .download import download_file
+from .downloader import get_direct_link
+from .storage import atomic_write_json, load_json
+
+
+class _ResolverHandler(BaseHTTPRequestHandler):
+    server: "ResolverServer"
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if secrets.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.server.token):
+            return True
+        self._reply(403, {"error": "Forbidden"})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+
+        parsed = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(parsed.query)
+
+        if parsed.path == "/health":
+            return self._reply(200, {"status": "ok", "pid": os.getpid()})
+
+        if parsed.path == "/resolve" and params.get("url"):
+            return self._reply(200, self.server.resolve(params["url"][0]))
+
+        self._reply(404, {"error": "NotFound"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+
+        if self.path != "/download":
+            return self._reply(404, {"error": "NotFound"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            url = request["url"]
+        except (ValueError, KeyError):
+            return self._reply(400, {"error": "BadRequest"})
+
+        self._reply(200, self.server.download(url, request.get("output"), request.get("segments", 1)))
+
+
+class ResolverServer(ThreadingHTTPServer):
+    """
+    Локальный HTTP-сервер, который держит одну авторизованную сессию
+    и ее пул HTTP/2 соединений прогретыми между запросами.
+
+    Слушает только localhost и принимает запросы с токеном из daemon.json,
+    доступного лишь владельцу.
+
+    Endpoints:
+        GET /health: Проверка, что демон жив
+        GET /resolve?url=<DL-ссылка>: Получение прямой ссылки
+        POST /download {"url", "output", "segments"}: Скачивание файла
+    """
+
+    daemon_threads = True
+
+    def __init__(self, session, config, cache=None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        super().__init__((host, port), _ResolverHandler)
+        self.session = session
+        self.config = config
+        self.cache = cache
+        self.token = secrets.token_urlsafe(32)
+
+    def resolve(self, url: str) -> dict:
+        try:
+            link = get_direct_link(self.session, self.config, url, self.cache)
+        except Exception as e:
+            logging.debug("Ошибка при получении ссылки %s: %r", url, e)
+            return {"url": url, "error": type(e).__name__, "message": str(e)}
+
+        if not link:
+            return {"url": url, "error": "FileNotFound"}
+        return {"url": url, "link": link}
+
+    def download(self, url: str, output: Optional[str], segments: int) -> dict:
+        try:
+            path = download_file(self.session, self.config, url, output, cache=self.cache,
+                                 progress=False, segments=segments)
+        except Exception as e:
+            logging.debug("Ошибка при скачивании %s: %r", url, e)
+            return {"url": url, "error": type(e).__name__, "message": str(e)}
+
+        return {"url": url, "path": str(path.resolve())}
+
+
+def serve(session, config, cache=None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """
+    Запускает демон и блокирует поток до остановки (Ctrl+C).
+
+    Адрес, PID, токен доступа и путь к конфигу записываются в daemon.json,
+    по которому клиенты находят запущенный демон.
+
+    Args:
+        session: Сессия FourPDASession, общая для всех запросов
+        config: Объект конфигурации с авторизационными данными
+        cache (LinkCache, optional): Кэш прямых ссылок
+        host (str, optional): Адрес для прослушивания
+        port (int, optional): Порт для прослушивания
+    """
+    server = ResolverServer(session, config, cache, host, port)
+    host, port = server.server_address[:2]
+
+    atomic_write_json(DAEMON_FILE, {"host": host, "port": port, "pid": os.getpid(), "token": server.token,
+                                    "config": str(config.path)})
+    os.chmod(DAEMON_FILE, 0o600)
+
+    logging.info("Демон запущен на http://%s:%s", host, port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Останавливаю демон...")
+    finally:
+        server.server_close()
+        if load_json(DAEMON_FILE, {}).get("pid") == os.getpid():
+            DAEMON_FILE.unlink()
+        if cache is not None:
+            cache.save()
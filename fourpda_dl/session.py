@@ -1,17 +1,37 @@
+import asyncio
 import logging
 import random
 import re
 import ssl
 import sys
-from typing import Optional
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import AsyncIterator, Iterator, Optional, Tuple
 
 import httpx
-from httpx import Timeout
 
+from .defaults import BASE_URL
 from .exceptions import FourPDASessionException, CloudflareException, AuthenticationError
+from .metrics import DEFAULT_PHASE, Metrics, RequestTracer
+from .proxy import Proxy, ProxyPool
+from .ratelimit import RateLimiter, is_throttled, retry_after
+from .retry import DEFAULT_TIMEOUT, Deadline, RetryPolicy
+from .scanner import async_scan_stream, scan_stream
+from .tracing import instant, span
 
+# Домен форума: cookies из конфига подставляются в запросы к нему и его поддоменам
+COOKIE_DOMAIN = "4pda.to"
+# Cookies, которые форум ожидает в запросах к страницам загрузки
+FORUM_DEFAULT_COOKIES = {"modtids": "", "modpids": ""}
+# Изменившиеся cookies записываются в конфиг не чаще, чем раз в столько секунд
+COOKIE_FLUSH_INTERVAL = 30.0
+# Быстрая проверка читает не больше стольких символов страницы профиля
+PROBE_LIMIT = 64 * 1024
 
-def validate_authentication(config, session):
+
+def validate_authentication(config, session, ttl: Optional[float] = None, probe: bool = False):
     """
     Проверяет актуальность авторизации пользователя на форуме.
     
@@ -21,75 +41,190 @@ def validate_authentication(config, session):
     Args:
         config: Объект конфигурации с данными авторизации
         session: Сессия для выполнения HTTP-запросов
+        ttl (Optional[float]): Не обращаться к форуму, если авторизация подтверждалась за последние ttl секунд
+        probe (bool): Сначала выполнить быструю проверку (до первого маркера, не больше PROBE_LIMIT символов)
     
     Returns:
         bool: True если авторизация актуальна, False в противном случае
     
     Notes:
         - При актуальной авторизации проверяет имя пользователя из конфига и на форуме, если они разные - синхронизуем
+        - Время успешной проверки сохраняется в конфиг (auth_validated_at)
+        - Если быстрая проверка не подтвердила авторизацию, выполняется полная
         - При неактуальной авторизации полностью очищает конфигурацию
     """
+    if _validated_recently(config, ttl):
+        return True
+
+    url, patterns = _prepare_validation(config, session)
+
+    if probe:
+        with session.stream("GET", url, phase="profile-check") as request:
+            found = scan_stream(request.iter_text(), _probe_patterns(patterns), limit=PROBE_LIMIT)\
+                if request.status_code == 200 else {}
+        if found.get("edit_profile"):
+            return _accept_validation(config)
+        logging.debug("Быстрая проверка не подтвердила авторизацию, проверяю страницу профиля целиком...")
+
+    # Страница профиля читается только до тех пор, пока не найдены все маркеры
+    with session.stream("GET", url, follow_redirects=True, phase="profile-check") as request:
+        found = scan_stream(request.iter_text(), patterns) if request.status_code == 200 else {}
+
+    return _check_profile_page(config, request.status_code, found)
+
+
+async def async_validate_authentication(config, session, ttl: Optional[float] = None, probe: bool = False):
+    """
+    Асинхронная версия validate_authentication для AsyncFourPDASession.
+
+    Args:
+        config: Объект конфигурации с данными авторизации
+        session: Асинхронная сессия для выполнения HTTP-запросов
+        ttl (Optional[float]): Не обращаться к форуму, если авторизация подтверждалась за последние ttl секунд
+        probe (bool): Сначала выполнить быструю проверку
+
+    Returns:
+        bool: True если авторизация актуальна, False в противном случае
+    """
+    if _validated_recently(config, ttl):
+        return True
+
+    url, patterns = _prepare_validation(config, session)
+
+    if probe:
+        async with session.stream("GET", url, phase="profile-check") as request:
+            found = await async_scan_stream(request.aiter_text(), _probe_patterns(patterns), limit=PROBE_LIMIT)\
+                if request.status_code == 200 else {}
+        if found.get("edit_profile"):
+            return _accept_validation(config)
+        logging.debug("Быстрая проверка не подтвердила авторизацию, проверяю страницу профиля целиком...")
+
+    async with session.stream("GET", url, follow_redirects=True, phase="profile-check") as request:
+        found = await async_scan_stream(request.aiter_text(), patterns) if request.status_code == 200 else {}
+
+    return _check_profile_page(config, request.status_code, found)
+
+
+def _validated_recently(config, ttl: Optional[float]) -> bool:
+    """
+    Проверяет, можно ли не обращаться к форуму: авторизация есть в конфиге
+    и подтверждалась за последние ttl секунд.
+    """
+    if not ttl or not config.is_authenticated() or not config.auth_validated_within(ttl):
+        return False
+    logging.info("Авторизация актуальна (проверена недавно).")
+    return True
+
+
+def _probe_patterns(patterns: dict) -> dict:
+    """
+    Шаблоны быстрой проверки: ссылка на редактирование своего профиля
+    видна только авторизованному владельцу.
+    """
+    return {"edit_profile": patterns["edit_profile"]}
+
+
+def _accept_validation(config, forum_username: Optional[str] = None) -> bool:
+    """
+    Сохраняет в конфиг время успешной проверки и имя пользователя с форума.
+    """
+    logging.info("Авторизация актуальна.")
+
+    if forum_username and config.username != forum_username:
+        logging.debug("Имя пользователя в конфиге и на форуме отличается, синхронизируем имя пользователя с форума...")
+        config.username = forum_username
+
+    config.mark_auth_validated()
+    config.save()
+    return True
+
+
+def _prepare_validation(config, session):
+    """
+    Проверяет наличие авторизации в конфиге и готовит параметры запроса профиля.
+
+    Returns:
+        tuple: (URL страницы профиля, шаблоны для поиска на странице)
+
+    Raises:
+        AuthenticationError: Если в конфиге нет авторизационных данных
+    """
     if not config.is_authenticated():
         raise AuthenticationError("Требуется авторизация.")
 
     logging.info("Проверяю актуальность авторизации...")
 
-    username = config.username
     member_id = config.get_cookie("member_id")
 
-    cookies = {k: v for k, v in config.cookies.items() if not k.startswith("__")}
-
-    request = session.get(
-        f"{session.base_url}/forum/index.php?showuser={member_id}",
-        cookies=cookies,
-        follow_redirects=True
-    )
+    patterns = {
+        "edit_profile": re.escape(f"showuser={member_id}&action=edit"),
+        "chpass": re.escape("act=auth&action=chpass"),
+        "title": re.compile(r"<title>(.*) - 4PDA</title>", re.DOTALL),
+    }
 
-    html = request.text
+    return f"{session.base_url}/forum/index.php?showuser={member_id}", patterns
 
-    edit_profile = "showuser=8576755&action=edit"
-    chpass = "act=auth&action=chpass"
 
-    if request.status_code == 200\
-            and edit_profile in html\
-            and chpass in html:
-        logging.info("Авторизация актуальна.")
-
-        forum_username = re.search(r"<title>(.*) - 4PDA</title>", html, re.DOTALL)
+def _check_profile_page(config, status_code: int, found: dict) -> bool:
+    """
+    Разбирает результат поиска по странице профиля и обновляет конфиг по результату проверки.
 
-        if forum_username and username != forum_username:
-            forum_username = forum_username.group(1)
-            logging.debug("Имя пользователя в конфиге и на форуме отличается, синхронизируем имя пользователя с форума...")
-            config.username = forum_username
-            config.save()
+    Args:
+        config: Объект конфигурации с данными авторизации
+        status_code (int): Код ответа сервера
+        found (dict): Результат scan_stream с шаблонами из _prepare_validation
 
-        return True
+    Returns:
+        bool: True если авторизация актуальна, False в противном случае
+    """
+    if status_code == 200\
+            and found.get("edit_profile")\
+            and found.get("chpass"):
+        return _accept_validation(config, found.get("title"))
 
     logging.error("Авторизация не актуальна.")
     config.clear()
     logging.info("Конфиг очищен.")
 
-    logging.info(f"Используйте: python {sys.argv[0]} login username password")
+    logging.info("Используйте: python %s login username password", sys.argv[0])
     return False
 
 
-class FourPDASession:
+class _BaseFourPDASession(ABC):
     """
-    Кастомная сессия HTTP-запросов с эмуляцией мобильного браузера Chrome на Android.
+    Общая часть синхронной и асинхронной сессий: TLS-контекст, заголовки
+    эмуляции мобильного Chrome, ограничение частоты запросов, политика повторов
+    и обработка блокировок Cloudflare.
     
-    Обеспечивает обход защиты Cloudflare за счет эмуляции реального мобильного устройства,
-    включая TLS-настройки, заголовки и параметры соединения.
+    Cookies из конфига загружаются в хранилище клиента один раз при создании
+    сессии, дальше клиент сам отправляет их и обновляет по Set-Cookie. Новые
+    значения (например обновленный cf_clearance) переносятся в конфиг и
+    сохраняются пачкой не чаще раза в COOKIE_FLUSH_INTERVAL секунд и при закрытии.
     
     Attributes:
         config: Объект конфигурации для получения cookies авторизации
         client: HTTPX клиент для выполнения запросов
+        rate_limiter (RateLimiter): Адаптивный ограничитель частоты запросов по хостам
+        retry_policy (RetryPolicy): Политика повторов неудачных запросов
+        timeout (httpx.Timeout): Таймауты соединения, чтения, записи и ожидания пула
+        proxies (Optional[ProxyPool]): Выходные прокси; если заданы, запросы идут через них
+        metrics (Metrics): Счетчики и гистограммы запросов по логическим фазам
     """
 
-    def __init__(self, config):
+    def __init__(self, config, rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None, timeout: Optional[httpx.Timeout] = None,
+                 proxies: Optional[ProxyPool] = None, metrics: Optional[Metrics] = None):
         self.config = config
-        self.client: Optional[httpx.Client] = None
+        self.client = None
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.proxies = proxies
+        self.metrics = metrics or Metrics()
+        self._cookies_dirty = False
+        self._cookies_flushed: Optional[float] = None
         self._create_client()
-        self.base_url = "https://4pda.to"
+        self.base_url = BASE_URL
 
     def _chrome_android_tls_context(self):
         """
@@ -198,29 +333,151 @@ class FourPDASession:
             "Sec-CH-UA-Arch": ""
         }
 
+    @abstractmethod
+    def _build_client(self, proxy: Optional[str] = None, cookies: Optional[httpx.Cookies] = None):
+        """
+        Создает HTTPX клиент: httpx.Client или httpx.AsyncClient в наследниках.
+        """
+
+    def _load_cookies(self, cf_clearance: Optional[str] = None) -> httpx.Cookies:
+        """
+        Собирает хранилище cookies клиента из конфига.
+        
+        Args:
+            cf_clearance (Optional[str]): cf_clearance, заменяющий значение из конфига
+                (у клиента прокси свой cf_clearance, пустая строка — без него)
+        
+        Returns:
+            httpx.Cookies: Cookies для домена форума
+        
+        Notes:
+            - Служебные cookies (начинающиеся с __) не загружаются
+            - Добавляет cookies modtids и modpids
+        """
+        cookies = {k: v for k, v in self.config.cookies.items() if not k.startswith("__")}
+        cookies.update(FORUM_DEFAULT_COOKIES)
+        if cf_clearance is not None:
+            cookies.pop("cf_clearance", None)
+            if cf_clearance:
+                cookies["cf_clearance"] = cf_clearance
+
+        jar = httpx.Cookies()
+        for name, value in cookies.items():
+            jar.set(name, value, domain=f".{COOKIE_DOMAIN}")
+        return jar
+
     def _create_client(self):
         """
-        Создает и настраивает HTTPX клиент с мобильной эмуляцией.
+        Создает основной клиент и по клиенту на каждый прокси с той же TLS-эмуляцией.
+        """
+        self.client = self._build_client(cookies=self._load_cookies())
+        if self.proxies:
+            for proxy in self.proxies.proxies:
+                proxy.client = self._build_client(proxy.url, self._load_cookies(proxy.cf_clearance))
+
+    def _clients(self) -> list:
+        clients = [self.client]
+        if self.proxies:
+            clients += [proxy.client for proxy in self.proxies.proxies]
+        return [client for client in clients if client is not None]
+
+    def reset_cookies(self):
+        """
+        Удаляет из клиентов сессии все cookies, кроме cf_clearance.
+        
+        Вызывается перед авторизацией, чтобы форум не получил cookies прежнего аккаунта.
+        """
+        for client in self._clients():
+            for cookie in list(client.cookies.jar):
+                if cookie.name != "cf_clearance":
+                    client.cookies.jar.clear(cookie.domain, cookie.path, cookie.name)
+
+    def _capture_cookies(self, response: httpx.Response, proxy: Optional[Proxy] = None):
+        """
+        Переносит в конфиг cookies форума, выставленные в ответе (и в редиректах до него).
         
         Notes:
-            - Использует кастомный TLS-контекст Chrome Android
-            - Настраивает таймауты и транспорт
-            - Поддерживает HTTP/1.1 и HTTP/2
+            - Сравниваются только cookies из Set-Cookie, а не все хранилище клиента
+            - cf_clearance, полученный через прокси, хранится в proxies.json, а не в конфиге
         """
-        logging.debug("Создаем базовую сессию для запросов...")
+        changed = []
+        for item in (*response.history, response):
+            if "set-cookie" not in item.headers:
+                continue
+            for cookie in item.cookies.jar:
+                domain = cookie.domain.lstrip(".")
+                if domain != COOKIE_DOMAIN and not domain.endswith(f".{COOKIE_DOMAIN}"):
+                    continue
+                if cookie.name.startswith("__") or cookie.name in FORUM_DEFAULT_COOKIES:
+                    continue
+                if proxy is not None and cookie.name == "cf_clearance":
+                    continue
+                if self._store_cookie(cookie.name, cookie.value):
+                    changed.append(cookie.name)
 
-        ctx = self._chrome_android_tls_context()
-        transport = httpx.HTTPTransport(verify=ctx, retries=0)
+        if changed:
+            logging.debug("Сервер обновил cookies: %s", ", ".join(changed))
 
-        self.client = httpx.Client(
-            http1=True,
-            http2=True,
-            timeout=Timeout(20.0),
-            transport=transport,
-            verify=True
-        )
+    def _store_cookie(self, name: str, value: str) -> bool:
+        """
+        Записывает cookie в конфиг и помечает конфиг несохраненным.
+        
+        Returns:
+            bool: True если значение изменилось
+        """
+        if self.config.get_cookie(name, None) == value:
+            return False
+        self.config.set_cookie(name, value)
+        self._cookies_dirty = True
+        return True
 
-    def _handle_cloudflare_block(self, response: httpx.Response):
+    def _flush_due(self, force: bool) -> bool:
+        """
+        Проверяет, нужно ли сохранить конфиг: cookies изменились и с прошлого
+        сохранения прошло COOKIE_FLUSH_INTERVAL секунд (или force).
+        """
+        if not self._cookies_dirty:
+            return False
+        return force or self._cookies_flushed is None or \
+            time.monotonic() - self._cookies_flushed >= COOKIE_FLUSH_INTERVAL
+
+    def _select_client(self) -> Tuple[object, Optional[Proxy]]:
+        """
+        Выбирает клиент для очередной попытки: через прокси из пула или напрямую.
+        
+        Cloudflare привязывает cf_clearance к IP, поэтому у клиента каждого
+        прокси свое хранилище cookies с cf_clearance этого прокси.
+        
+        Returns:
+            Tuple: (клиент, прокси или None)
+        """
+        if not self.proxies:
+            return self.client, None
+
+        proxy = self.proxies.select()
+        return proxy.client, proxy
+
+    def _record_proxy(self, proxy: Optional[Proxy], started: float,
+                      response: Optional[httpx.Response] = None) -> bool:
+        """
+        Учитывает результат попытки в оценке прокси.
+        
+        Returns:
+            bool: True, если прокси получил ограничение и запрос стоит повторить через другой прокси
+        """
+        if proxy is None:
+            return False
+
+        if response is None:
+            self.proxies.record(proxy, error=True)
+            return False
+
+        blocked = is_throttled(response)
+        self.proxies.record(proxy, time.monotonic() - started, blocked,
+                            cf_clearance=response.cookies.get("cf_clearance"))
+        return blocked and self.proxies.has_alternative(proxy)
+
+    def _handle_cloudflare_block(self, response: httpx.Response, proxy: Optional[Proxy] = None):
         """
         Обрабатывает блокировку запросов со стороны Cloudflare.
         
@@ -235,6 +492,12 @@ class FourPDASession:
             - Предлагает различные решения в зависимости от наличия cf_clearance
         """
         if response.status_code == 403 and response.headers.get("Cf-Mitigated") == "challenge":
+            if proxy is not None:
+                raise CloudflareException(
+                    f"Cloudflare блокирует запросы через прокси {proxy.url}, "
+                    "надо получить cf_clearance для него и указать его в proxies.json."
+                )
+
             cf_clearance = self.config.get_cookie("cf_clearance")
             if cf_clearance and cf_clearance.strip():
                 info = "Cloudflare блокирует вход, надо получить новый cf_clearance или вы можете попробовать убрать его из конфига совсем."
@@ -243,27 +506,118 @@ class FourPDASession:
 
             raise CloudflareException(info)
 
-    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+    def _reserve_slot(self, url, proxy: Optional[Proxy] = None) -> float:
         """
-        Выполняет HTTP-запрос.
+        Резервирует запрос у ограничителя частоты.
+        
+        Returns:
+            float: Сколько секунд нужно подождать перед запросом
+        """
+        delay = self.rate_limiter.reserve(url, proxy.url if proxy else None)
+        if delay > 0:
+            logging.debug("Ограничение частоты: жду %.2f с перед запросом к %s", delay, httpx.URL(url).host)
+        return delay
+
+    def _handle_response(self, url, response: httpx.Response, proxy: Optional[Proxy] = None):
+        """
+        Сохраняет обновленные cookies, передает ответ ограничителю частоты
+        и проверяет блокировку Cloudflare.
+        """
+        self._capture_cookies(response, proxy)
+        self.rate_limiter.feedback(url, response, proxy.url if proxy else None)
+        self._handle_cloudflare_block(response, proxy)
+
+    def _observe_response(self, phase: str, method: str, started: float, response: httpx.Response):
+        """
+        Учитывает ответ в метриках и логе: код, время попытки и проверки Cloudflare.
+        """
+        elapsed = time.monotonic() - started
+        # Поля для JSON-лога собираются только при включенном DEBUG
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("%s %s: %d за %.0f мс", method, phase, response.status_code, elapsed * 1000,
+                          extra={"phase": phase, "method": method, "status": response.status_code,
+                                 "elapsed": round(elapsed * 1000, 1), "url": str(response.request.url)})
+        self.metrics.inc("requests_total", phase=phase, method=method, status=response.status_code)
+        self.metrics.observe("request_seconds", elapsed, phase=phase)
+        if response.headers.get("Cf-Mitigated") == "challenge":
+            self.metrics.inc("cloudflare_blocks_total", phase=phase)
+
+    def _observe_error(self, phase: str, method: str, error: Exception):
+        self.metrics.inc("errors_total", phase=phase, method=method, error=type(error).__name__)
+
+    def _observe_retry(self, phase: str, reason):
+        self.metrics.inc("retries_total", phase=phase, reason=reason)
+        instant("retry", "http", phase=phase, reason=reason)
+
+    def _observe_bytes(self, phase: str, response: httpx.Response):
+        self.metrics.inc("response_bytes_total", response.num_bytes_downloaded, phase=phase)
+
+    def _apply_deadline(self, kwargs: dict, deadline: Optional[Deadline]):
+        """
+        Ограничивает таймауты очередной попытки оставшимся бюджетом времени.
+        
+        Raises:
+            DeadlineExceeded: Если бюджет времени исчерпан
+        """
+        if deadline is not None:
+            kwargs["timeout"] = deadline.timeout(self.timeout)
+
+    def _retry_delay(self, method: str, attempt: int, deadline: Optional[Deadline],
+                     response: Optional[httpx.Response] = None, error: Optional[Exception] = None) -> Optional[float]:
+        """
+        Решает, нужно ли повторить запрос после неудачной попытки.
         
         Args:
-            method (str): HTTP-метод (GET, POST, etc.)
-            url (str): URL для запроса
-            **kwargs: Дополнительные параметры для httpx.Client.request()
+            method (str): HTTP-метод
+            attempt (int): Номер неудавшейся попытки, начиная с 1
+            deadline (Optional[Deadline]): Общий бюджет времени
+            response (Optional[httpx.Response]): Ответ сервера, если он был получен
+            error (Optional[Exception]): Ошибка запроса, если ответа нет
         
         Returns:
-            httpx.Response: Ответ сервера
+            Optional[float]: Задержка перед повтором или None, если повторять не нужно
+        """
+        policy = self.retry_policy
+        if attempt >= policy.max_attempts:
+            return None
+
+        if error is not None:
+            if not policy.retryable_error(method, error):
+                return None
+            delay = policy.delay(attempt)
+            reason = type(error).__name__
+        else:
+            if not policy.retryable_status(method, response.status_code):
+                return None
+            delay = policy.delay(attempt, retry_after(response))
+            reason = response.status_code
+
+        # Нет смысла ждать повтора, который все равно не уложится в бюджет
+        if deadline is not None and deadline.remaining() <= delay:
+            return None
+
+        logging.debug("Попытка %s/%s не удалась (%s), повтор через %.2f с", attempt, policy.max_attempts, reason, delay)
+        return delay
+
+    def _prepare_request(self, kwargs: dict, trace=None) -> dict:
+        """
+        Подготавливает параметры запроса: заголовки эмуляции и трассировку этапов.
+        
+        Args:
+            kwargs (dict): Параметры для httpx.Client.request()
+            trace: Обработчик событий httpcore для расширения trace
+        
+        Returns:
+            dict: Параметры запроса с добавленными заголовками
         
         Raises:
-            HttpxSessionException: Если сессия не создана
-            CloudflareException: При блокировке Cloudflare
+            FourPDASessionException: Если сессия не создана
         
         Notes:
             - Добавляет заголовки эмуляции мобильного устройства
             - Включает низкоэнтропийные Client Hints с вероятностью
-            - Обрабатывает cf_clearance из конфигурации
-            - Проверяет ответ на блокировку Cloudflare
+            - Явно переданные заголовки перекрывают заголовки эмуляции
+            - Cookies (в том числе cf_clearance) берутся из хранилища клиента
         """
         if not self.client:
             raise FourPDASessionException("Сессия не создана")
@@ -291,19 +645,174 @@ class FourPDASession:
                 keys[i + 1] in ["Sec-CH-UA-WoW64", "Sec-CH-UA-Full-Version-List"]):
                 headers["Sec-CH-UA-Bitness"] = low_entropy_hints["Sec-CH-UA-Bitness"]
 
+        # Заголовки, переданные явно (например Range), дополняют эмуляцию
+        headers.update(kwargs.get("headers") or {})
         kwargs["headers"] = headers
 
-        cf_clearance = self.config.get_cookie("cf_clearance")
-        if cf_clearance:
-            logging.debug("Используем cf_clearance, указанный в конфиге!")
-            cookies = kwargs.get("cookies")
-            if cookies:
-                cookies["cf_clearance"] = cf_clearance
+        if trace is not None:
+            kwargs["extensions"] = {**(kwargs.get("extensions") or {}), "trace": trace}
+
+        return kwargs
+
 
-        response = self.client.request(method, url, **kwargs)
-        self._handle_cloudflare_block(response)
+class FourPDASession(_BaseFourPDASession):
+    """
+    Кастомная сессия HTTP-запросов с эмуляцией мобильного браузера Chrome на Android.
+    
+    Обеспечивает обход защиты Cloudflare за счет эмуляции реального мобильного устройства,
+    включая TLS-настройки, заголовки и параметры соединения.
+    
+    Attributes:
+        config: Объект конфигурации для получения cookies авторизации
+        client: HTTPX клиент для выполнения запросов
+    """
+
+    client: Optional[httpx.Client]
+
+    def __init__(self, *args, **kwargs):
+        self._cookie_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _capture_cookies(self, response: httpx.Response, proxy: Optional[Proxy] = None):
+        super()._capture_cookies(response, proxy)
+        self.flush_cookies(force=False)
+
+    def _store_cookie(self, name: str, value: str) -> bool:
+        with self._cookie_lock:
+            return super()._store_cookie(name, value)
+
+    def flush_cookies(self, force: bool = True):
+        """
+        Сохраняет конфиг, если с прошлого сохранения сервер обновил cookies.
+        
+        Args:
+            force (bool): Сохранить сразу, не дожидаясь COOKIE_FLUSH_INTERVAL
+        """
+        with self._cookie_lock:
+            if not self._flush_due(force):
+                return
+            self.config.save()
+            self._cookies_dirty = False
+            self._cookies_flushed = time.monotonic()
+
+    def _build_client(self, proxy: Optional[str] = None, cookies: Optional[httpx.Cookies] = None) -> httpx.Client:
+        """
+        Создает и настраивает HTTPX клиент с мобильной эмуляцией.
+        
+        Args:
+            proxy (Optional[str]): Адрес прокси (http://, https://, socks5://)
+            cookies (Optional[httpx.Cookies]): Начальное хранилище cookies клиента
+        
+        Notes:
+            - Использует кастомный TLS-контекст Chrome Android
+            - Настраивает таймауты и транспорт
+            - Поддерживает HTTP/1.1 и HTTP/2
+            - Для socks5:// нужен пакет socksio (extra socks)
+        """
+        logging.debug("Создаем сессию для запросов%s...", " через " + proxy if proxy else "")
+
+        ctx = self._chrome_android_tls_context()
+        transport = httpx.HTTPTransport(verify=ctx, retries=0, proxy=proxy)
+
+        return httpx.Client(
+            http1=True,
+            http2=True,
+            timeout=self.timeout,
+            transport=transport,
+            cookies=cookies,
+            verify=True
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Выполняет HTTP-запрос.
+        
+        Args:
+            method (str): HTTP-метод (GET, POST, etc.)
+            url (str): URL для запроса
+            **kwargs: Дополнительные параметры для httpx.Client.request(),
+                а также deadline (Deadline) — общий бюджет времени на запрос и его повторы
+                и phase (str) — логическая фаза запроса для метрик (attach, login-post, ...)
+        
+        Returns:
+            httpx.Response: Ответ сервера
+        
+        Raises:
+            FourPDASessionException: Если сессия не создана
+            CloudflareException: При блокировке Cloudflare
+            DeadlineExceeded: Если бюджет времени исчерпан до очередной попытки
+        
+        Notes:
+            - Перед запросом ждет своей очереди в ограничителе частоты хоста
+            - Ответы 429/503 и проверки Cloudflare снижают частоту запросов к хосту
+            - Сетевые ошибки и ответы из RetryPolicy.statuses повторяются с задержкой
+        """
+        phase = kwargs.get("phase", DEFAULT_PHASE)
+        with span(phase, "http", method=method, url=str(url)) as info:
+            response = self._send_with_retries(method, url, kwargs,
+                                               lambda client, kw: client.request(method, url, **kw))
+            info["status"] = response.status_code
+        self._observe_bytes(phase, response)
         return response
 
+    def _send_with_retries(self, method: str, url: str, kwargs: dict, send) -> httpx.Response:
+        """
+        Выполняет запрос через send(client, kwargs) с учетом прокси, ограничителя
+        частоты, политики повторов и бюджета времени.
+        """
+        deadline = kwargs.pop("deadline", None)
+        phase = kwargs.pop("phase", DEFAULT_PHASE)
+        tracer = RequestTracer(self.metrics, phase)
+        kwargs = self._prepare_request(kwargs, tracer)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            self._apply_deadline(kwargs, deadline)
+            client, proxy = self._select_client()
+            wait = self._reserve_slot(url, proxy)
+            with span("rate-limit", "wait") if wait > 0 else nullcontext():
+                time.sleep(wait)
+            started = time.monotonic()
+
+            try:
+                response = send(client, kwargs)
+            except Exception as e:
+                self._record_proxy(proxy, started)
+                self._observe_error(phase, method, e)
+                delay = self._retry_delay(method, attempt, deadline, error=e)
+                if delay is None:
+                    raise
+                self._observe_retry(phase, type(e).__name__)
+            else:
+                self._observe_response(phase, method, started, response)
+                if self._record_proxy(proxy, started, response) and attempt < self.retry_policy.max_attempts:
+                    # Ограничение получил прокси, а не запрос: сразу повторяем через другой
+                    response.close()
+                    self._observe_retry(phase, "proxy")
+                    continue
+                try:
+                    self._handle_response(url, response, proxy)
+                except BaseException:
+                    response.close()
+                    raise
+                delay = self._retry_delay(method, attempt, deadline, response=response)
+                if delay is None:
+                    return response
+                response.close()
+                self._observe_bytes(phase, response)
+                self._observe_retry(phase, response.status_code)
+
+            with span("backoff", "wait", phase=phase):
+                time.sleep(delay)
+
+    @staticmethod
+    def _open_stream(client: httpx.Client, method: str, url: str, kwargs: dict) -> httpx.Response:
+        kwargs = dict(kwargs)
+        follow_redirects = kwargs.pop("follow_redirects", httpx.USE_CLIENT_DEFAULT)
+        request = client.build_request(method, url, **kwargs)
+        return client.send(request, follow_redirects=follow_redirects, stream=True)
+
     def get(self, url: str, **kwargs) -> httpx.Response:
         """
         Выполняет GET-запрос.
@@ -330,21 +839,253 @@ class FourPDASession:
         """
         return self.request("POST", url, **kwargs)
 
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs) -> Iterator[httpx.Response]:
+        """
+        Выполняет HTTP-запрос с потоковым чтением тела ответа.
+        
+        Тело не загружается в память целиком, его читают через
+        response.iter_bytes() внутри блока with.
+        
+        Args:
+            method (str): HTTP-метод (GET, POST, etc.)
+            url (str): URL для запроса
+            **kwargs: Дополнительные параметры для httpx.Client.stream()
+        
+        Yields:
+            httpx.Response: Ответ сервера с непрочитанным телом
+        
+        Raises:
+            FourPDASessionException: Если сессия не создана
+            CloudflareException: При блокировке Cloudflare
+        
+        Notes:
+            - Повторы выполняются только до начала чтения тела ответа
+        """
+        phase = kwargs.get("phase", DEFAULT_PHASE)
+        with span(phase, "http", method=method, url=str(url)) as info:
+            response = self._send_with_retries(method, url, kwargs,
+                                               lambda client, kw: self._open_stream(client, method, url, kw))
+            info["status"] = response.status_code
+            try:
+                yield response
+            finally:
+                response.close()
+                self._observe_bytes(phase, response)
+
     def close(self):
         """
-        Закрывает HTTP-сессию и освобождает ресурсы.
+        Закрывает HTTP-сессию, сохраняет обновленные cookies и освобождает ресурсы.
         
         Raises:
             ValueError: Если сессия уже была закрыта
         """
         if not self.client:
             raise ValueError("Сессия уже была закрыта.")
+        self.flush_cookies()
         self.client.close()
         self.client = None
+        if self.proxies:
+            for proxy in self.proxies.proxies:
+                proxy.client.close()
+            self.proxies.save()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
-        return False
\ No newline at end of file
+        return False
+
+
+class AsyncFourPDASession(_BaseFourPDASession):
+    """
+    Асинхронная версия FourPDASession на базе httpx.AsyncClient.
+    
+    Использует тот же TLS-контекст, заголовки эмуляции и обработку Cloudflare,
+    что и синхронная сессия, поэтому тысячи запросов могут мультиплексироваться
+    поверх нескольких HTTP/2 соединений в одном event loop.
+    
+    Attributes:
+        config: Объект конфигурации для получения cookies авторизации
+        client: Асинхронный HTTPX клиент для выполнения запросов
+    """
+
+    client: Optional[httpx.AsyncClient]
+
+    async def aflush_cookies(self, force: bool = True):
+        """
+        Асинхронная версия FourPDASession.flush_cookies.
+        
+        Все задачи сессии работают в одном event loop, поэтому блокировка потоков
+        не нужна, а сам конфиг сохраняется в отдельном потоке и не блокирует loop.
+        
+        Args:
+            force (bool): Сохранить сразу, не дожидаясь COOKIE_FLUSH_INTERVAL
+        """
+        if not self._flush_due(force):
+            return
+        # Флаг снимается до сохранения, чтобы другие задачи не запустили второе;
+        # cookies, обновленные во время записи, снова пометят конфиг несохраненным
+        self._cookies_dirty = False
+        self._cookies_flushed = time.monotonic()
+        try:
+            await asyncio.to_thread(self.config.save)
+        except BaseException:
+            self._cookies_dirty = True
+            raise
+
+    def _build_client(self, proxy: Optional[str] = None, cookies: Optional[httpx.Cookies] = None) -> httpx.AsyncClient:
+        """
+        Создает и настраивает асинхронный HTTPX клиент с мобильной эмуляцией.
+        """
+        logging.debug("Создаем асинхронную сессию для запросов%s...", " через " + proxy if proxy else "")
+
+        ctx = self._chrome_android_tls_context()
+        transport = httpx.AsyncHTTPTransport(verify=ctx, retries=0, proxy=proxy)
+
+        return httpx.AsyncClient(
+            http1=True,
+            http2=True,
+            timeout=self.timeout,
+            transport=transport,
+            cookies=cookies,
+            verify=True
+        )
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Выполняет асинхронный HTTP-запрос.
+        
+        Args:
+            method (str): HTTP-метод (GET, POST, etc.)
+            url (str): URL для запроса
+            **kwargs: Дополнительные параметры для httpx.AsyncClient.request()
+        
+        Returns:
+            httpx.Response: Ответ сервера
+        
+        Raises:
+            FourPDASessionException: Если сессия не создана
+            CloudflareException: При блокировке Cloudflare
+        """
+        async def send(client, kw):
+            return await client.request(method, url, **kw)
+
+        phase = kwargs.get("phase", DEFAULT_PHASE)
+        with span(phase, "http", method=method, url=str(url)) as info:
+            response = await self._send_with_retries(method, url, kwargs, send)
+            info["status"] = response.status_code
+        self._observe_bytes(phase, response)
+        return response
+
+    async def _send_with_retries(self, method: str, url: str, kwargs: dict, send) -> httpx.Response:
+        """
+        Асинхронная версия FourPDASession._send_with_retries.
+        """
+        deadline = kwargs.pop("deadline", None)
+        phase = kwargs.pop("phase", DEFAULT_PHASE)
+        tracer = RequestTracer(self.metrics, phase)
+        kwargs = self._prepare_request(kwargs, tracer.atrace)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            self._apply_deadline(kwargs, deadline)
+            client, proxy = self._select_client()
+            wait = self._reserve_slot(url, proxy)
+            with span("rate-limit", "wait") if wait > 0 else nullcontext():
+                await asyncio.sleep(wait)
+            started = time.monotonic()
+
+            try:
+                response = await send(client, kwargs)
+            except Exception as e:
+                self._record_proxy(proxy, started)
+                self._observe_error(phase, method, e)
+                delay = self._retry_delay(method, attempt, deadline, error=e)
+                if delay is None:
+                    raise
+                self._observe_retry(phase, type(e).__name__)
+            else:
+                self._observe_response(phase, method, started, response)
+                if self._record_proxy(proxy, started, response) and attempt < self.retry_policy.max_attempts:
+                    await response.aclose()
+                    self._observe_retry(phase, "proxy")
+                    continue
+                try:
+                    self._handle_response(url, response, proxy)
+                    await self.aflush_cookies(force=False)
+                except BaseException:
+                    await response.aclose()
+                    raise
+                delay = self._retry_delay(method, attempt, deadline, response=response)
+                if delay is None:
+                    return response
+                await response.aclose()
+                self._observe_bytes(phase, response)
+                self._observe_retry(phase, response.status_code)
+
+            with span("backoff", "wait", phase=phase):
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _open_stream(client: httpx.AsyncClient, method: str, url: str, kwargs: dict) -> httpx.Response:
+        kwargs = dict(kwargs)
+        follow_redirects = kwargs.pop("follow_redirects", httpx.USE_CLIENT_DEFAULT)
+        request = client.build_request(method, url, **kwargs)
+        return await client.send(request, follow_redirects=follow_redirects, stream=True)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Выполняет асинхронный GET-запрос.
+        """
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Выполняет асинхронный POST-запрос.
+        """
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Выполняет асинхронный HTTP-запрос с потоковым чтением тела ответа.
+        """
+        async def send(client, kw):
+            return await self._open_stream(client, method, url, kw)
+
+        phase = kwargs.get("phase", DEFAULT_PHASE)
+        with span(phase, "http", method=method, url=str(url)) as info:
+            response = await self._send_with_retries(method, url, kwargs, send)
+            info["status"] = response.status_code
+            try:
+                yield response
+            finally:
+                await response.aclose()
+                self._observe_bytes(phase, response)
+
+    async def aclose(self):
+        """
+        Закрывает асинхронную HTTP-сессию, сохраняет обновленные cookies и освобождает ресурсы.
+        
+        Raises:
+            ValueError: Если сессия уже была закрыта
+        """
+        if not self.client:
+            raise ValueError("Сессия уже была закрыта.")
+        await self.aflush_cookies()
+        await self.client.aclose()
+        self.client = None
+        if self.proxies:
+            for proxy in self.proxies.proxies:
+                await proxy.client.aclose()
+            await asyncio.to_thread(self.proxies.save)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+        return False
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from .tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Пауза между попытками взять блокировку на Windows (msvcrt не умеет ждать бесконечно)
+LOCK_RETRY_INTERVAL = 0.05
+
+
+def load_json(path: Path, default=None):
+    """
+    Загружает JSON-файл, возвращая default если файла нет или он поврежден.
+
+    Args:
+        path (Path): Путь к файлу
+        default: Значение по умолчанию
+
+    Returns:
+        Загруженные данные или default
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Межпроцессная рекомендательная блокировка файла (fcntl.flock или msvcrt.locking).
+
+    Блокируется отдельный файл <имя>.lock: сам файл заменяется через os.replace,
+    и блокировка, взятая на нем, осталась бы на старой версии файла.
+    Блокировка эксклюзивная и ждет, пока ее не освободит другой процесс.
+
+    Args:
+        path (Path): Путь к защищаемому файлу
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path.with_name(path.name + ".lock"), "a+b") as f:
+        with span("file-lock", "wait", file=path.name):
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(LOCK_RETRY_INTERVAL)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_json(path: Path, data, **kwargs):
+    """
+    Атомарно записывает данные в JSON-файл.
+
+    Args:
+        path (Path): Путь к файлу
+        data: Данные для сериализации
+        **kwargs: Дополнительные параметры для json.dump()
+    """
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, **kwargs))
+
+
+def atomic_write_text(path: Path, text: str):
+    """
+    Атомарно записывает текст в файл.
+
+    Текст пишется во временный файл в той же директории, который затем
+    заменяет целевой через os.replace, поэтому читатели никогда не видят
+    частично записанный файл.
+
+    Args:
+        path (Path): Путь к файлу
+        text (str): Содержимое файла
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
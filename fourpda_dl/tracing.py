@@ -0,0 +1,195 @@
+import json
+import os
+import sys
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Виртуальные номера потоков для задач asyncio начинаются с этого значения,
+# чтобы не пересекаться с идентификаторами потоков ОС
+TASK_TID_BASE = 1 << 32
+
+_tracer: Optional["Tracer"] = None
+
+
+class Tracer:
+    """
+    Записывает интервалы выполнения в формате Chrome Trace Event.
+
+    Каждый интервал привязан к потоку или задаче asyncio, в которой он начался,
+    поэтому в chrome://tracing или Perfetto у каждого потока (задачи) своя
+    дорожка, и видно, где потоки ждут друг друга.
+
+    Attributes:
+        pid (int): Идентификатор процесса в событиях
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._events: List[dict] = []
+        self._threads: Dict[int, str] = {}
+        self._tasks: Dict[int, Tuple[object, int]] = {}
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """
+        Возвращает время от начала записи в микросекундах.
+        """
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    def _tid(self) -> int:
+        # asyncio не импортируется ради трассировки: если его нет, задач тоже нет
+        asyncio = sys.modules.get("asyncio")
+        try:
+            task = asyncio.current_task() if asyncio else None
+        except RuntimeError:
+            task = None
+
+        with self._lock:
+            if task is None:
+                tid = threading.get_native_id()
+                if tid not in self._threads:
+                    self._threads[tid] = threading.current_thread().name
+                return tid
+
+            known = self._tasks.get(id(task))
+            if known is not None and known[0] is task:
+                return known[1]
+            tid = TASK_TID_BASE + len(self._tasks)
+            # Ссылка на задачу не дает переиспользовать ее id для другой задачи
+            self._tasks[id(task)] = (task, tid)
+            self._threads[tid] = task.get_name()
+            return tid
+
+    def add(self, name: str, category: str, start: float, end: float, tid: int, args: dict):
+        event = {"name": name, "cat": category, "ph": "X", "ts": start, "dur": end - start,
+                 "pid": self.pid, "tid": tid}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    def instant(self, name: str, category: str = "", **args):
+        """
+        Записывает мгновенное событие (например повтор запроса).
+        """
+        event = {"name": name, "cat": category, "ph": "i", "s": "t", "ts": self.now(),
+                 "pid": self.pid, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    def events(self) -> List[dict]:
+        """
+        Возвращает записанные события вместе с именами потоков и задач.
+        """
+        with self._lock:
+            names = [
+                {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                for tid, name in self._threads.items()
+            ]
+            return names + list(self._events)
+
+    def write(self, path: Path):
+        """
+        Записывает трассировку в JSON-файл для chrome://tracing или Perfetto.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "start", "tid")
+
+    def __init__(self, tracer: Tracer, name: str, category: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> dict:
+        self.tid = self.tracer._tid()
+        self.start = self.tracer.now()
+        return self.args
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.add(self.name, self.category, self.start, self.tracer.now(), self.tid, self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> dict:
+        return {}
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, category: str = "", **args):
+    """
+    Контекстный менеджер интервала трассировки. Работает и в потоках, и в задачах asyncio.
+
+    Если запись не включена, ничего не делает. Внутри блока в возвращенный
+    словарь можно добавить аргументы, известные только по ходу работы
+    (например код ответа).
+
+    Args:
+        name (str): Имя интервала
+        category (str, optional): Категория (http, io, wait, download, ...)
+        **args: Аргументы интервала
+
+    Example:
+        with span("attach", "http", url=url) as info:
+            info["status"] = response.status_code
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, category, args)
+
+
+def instant(name: str, category: str = "", **args):
+    """
+    Записывает мгновенное событие, если запись включена.
+    """
+    tracer = _tracer
+    if tracer is not None:
+        tracer.instant(name, category, **args)
+
+
+def start() -> Tracer:
+    """
+    Включает запись трассировки для всего процесса.
+
+    Returns:
+        Tracer: Активный объект записи
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def stop() -> Optional[Tracer]:
+    """
+    Выключает запись трассировки.
+
+    Returns:
+        Optional[Tracer]: Объект с записанными событиями или None, если запись не велась
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
@@ -22,4 +22,21 @@ def confirmation_request(prompt: str = "", default: bool = None) -> bool:
         if response in ['n', 'no', 'н', 'нет']:
             return False
 
-        logging.info("Пожалуйста, ответьте 'y' (yes/да) или 'n' (no/нет)")
\ No newline at end of file
+        logging.info("Пожалуйста, ответьте 'y' (yes/да) или 'n' (no/нет)")
+
+
+def format_size(size: float) -> str:
+    """
+    Форматирует размер в байтах в человекочитаемый вид.
+
+    Args:
+        size (float): Размер в байтах
+
+    Returns:
+        str: Строка вида "12.3 MiB"
+    """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
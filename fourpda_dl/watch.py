@@ -0,0 +1,245 @@
+import logging
+import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .batch import DEFAULT_JOBS, DEFAULT_RESOLVE_TIMEOUT, resolve_batch
+from .config import DEFAULT_CONFIG_DIR
+from .defaults import DEFAULT_INTERVAL, DEFAULT_TOPIC_JOBS
+from .download import download_file
+from .forum import extract_attachments, filter_attachments, topic_page_offsets
+from .storage import atomic_write_json, file_lock, load_json
+
+WATCH_STATE_FILE = DEFAULT_CONFIG_DIR / "watch.json"
+
+POST_ANCHOR_PATTERN = re.compile(r'name="entry(\d+)"')
+# Ошибки, при которых повторная попытка получить ссылку бессмысленна
+PERMANENT_ERRORS = {"ValueError", "FileNotFound"}
+
+
+class WatchState:
+    """
+    Состояние наблюдения за темами, хранимое в watch.json.
+
+    Для каждой темы хранится ID последнего увиденного поста, смещение (st)
+    последней страницы, валидаторы ETag/Last-Modified этой страницы и
+    ссылки (pending), которые не удалось получить или скачать: они
+    повторяются при следующем опросе.
+
+    Файл могут использовать несколько процессов: save() под межпроцессной
+    блокировкой записывает только измененные темы поверх содержимого файла.
+
+    Attributes:
+        path (Path): Путь к файлу состояния
+    """
+
+    def __init__(self, path: Path = WATCH_STATE_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._topics = load_json(self.path, {}).get("topics", {})
+        self._changed = set()
+
+    def get(self, topic_id: int) -> dict:
+        with self._lock:
+            return dict(self._topics.get(str(topic_id), {}))
+
+    def set(self, topic_id: int, state: dict):
+        with self._lock:
+            self._topics[str(topic_id)] = state
+            self._changed.add(str(topic_id))
+
+    def save(self):
+        with self._lock, file_lock(self.path):
+            topics = load_json(self.path, {}).get("topics", {})
+            topics.update({key: self._topics[key] for key in self._changed})
+            atomic_write_json(self.path, {"topics": topics}, indent=4)
+            self._topics = topics
+            self._changed.clear()
+
+
+def _link_post_id(link: str) -> int:
+    return int(link.split("/forum/dl/post/", 1)[1].split("/", 1)[0])
+
+
+def _page_post_ids(page: str, links: Iterable[str]) -> List[int]:
+    ids = [int(i) for i in POST_ANCHOR_PATTERN.findall(page)]
+    ids.extend(_link_post_id(link) for link in links)
+    return ids
+
+
+def poll_topic(session, config, topic_id: int, state: dict, backfill: bool = False) -> Tuple[List[str], dict]:
+    """
+    Проверяет тему на новые вложения, загружая только новые страницы.
+
+    Сначала запрашивается последняя известная страница с If-None-Match /
+    If-Modified-Since: ответ 304 означает, что ничего не изменилось. Иначе
+    загружаются эта страница и все появившиеся после нее, а из них берутся
+    вложения из постов новее последнего увиденного.
+
+    При первом опросе темы запоминается только текущее состояние (последняя
+    страница), если не указан backfill.
+
+    Args:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        topic_id (int): ID темы
+        state (dict): Текущее состояние темы из WatchState
+        backfill (bool, optional): При первом опросе вернуть вложения с последней страницы
+
+    Returns:
+        Tuple[List[str], dict]: Новые DL-ссылки и обновленное состояние темы
+    """
+    url = f"{session.base_url}/forum/index.php?showtopic={topic_id}"
+    first_poll = "last_post_id" not in state
+    offset = state.get("offset", 0)
+
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    request = session.get(f"{url}&st={offset}", headers=headers, follow_redirects=True, phase="topic-page")
+
+    if request.status_code == 304:
+        logging.debug("Тема %s не изменилась.", topic_id)
+        return [], state
+    if request.status_code != 200:
+        raise ValueError(f"Неожиданный код-ответ сервера: {request.status_code}")
+
+    offsets = [st for st in topic_page_offsets(topic_id, request.text) if st > offset]
+    if first_poll:
+        # При первом опросе достаточно последней страницы темы
+        offsets = offsets[-1:]
+
+    pages = [(offset, request)]
+    for st in offsets:
+        page = session.get(f"{url}&st={st}", follow_redirects=True, phase="topic-page")
+        if page.status_code != 200:
+            raise ValueError(f"Неожиданный код-ответ сервера: {page.status_code}")
+        pages.append((st, page))
+
+    last_offset, last_page = pages[-1]
+    last_post_id = state.get("last_post_id", 0)
+    new_links = []
+    max_post_id = last_post_id
+
+    for st, page in pages:
+        links = extract_attachments(session.base_url, page.text)
+        post_ids = _page_post_ids(page.text, links)
+        max_post_id = max([max_post_id] + post_ids)
+
+        if first_poll and (not backfill or st != last_offset):
+            continue
+
+        for link in links:
+            if first_poll or _link_post_id(link) > last_post_id:
+                new_links.append(link)
+
+    new_state = {
+        "last_post_id": max_post_id,
+        "offset": last_offset,
+        "etag": last_page.headers.get("ETag"),
+        "last_modified": last_page.headers.get("Last-Modified"),
+        "checked": time.time(),
+    }
+
+    if new_links:
+        logging.info("В теме %s новых вложений: %s", topic_id, len(new_links))
+
+    return list(dict.fromkeys(new_links)), new_state
+
+
+def watch_topics(session, config, topic_ids: Iterable[int], interval: float = DEFAULT_INTERVAL,
+                 topic_jobs: int = DEFAULT_TOPIC_JOBS, jobs: int = DEFAULT_JOBS, cache=None,
+                 download_dir: Optional[str] = None, once: bool = False, backfill: bool = False,
+                 glob: Optional[str] = None, regex: Optional[str] = None, queue=None,
+                 timeout: Optional[float] = DEFAULT_RESOLVE_TIMEOUT, pool=None,
+                 state: Optional[WatchState] = None) -> Iterator[dict]:
+    """
+    Периодически опрашивает темы и сразу получает прямые ссылки на новые вложения.
+
+    Args:
+        session: Сессия FourPDASession
+        config: Объект конфигурации с авторизационными данными
+        topic_ids (Iterable[int]): ID тем для наблюдения
+        interval (float, optional): Интервал между опросами в секундах
+        topic_jobs (int, optional): Сколько тем опрашивать одновременно
+        jobs (int, optional): Сколько ссылок получать одновременно
+        cache (LinkCache, optional): Кэш прямых ссылок
+        download_dir (Optional[str]): Если указан, новые файлы скачиваются в эту директорию
+        once (bool, optional): Выполнить один опрос и завершиться
+        backfill (bool, optional): При первом опросе темы вернуть вложения с ее последней страницы
+        glob (Optional[str]): Шаблон имени файла для отбора вложений
+        regex (Optional[str]): Регулярное выражение для имени файла
+        queue (JobQueue, optional): Если указана, новые файлы добавляются в очередь загрузок
+                                    (в download_dir) вместо скачивания на месте
+        timeout (Optional[float]): Бюджет времени на получение одной ссылки в секундах
+        pool (SessionPool, optional): Пул аккаунтов для получения ссылок
+        state (WatchState, optional): Хранилище состояния, по умолчанию watch.json
+
+    Yields:
+        dict: Записи в формате resolve_batch с дополнительным полем topic_id
+              (и path, если файл был скачан)
+    """
+    topic_ids = list(topic_ids)
+    state = state or WatchState()
+
+    if download_dir and queue is None:
+        Path(download_dir).mkdir(parents=True, exist_ok=True)
+
+    def poll(topic_id):
+        try:
+            return topic_id, poll_topic(session, config, topic_id, state.get(topic_id), backfill)
+        except Exception as e:
+            logging.error("Не удалось опросить тему %s: %s", topic_id, e)
+            return topic_id, None
+
+    while True:
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(1, topic_jobs)) as executor:
+            results = list(executor.map(poll, topic_ids))
+
+        for topic_id, result in results:
+            if result is None:
+                continue
+
+            links, topic_state = result
+            # Ссылки, не обработанные при прошлых опросах, повторяются вместе с новыми
+            pending = state.get(topic_id).get("pending", [])
+            links = list(dict.fromkeys(pending + filter_attachments(links, glob, regex)))
+            failed = []
+            for record in resolve_batch(session, config, links, jobs, cache, timeout, pool):
+                record["topic_id"] = topic_id
+                if queue is not None and record.get("link"):
+                    record["queued"] = bool(queue.add(session.base_url, [record["url"]], download_dir)[0])
+                elif download_dir and record.get("link"):
+                    try:
+                        record["path"] = str(download_file(session, config, record["url"], download_dir,
+                                                           cache=cache, progress=False, link=record["link"]))
+                    except Exception as e:
+                        logging.error("Не удалось скачать %s: %s", record["url"], e)
+                        record["download_error"] = type(e).__name__
+                error = record.get("error")
+                if record.get("download_error") or (error and error not in PERMANENT_ERRORS):
+                    failed.append(record["url"])
+                yield record
+
+            # Состояние сохраняется только после обработки новых вложений темы
+            topic_state = {key: value for key, value in topic_state.items() if key != "pending"}
+            if failed:
+                topic_state["pending"] = failed
+                logging.warning("В теме %s не обработано вложений: %s, повторю при следующем опросе",
+                                topic_id, len(failed))
+            state.set(topic_id, topic_state)
+            state.save()
+
+        if once:
+            return
+
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))